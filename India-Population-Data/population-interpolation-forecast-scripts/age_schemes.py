@@ -0,0 +1,116 @@
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# Age scheme configuration shipped next to this module
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'age_schemes.json')
+
+@lru_cache(maxsize=None)
+def load_config(config_file=DEFAULT_CONFIG):
+    """
+    Load an age scheme configuration.
+
+    The configuration holds the target age groups, label aliases (e.g. the
+    '14-Oct' spreadsheet artefact for '10-14'), the source scheme of each
+    census year, and per scheme the weights of the source groups making up
+    each target group, e.g. {"75-84": {"75-79": 1, "80+": 0.4}}. Target groups
+    without a rule are taken from the source group with the same label. A
+    target group needing a missing source group is NaN, unless it is listed
+    in 'partial': those are summed over the source groups present.
+    """
+    with open(config_file) as f:
+        config = json.load(f)
+    for name, rules in config['schemes'].items():
+        unknown = [target for target in rules if target not in config['target']]
+        if unknown:
+            raise ValueError(f"Scheme {name} has rules for unknown target groups: {', '.join(unknown)}")
+    unknown = [target for target in config.get('partial', []) if target not in config['target']]
+    if unknown:
+        raise ValueError(f"Partial sums configured for unknown target groups: {', '.join(unknown)}")
+    return config
+
+def census_scheme(year, config_file=DEFAULT_CONFIG):
+    """Return the name of the source age scheme of a census year."""
+    census = load_config(config_file)['census']
+    if str(year) not in census:
+        raise ValueError(f"No age scheme configured for census year {year} in {config_file}")
+    return census[str(year)]
+
+def _resolve_labels(source_labels, config_file):
+    aliases = load_config(config_file)['aliases']
+    return tuple(aliases.get(str(label).strip(), str(label).strip()) for label in source_labels)
+
+@lru_cache(maxsize=None)
+def remap_matrix(scheme, source_labels, config_file=DEFAULT_CONFIG):
+    """
+    Build the sparse (target groups x source groups) weight matrix of a scheme.
+
+    Matrices are cached per (scheme, source labels), so each census layout is
+    built once.
+
+    Args:
+        scheme (str): Scheme name in the configuration
+        source_labels (tuple): Age group labels of the source rows, aliases resolved
+
+    Returns:
+        tuple: (csr_matrix of weights, boolean array of the target groups
+            needing a source group missing from source_labels, and the
+            (target, source) pairs left out of partial sums)
+    """
+    config = load_config(config_file)
+    rules = config['schemes'][scheme]
+    # The first row of a repeated label is used
+    position = {}
+    for i, label in enumerate(source_labels):
+        position.setdefault(label, i)
+
+    partial = set(config.get('partial', []))
+    rows, cols, weights = [], [], []
+    missing = np.zeros(len(config['target']), dtype=bool)
+    skipped = []
+    for row, target in enumerate(config['target']):
+        for source, weight in rules.get(target, {target: 1}).items():
+            if source not in position:
+                if target in partial:
+                    skipped.append((target, source))
+                else:
+                    missing[row] = True
+                continue
+            rows.append(row)
+            cols.append(position[source])
+            weights.append(float(weight))
+    matrix = csr_matrix((weights, (rows, cols)), shape=(len(config['target']), len(source_labels)))
+    missing.setflags(write=False)
+    return matrix, missing, tuple(skipped)
+
+def remap(values, source_labels, scheme, config_file=DEFAULT_CONFIG):
+    """
+    Convert values from a source age scheme to the target age groups with one sparse matrix multiply.
+
+    Args:
+        values (np.ndarray): Source values, shape (source groups, series), e.g.
+            one column per sex (and region)
+        source_labels (list): Age group label of each source row
+        scheme (str): Scheme name in the configuration
+
+    Returns:
+        np.ndarray: Values of shape (target groups, series); NaN for target
+            groups whose source groups are missing, except partial sums
+    """
+    matrix, missing, _ = remap_matrix(scheme, _resolve_labels(source_labels, config_file), config_file)
+    # Only the stored weights are multiplied, so unused rows (e.g. a blank
+    # 'Total Population' cell) do not leak NaN into the result
+    result = np.asarray(matrix @ np.asarray(values, dtype=float))
+    result[missing] = np.nan
+    return result
+
+def skipped_sources(source_labels, scheme, config_file=DEFAULT_CONFIG):
+    """Return the (target, source) age groups left out of partial sums for a source layout."""
+    return list(remap_matrix(scheme, _resolve_labels(source_labels, config_file), config_file)[2])
+
+def target_groups(config_file=DEFAULT_CONFIG):
+    """Return the target age groups of a configuration."""
+    return list(load_config(config_file)['target'])
@@ -1,15 +1,243 @@
+import argparse
+import os
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.interpolate import CubicSpline
-from scipy.optimize import curve_fit
+import interpolation_utils  # Puts population-data-generation on the path
+from stage_profiler import StageProfiler, add_profile_arguments
 
-def forecast_population():
+def growth_model(x, a, b, c):
+    """Exponential growth with saturation model"""
+    return a * (1 - np.exp(-b * (x - 1990))) + c
+
+def _profile_grid(t, values, grid):
+    """
+    Residual sum of squares of every series for every b on a shared grid, with
+    a and c fitted by linear least squares.
+    
+    Returns:
+        np.ndarray: RSS of shape (series, grid)
+    """
+    basis = -np.expm1(-grid[:, None] * t[None, :])
+    basis_centered = basis - basis.mean(axis=1, keepdims=True)
+    values_centered = values - values.mean(axis=1, keepdims=True)
+    cov = values_centered @ basis_centered.T
+    return (values_centered ** 2).sum(axis=1, keepdims=True) - cov ** 2 / (basis_centered ** 2).sum(axis=1)
+
+def _profile_fit(t, values, b):
+    """
+    Fit a and c by linear least squares for one b per series.
+    
+    Returns:
+        tuple: (a, c, rss), each of shape (series,)
+    """
+    basis = -np.expm1(-b[:, None] * t[None, :])
+    basis_mean = basis.mean(axis=1)
+    basis_centered = basis - basis_mean[:, None]
+    values_mean = values.mean(axis=1)
+    values_centered = values - values_mean[:, None]
+    a = (values_centered * basis_centered).sum(axis=1) / (basis_centered ** 2).sum(axis=1)
+    c = values_mean - a * basis_mean
+    rss = ((values_centered - a[:, None] * basis_centered) ** 2).sum(axis=1)
+    return a, c, rss
+
+def fit_growth_model(years, values, b_min=1e-7, b_max=10.0, tol=1e-10, max_iter=200):
+    """
+    Fit growth_model to many series at once by least squares.
+    
+    The model is linear in a and c for a fixed b, so a and c are profiled out by
+    linear least squares. b is located on a shared log-spaced grid and then
+    refined per series by golden-section search, with series dropping out of
+    the iteration as they converge. b is kept positive, i.e. growth saturates:
+    a negative b grows or shrinks exponentially, which turned 2040 forecasts of
+    India 5-14 into billions and of some Nagaland series into zero. As b tends
+    to 0 the model tends to a straight line, which is where curve_fit, started
+    at b = 0.01, stopped for most series; an optimum at b_min is that linear
+    limit. The least-squares optimum within [b_min, b_max] is returned,
+    including one on a bound. A series is marked as failed only when its
+    values or fitted parameters are not finite.
+    
+    Args:
+        years (np.ndarray): Years of the observations, shape (years,)
+        values (np.ndarray): Series to fit, shape (series, years)
+        b_min (float): Lower bound of the search over b, positive
+        b_max (float): Upper bound of the search over b
+        tol (float): Relative tolerance on b
+        max_iter (int): Maximum number of golden-section iterations
+    
+    Returns:
+        tuple: (params, fallback) where params has shape (series, 3) holding
+            (a, b, c), and fallback is a boolean mask of series whose fit failed
+    """
+    t = np.asarray(years, dtype=float) - 1990
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    
+    # Shared grid over b, log-spaced from the near-linear b_min up to b_max
+    grid = np.logspace(np.log10(b_min), np.log10(b_max), 160)
+    
+    with np.errstate(all='ignore'):
+        grid_rss = _profile_grid(t, values, grid)
+    grid_rss = np.where(np.isfinite(grid_rss), grid_rss, np.inf)
+    best = np.argmin(grid_rss, axis=1)
+    fallback = ~np.isfinite(values).all(axis=1) | ~np.isfinite(grid_rss.min(axis=1))
+    
+    # Golden-section refinement of b between the neighbouring grid points
+    lo = grid[np.maximum(best - 1, 0)]
+    hi = grid[np.minimum(best + 1, len(grid) - 1)]
+    ratio = (np.sqrt(5) - 1) / 2
+    active = ~fallback
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        idx = np.flatnonzero(active)
+        x1 = hi[idx] - ratio * (hi[idx] - lo[idx])
+        x2 = lo[idx] + ratio * (hi[idx] - lo[idx])
+        with np.errstate(all='ignore'):
+            _, _, rss1 = _profile_fit(t, values[idx], x1)
+            _, _, rss2 = _profile_fit(t, values[idx], x2)
+        left = rss1 <= rss2
+        hi[idx] = np.where(left, x2, hi[idx])
+        lo[idx] = np.where(left, lo[idx], x1)
+        active[idx] = (hi[idx] - lo[idx]) > tol * np.maximum(np.abs(lo[idx]), np.abs(hi[idx]))
+    
+    b = (lo + hi) / 2
+    with np.errstate(all='ignore'):
+        a, c, _ = _profile_fit(t, values, b)
+    params = np.column_stack([a, b, c])
+    fallback |= ~np.isfinite(params).all(axis=1)
+    return params, fallback
+
+def forecast_series(years, values, forecast_years):
+    """
+    Forecast many series at once with growth_model, using linear extrapolation
+    from the last five years for series where the fit fails. Forecasts are
+    floored at zero, so no population is negative.
+    
+    Args:
+        years (np.ndarray): Years of the observations, shape (years,)
+        values (np.ndarray): Series to forecast, shape (series, years)
+        forecast_years (list): Years to forecast
+    
+    Returns:
+        tuple: (forecast, fallback) with integer forecasts of shape
+            (series, forecast years) and the mask of series that used the fallback
+    """
+    years = np.asarray(years)
+    values = np.asarray(values)
+    forecast_years = np.asarray(forecast_years)
+    params, fallback = fit_growth_model(years, values)
+    
+    with np.errstate(all='ignore'):
+        fitted = growth_model(forecast_years[None, :], params[:, :1], params[:, 1:2], params[:, 2:])
+        slope = (values[:, -1:] - values[:, -5:-4]) / 5
+        linear = values[:, -1:] + slope * (forecast_years[None, :] - years[-1])
+    forecast = np.maximum(np.where(fallback[:, None], linear, fitted), 0)
+    return np.trunc(forecast).astype(int), fallback
+
+def forecast_populations(years, values, forecast_years):
+    """
+    Forecast population series of any shape, e.g. (regions, sexes, age groups, years), in one batch.
+    
+    Returns:
+        tuple: (forecast, fallback) shaped like values, with forecast years as the last axis of forecast
+    """
+    values = np.asarray(values)
+    forecast, fallback = forecast_series(years, values.reshape(-1, values.shape[-1]), forecast_years)
+    return forecast.reshape(values.shape[:-1] + (len(forecast_years),)), fallback.reshape(values.shape[:-1])
+
+def _series_arrays(data, years):
+    """Return the values of every age group for the given years as an (age groups x years) array."""
+    return data[[str(year) for year in years]].astype(int).to_numpy()
+
+def plot_forecasts(male_data, female_data, male_forecast, female_forecast, forecast_years, output_dir='plots'):
+    """
+    Plot historical and forecast population for both sexes.
+    
+    matplotlib is imported here, with the non-interactive Agg backend, so the
+    forecasts can be computed without it. Figures are closed once saved.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    
+    all_age_groups = male_data['row.names'].tolist()
+    historical_years = {
+        'male': [int(year) for year in male_data.columns if year != 'row.names'],
+        'female': [int(year) for year in female_data.columns if year != 'row.names'],
+    }
+    historical_values = {
+        'male': _series_arrays(male_data, historical_years['male']),
+        'female': _series_arrays(female_data, historical_years['female']),
+    }
+    forecast_values = {
+        'male': _series_arrays(male_forecast, forecast_years),
+        'female': _series_arrays(female_forecast, forecast_years),
+    }
+    
+    # Create a figure with two subplots - one for male, one for female
+    fig, axes = plt.subplots(2, 1, figsize=(15, 20))
+    try:
+        # Define a color map for the age groups
+        colors = plt.cm.tab20(np.linspace(0, 1, len(all_age_groups)))
+        
+        for ax, sex in zip(axes, ['male', 'female']):
+            for i, age_group in enumerate(all_age_groups):
+                # Plot historical data
+                ax.plot(historical_years[sex], historical_values[sex][i], marker='o', label=age_group,
+                        color=colors[i], linewidth=2)
+                
+                # Plot forecast data with different style
+                ax.plot(forecast_years, forecast_values[sex][i], marker='s', linestyle='--', color=colors[i], linewidth=2)
+                ax.scatter(forecast_years, forecast_values[sex][i], s=100, color='green', zorder=5)
+            
+            ax.set_title(f'{sex.capitalize()} Population Forecast (1990-2040)', fontsize=16)
+            ax.set_xlabel('Year', fontsize=14)
+            ax.set_ylabel('Population', fontsize=14)
+            ax.legend(loc='upper left', fontsize=12)
+            ax.grid(True)
+        
+        fig.tight_layout()
+        filename = os.path.join(output_dir, 'population_forecast.png')
+        fig.savefig(filename, dpi=300)
+        print(f"Visualization saved to {filename}")
+    finally:
+        plt.close(fig)
+    
+    # Create a second visualization with log scale
+    fig, ax = plt.subplots(figsize=(15, 10))
+    try:
+        # Plot selected age groups for both male and female
+        selected_age_groups = ['0-5', '15-39', '40-44', '70-74', '95+']
+        
+        for age_group in selected_age_groups:
+            i = all_age_groups.index(age_group)
+            for sex in ['male', 'female']:
+                line, = ax.plot(historical_years[sex], historical_values[sex][i], marker='o',
+                                label=f'{sex.capitalize()} {age_group}', linewidth=2, linestyle='-')
+                ax.plot(forecast_years, forecast_values[sex][i], marker='s',
+                        linewidth=2, linestyle='--', color=line.get_color())
+                ax.scatter(forecast_years, forecast_values[sex][i], s=100, color='green', zorder=5)
+        
+        ax.set_title('Population Forecast by Gender and Age Group (1990-2040) - Log Scale', fontsize=16)
+        ax.set_xlabel('Year', fontsize=14)
+        ax.set_ylabel('Population (Log Scale)', fontsize=14)
+        ax.set_yscale('log')
+        ax.legend(loc='upper left', fontsize=12)
+        ax.grid(True)
+        filename = os.path.join(output_dir, 'population_forecast_log_scale.png')
+        fig.savefig(filename, dpi=300)
+        print(f"Visualization saved to {filename}")
+    finally:
+        plt.close(fig)
+
+def forecast_population(profiler=None):
     """
     Forecast population for both male and female age groups for the years 2025, 2030, 2035, and 2040
-    using the interpolated data as a base.
+    using the interpolated data as a base. Stages are timed with profiler when one is given.
     """
+    profiler = profiler or StageProfiler(enabled=False)
+    
     # Load the interpolated data
+    profiler.start('read')
     try:
         male_data = pd.read_csv('processed-files/nordpred_male_population_interpolated.txt')
         female_data = pd.read_csv('processed-files/nordpred_female_population_interpolated.txt')
@@ -25,67 +253,23 @@ def forecast_population():
     male_forecast = pd.DataFrame({'row.names': male_data['row.names']})
     female_forecast = pd.DataFrame({'row.names': female_data['row.names']})
     
-    # Define a function for exponential growth with saturation
-    def growth_model(x, a, b, c):
-        """Exponential growth with saturation model"""
-        return a * (1 - np.exp(-b * (x - 1990))) + c
-    
-    # For each age group, forecast the population
-    for age_group in male_data['row.names']:
-        print(f"Forecasting data for age group: {age_group}")
-        
-        # Get the interpolated values for male
-        male_years = np.array([int(year) for year in male_data.columns if year != 'row.names'])
-        male_values = np.array([int(male_data.loc[male_data['row.names'] == age_group, str(year)].values[0]) 
-                               for year in male_years])
-        
-        # Get the interpolated values for female
-        female_years = np.array([int(year) for year in female_data.columns if year != 'row.names'])
-        female_values = np.array([int(female_data.loc[female_data['row.names'] == age_group, str(year)].values[0]) 
-                                 for year in female_years])
-        
-        # Fit the growth model to the male data
-        try:
-            male_popt, _ = curve_fit(growth_model, male_years, male_values, 
-                                     p0=[male_values[-1], 0.01, male_values[0]], 
-                                     maxfev=10000)
-            
-            # Forecast male population
-            for year in forecast_years:
-                forecast_value = int(growth_model(year, *male_popt))
-                male_forecast.loc[male_forecast['row.names'] == age_group, str(year)] = forecast_value
-        except:
-            # If curve fitting fails, use linear extrapolation
-            print(f"  Warning: Curve fitting failed for male {age_group}, using linear extrapolation")
-            slope = (male_values[-1] - male_values[-5]) / 5
-            for year in forecast_years:
-                years_ahead = year - male_years[-1]
-                forecast_value = int(male_values[-1] + slope * years_ahead)
-                male_forecast.loc[male_forecast['row.names'] == age_group, str(year)] = forecast_value
-        
-        # Fit the growth model to the female data
-        try:
-            female_popt, _ = curve_fit(growth_model, female_years, female_values, 
-                                       p0=[female_values[-1], 0.01, female_values[0]], 
-                                       maxfev=10000)
-            
-            # Forecast female population
-            for year in forecast_years:
-                forecast_value = int(growth_model(year, *female_popt))
-                female_forecast.loc[female_forecast['row.names'] == age_group, str(year)] = forecast_value
-        except:
-            # If curve fitting fails, use linear extrapolation
-            print(f"  Warning: Curve fitting failed for female {age_group}, using linear extrapolation")
-            slope = (female_values[-1] - female_values[-5]) / 5
-            for year in forecast_years:
-                years_ahead = year - female_years[-1]
-                forecast_value = int(female_values[-1] + slope * years_ahead)
-                female_forecast.loc[female_forecast['row.names'] == age_group, str(year)] = forecast_value
+    # Fit every age group of both sexes at once
+    profiler.start('forecast')
+    years = np.array([int(year) for year in male_data.columns if year != 'row.names'])
+    values = np.stack([_series_arrays(male_data, years), _series_arrays(female_data, years)])
+    forecast_values, fallback = forecast_populations(years, values, forecast_years)
+    for s, (sex, data, forecast) in enumerate([('male', male_data, male_forecast), ('female', female_data, female_forecast)]):
+        for age_group in data['row.names'][fallback[s]]:
+            print(f"  Warning: Curve fitting failed for {sex} {age_group}, using linear extrapolation")
+        for i, year in enumerate(forecast_years):
+            forecast[str(year)] = forecast_values[s, :, i]
     
     # Save the forecast data
+    profiler.start('save')
     male_forecast.to_csv('processed-files/nordpred_male_population_forecast.txt', index=False)
     female_forecast.to_csv('processed-files/nordpred_female_population_forecast.txt', index=False)
     print("Population forecasts saved to processed-files/nordpred_male_population_forecast.txt and processed-files/nordpred_female_population_forecast.txt")
+    profiler.stop()
     
     # Display the forecast data
     print("\nMale population forecast (all values are integers):")
@@ -96,116 +280,15 @@ def forecast_population():
     print(female_forecast)
     
     # Create visualizations of the forecasts
-    # Create a figure with two subplots - one for male, one for female
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(15, 20))
-    
-    # Get all age groups
-    all_age_groups = male_data['row.names'].tolist()
-    
-    # Define a color map for the age groups
-    colors = plt.cm.tab20(np.linspace(0, 1, len(all_age_groups)))
-    
-    # Plot male forecasts
-    for i, age_group in enumerate(all_age_groups):
-        # Get historical data
-        historical_years = [int(year) for year in male_data.columns if year != 'row.names']
-        historical_values = [int(male_data.loc[male_data['row.names'] == age_group, str(year)].values[0]) 
-                           for year in historical_years]
-        
-        # Get forecast data
-        forecast_values = [int(male_forecast.loc[male_forecast['row.names'] == age_group, str(year)].values[0]) 
-                         for year in forecast_years]
-        
-        # Plot historical data
-        ax1.plot(historical_years, historical_values, marker='o', label=age_group, color=colors[i], linewidth=2)
-        
-        # Plot forecast data with different style
-        ax1.plot(forecast_years, forecast_values, marker='s', linestyle='--', color=colors[i], linewidth=2)
-        ax1.scatter(forecast_years, forecast_values, s=100, color='green', zorder=5)
-    
-    ax1.set_title('Male Population Forecast (1990-2040)', fontsize=16)
-    ax1.set_xlabel('Year', fontsize=14)
-    ax1.set_ylabel('Population', fontsize=14)
-    ax1.legend(loc='upper left', fontsize=12)
-    ax1.grid(True)
-    
-    # Plot female forecasts
-    for i, age_group in enumerate(all_age_groups):
-        # Get historical data
-        historical_years = [int(year) for year in female_data.columns if year != 'row.names']
-        historical_values = [int(female_data.loc[female_data['row.names'] == age_group, str(year)].values[0]) 
-                           for year in historical_years]
-        
-        # Get forecast data
-        forecast_values = [int(female_forecast.loc[female_forecast['row.names'] == age_group, str(year)].values[0]) 
-                         for year in forecast_years]
-        
-        # Plot historical data
-        ax2.plot(historical_years, historical_values, marker='o', label=age_group, color=colors[i], linewidth=2)
-        
-        # Plot forecast data with different style
-        ax2.plot(forecast_years, forecast_values, marker='s', linestyle='--', color=colors[i], linewidth=2)
-        ax2.scatter(forecast_years, forecast_values, s=100, color='green', zorder=5)
-    
-    ax2.set_title('Female Population Forecast (1990-2040)', fontsize=16)
-    ax2.set_xlabel('Year', fontsize=14)
-    ax2.set_ylabel('Population', fontsize=14)
-    ax2.legend(loc='upper left', fontsize=12)
-    ax2.grid(True)
-    
-    plt.tight_layout()
-    plt.savefig('plots/population_forecast.png', dpi=300)
-    print("Visualization saved to plots/population_forecast.png")
-    
-    # Create a second visualization with log scale
-    plt.figure(figsize=(15, 10))
-    
-    # Plot selected age groups for both male and female
-    selected_age_groups = ['0-5', '15-39', '40-44', '70-74', '95+']
-    
-    for age_group in selected_age_groups:
-        # Get male historical data
-        male_historical_years = [int(year) for year in male_data.columns if year != 'row.names']
-        male_historical_values = [int(male_data.loc[male_data['row.names'] == age_group, str(year)].values[0]) 
-                                for year in male_historical_years]
-        
-        # Get male forecast data
-        male_forecast_values = [int(male_forecast.loc[male_forecast['row.names'] == age_group, str(year)].values[0]) 
-                              for year in forecast_years]
-        
-        # Get female historical data
-        female_historical_years = [int(year) for year in female_data.columns if year != 'row.names']
-        female_historical_values = [int(female_data.loc[female_data['row.names'] == age_group, str(year)].values[0]) 
-                                  for year in female_historical_years]
-        
-        # Get female forecast data
-        female_forecast_values = [int(female_forecast.loc[female_forecast['row.names'] == age_group, str(year)].values[0]) 
-                                for year in forecast_years]
-        
-        # Plot male data
-        plt.plot(male_historical_years, male_historical_values, marker='o', 
-                label=f'Male {age_group}', linewidth=2, linestyle='-')
-        plt.plot(forecast_years, male_forecast_values, marker='s', 
-                linewidth=2, linestyle='--', color=plt.gca().lines[-1].get_color())
-        plt.scatter(forecast_years, male_forecast_values, s=100, color='green', zorder=5)
-        
-        # Plot female data
-        plt.plot(female_historical_years, female_historical_values, marker='o', 
-                label=f'Female {age_group}', linewidth=2, linestyle='-')
-        plt.plot(forecast_years, female_forecast_values, marker='s', 
-                linewidth=2, linestyle='--', color=plt.gca().lines[-1].get_color())
-        plt.scatter(forecast_years, female_forecast_values, s=100, color='green', zorder=5)
-    
-    plt.title('Population Forecast by Gender and Age Group (1990-2040) - Log Scale', fontsize=16)
-    plt.xlabel('Year', fontsize=14)
-    plt.ylabel('Population (Log Scale)', fontsize=14)
-    plt.yscale('log')
-    plt.legend(loc='upper left', fontsize=12)
-    plt.grid(True)
-    plt.savefig('plots/population_forecast_log_scale.png', dpi=300)
-    print("Visualization saved to plots/population_forecast_log_scale.png")
+    with profiler.stage('plot'):
+        plot_forecasts(male_data, female_data, male_forecast, female_forecast, forecast_years)
     
     return male_forecast, female_forecast
 
 if __name__ == "__main__":
-    forecast_population() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Forecast male and female population from the interpolated data.')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiler = StageProfiler.from_args(args)
+    forecast_population(profiler)
+    profiler.finish(args.profile, script='forecast_population.py')
@@ -0,0 +1,182 @@
+import argparse
+import os
+import sys
+import pandas as pd
+import numpy as np
+from interpolation_utils import interpolate_populations, plot_interpolation
+from forecast_population import forecast_populations, plot_forecasts
+from stage_profiler import StageProfiler, add_profile_arguments
+
+SEXES = ['male', 'female']
+CENSUS_YEARS = [1991, 2001, 2011]
+ALL_YEARS = list(range(1990, 2022))
+FORECAST_YEARS = [2025, 2030, 2035, 2040]
+
+def read_populations(region_dirs, sexes):
+    """
+    Read the binned census populations of every region and sex into one array.
+
+    Each region directory holds the nordpred_{sex}_population.txt files
+    written by process_population_data.py.
+
+    Returns:
+        tuple: (values of shape (regions, sexes, age groups, census years),
+            age groups, census years present in every file)
+    """
+    frames = [[pd.read_csv(os.path.join(region_dir, f'nordpred_{sex}_population.txt'), sep='\t') for sex in sexes]
+              for region_dir in region_dirs]
+    age_groups = frames[0][0]['row.names'].tolist()
+    for region_dir, region_frames in zip(region_dirs, frames):
+        for sex, frame in zip(sexes, region_frames):
+            if frame['row.names'].tolist() != age_groups:
+                raise ValueError(f"Age groups of {sex} population in {region_dir} differ from {age_groups}")
+    known_years = [year for year in CENSUS_YEARS
+                   if all(str(year) in frame.columns for region_frames in frames for frame in region_frames)]
+    values = np.stack([np.stack([frame[[str(year) for year in known_years]].astype(int).to_numpy()
+                                 for frame in region_frames]) for region_frames in frames])
+    return values, age_groups, known_years
+
+def population_frame(age_groups, years, values):
+    """Return an (age groups x years) array as a DataFrame with a 'row.names' column."""
+    data = pd.DataFrame(values, columns=[str(year) for year in years])
+    data.insert(0, 'row.names', age_groups)
+    return data
+
+def interpolate_and_forecast(region_dirs=('.',), sexes=SEXES, profiler=None, forecast=True, plots=True):
+    """
+    Interpolate, and optionally forecast, the population of every region and sex in one batch.
+
+    All (region, sex, age group) series are stacked into one array, interpolated
+    from 1990 to 2021 with one cubic spline operator, and forecast for 2025-2040
+    with one growth model fit. Each region directory receives the same files as
+    the per-sex scripts and forecast_population.py write:
+    nordpred_{sex}_population_interpolated.csv, the interpolation plots and,
+    with forecast, processed-files/nordpred_{sex}_population_interpolated.txt,
+    processed-files/nordpred_{sex}_population_forecast.txt and the forecast
+    plots in plots/ (when both sexes are run). Stages are timed with profiler
+    when one is given.
+
+    Returns:
+        dict: (interpolated, forecast) DataFrames per (region directory, sex);
+            forecast is None without forecast
+    """
+    profiler = profiler or StageProfiler(enabled=False)
+    region_dirs = list(region_dirs)
+    sexes = list(sexes)
+
+    profiler.start('read')
+    try:
+        known_values, age_groups, known_years = read_populations(region_dirs, sexes)
+    except FileNotFoundError as e:
+        print(f"Error: {e.filename} not found.")
+        return None
+    print(f"Successfully loaded population data for {len(region_dirs)} regions x {len(sexes)} sexes "
+          f"x {len(age_groups)} age groups.")
+
+    # One batch for every region, sex and age group
+    profiler.start('interpolation')
+    print(f"Interpolating data for {known_values[..., 0].size} series")
+    interpolated = interpolate_populations(known_values, known_years, ALL_YEARS)
+
+    forecasts = None
+    if forecast:
+        profiler.start('forecast')
+        forecasts, fallback = forecast_populations(ALL_YEARS, interpolated, FORECAST_YEARS)
+        for r, s, a in zip(*np.nonzero(fallback)):
+            print(f"  Warning: Curve fitting failed for {region_dirs[r]} {sexes[s]} {age_groups[a]}, "
+                  f"using linear extrapolation")
+
+    profiler.start('save')
+    results = {}
+    for r, region_dir in enumerate(region_dirs):
+        for s, sex in enumerate(sexes):
+            interpolated_data = population_frame(age_groups, ALL_YEARS, interpolated[r, s])
+            interpolated_data.to_csv(os.path.join(region_dir, f'nordpred_{sex}_population_interpolated.csv'),
+                                     index=False)
+            forecast_data = None
+            if forecast:
+                processed_dir = os.path.join(region_dir, 'processed-files')
+                os.makedirs(processed_dir, exist_ok=True)
+                interpolated_data.to_csv(os.path.join(processed_dir, f'nordpred_{sex}_population_interpolated.txt'),
+                                         index=False)
+                forecast_data = population_frame(age_groups, FORECAST_YEARS, forecasts[r, s])
+                forecast_data.to_csv(os.path.join(processed_dir, f'nordpred_{sex}_population_forecast.txt'),
+                                     index=False)
+            results[(region_dir, sex)] = (interpolated_data, forecast_data)
+        print(f"Population data saved in {region_dir}")
+    profiler.stop()
+
+    if plots:
+        with profiler.stage('plot'):
+            for r, region_dir in enumerate(region_dirs):
+                prefix = f'{os.path.basename(os.path.abspath(region_dir))} ' if len(region_dirs) > 1 else ''
+                for sex in sexes:
+                    plot_interpolation(results[(region_dir, sex)][0], sex, known_years, region_dir, prefix)
+                if forecast and sexes == SEXES:
+                    plot_dir = os.path.join(region_dir, 'plots')
+                    os.makedirs(plot_dir, exist_ok=True)
+                    (male_data, male_forecast), (female_data, female_forecast) = (results[(region_dir, sex)]
+                                                                                  for sex in SEXES)
+                    plot_forecasts(male_data, female_data, male_forecast, female_forecast, FORECAST_YEARS, plot_dir)
+    return results
+
+def interpolate_sex(sex, profiler=None):
+    """
+    Interpolate the population of one sex in the current directory, as
+    interpolate_population_data.py and interpolate_female_population_data.py
+    do, and print it.
+
+    Returns:
+        pd.DataFrame: Interpolated population, or None if the input is missing
+    """
+    results = interpolate_and_forecast(['.'], [sex], profiler, forecast=False)
+    if results is None:
+        return None
+    interpolated_data = results[('.', sex)][0]
+
+    # Display the interpolated data
+    print(f"\nInterpolated {sex} population data (all values are integers):")
+    # Set display option to show integers without decimals
+    pd.set_option('display.float_format', lambda x: '{:.0f}'.format(x))
+    print(interpolated_data)
+    return interpolated_data
+
+def main(sex=None):
+    """
+    Run from the command line. With sex, only interpolate that sex in the
+    current directory; this is the command line of the per-sex scripts.
+    """
+    script = os.path.basename(sys.argv[0])
+    if sex is not None:
+        parser = argparse.ArgumentParser(description=f'Interpolate {sex} population data between census years.')
+        add_profile_arguments(parser)
+        args = parser.parse_args()
+        profiler = StageProfiler.from_args(args)
+        interpolate_sex(sex, profiler)
+        profiler.finish(args.profile, script=script)
+        return
+
+    parser = argparse.ArgumentParser(description='Interpolate and forecast the male and female population of one '
+                                                 'or more regions in one batch.')
+    parser.add_argument('--regions', type=str, default='.',
+                       help='Comma-separated region directories, each holding nordpred_{sex}_population.txt '
+                            '(default: the current directory)')
+    parser.add_argument('--sexes', type=str, default=','.join(SEXES),
+                       help='Comma-separated sexes (default: male,female)')
+    parser.add_argument('--no-forecast', action='store_true', help='Only interpolate')
+    parser.add_argument('--no-plots', action='store_true', help='Only write the data files, without plots')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    sexes = [sex.strip().lower() for sex in args.sexes.split(',')]
+    unknown = [sex for sex in sexes if sex not in SEXES]
+    if unknown:
+        parser.error(f"invalid sex: {', '.join(unknown)} (choose from {', '.join(SEXES)})")
+    profiler = StageProfiler.from_args(args)
+    results = interpolate_and_forecast([d.strip() for d in args.regions.split(',')], sexes, profiler,
+                                       forecast=not args.no_forecast, plots=not args.no_plots)
+    profiler.finish(args.profile, script=script)
+    if results is None:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
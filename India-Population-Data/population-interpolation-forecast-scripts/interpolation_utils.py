@@ -0,0 +1,97 @@
+import os
+import sys
+import numpy as np
+
+# The spline operators, stage profiler and census parser are shared with the
+# population-data-generation pipeline; the scripts in this directory import
+# this module first to put that directory on the path
+POPULATION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'population-data-generation')
+if POPULATION_DIR not in sys.path:
+    sys.path.append(POPULATION_DIR)
+from utils import interpolate_series
+
+def interpolate_populations(known_values, known_years, target_years):
+    """
+    Interpolate population series of any shape, e.g. (regions, sexes, age groups, census years).
+    
+    All series are interpolated with the cached cubic spline operator of
+    utils.interpolation_operators and one matrix multiply.
+    
+    Returns:
+        np.ndarray: Non-negative integer populations, shape (..., target years)
+    """
+    known_values = np.asarray(known_values)
+    flat = known_values.reshape(-1, known_values.shape[-1])
+    interpolated = interpolate_series(flat, known_years, target_years, rounding='round')
+    # Ensure values are positive integers
+    interpolated = np.round(np.maximum(interpolated, 0)).astype(int)
+    return interpolated.reshape(known_values.shape[:-1] + (len(target_years),))
+
+def plot_interpolation(interpolated_data, sex, census_years, output_dir='.', title_prefix=''):
+    """
+    Plot the interpolated population of every age group, on a linear and a log scale.
+    
+    matplotlib is imported here, with the non-interactive Agg backend, so the
+    interpolation can run without it. Figures are closed once saved.
+    
+    Args:
+        interpolated_data (pd.DataFrame): 'row.names' column of age groups and one column per year
+        sex (str): 'male' or 'female', used in titles and file names
+        census_years (list): Years highlighted as census points
+        output_dir (str): Directory of the PNG files
+        title_prefix (str): Text put before the titles, e.g. a region name
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    
+    all_years = [int(year) for year in interpolated_data.columns if year != 'row.names']
+    span = f'{all_years[0]}-{all_years[-1]}'
+    all_age_groups = interpolated_data['row.names'].tolist()
+    values = interpolated_data[[str(year) for year in all_years]].to_numpy()
+    census_columns = [all_years.index(year) for year in census_years]
+    label = f'{title_prefix}{sex.capitalize()}'
+    
+    # Define a color map for the age groups
+    colors = plt.cm.tab20(np.linspace(0, 1, len(all_age_groups)))
+    
+    # One subplot for all age groups, one for a few representative groups
+    selected_age_groups = ['0-5', '15-39', '40-44', '70-74', '95+']
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(15, 20))
+    try:
+        for ax, groups, title in [(ax1, all_age_groups, 'All Age Groups'), (ax2, selected_age_groups, 'Selected Age Groups')]:
+            for age_group in groups:
+                i = all_age_groups.index(age_group)
+                color = colors[i] if ax is ax1 else None
+                line, = ax.plot(all_years, values[i], marker='o', label=age_group, color=color, linewidth=2)
+                # Highlight the census years
+                ax.scatter(census_years, values[i, census_columns], s=100, color='red', zorder=5)
+            ax.set_title(f'{title}: Interpolated {label} Population ({span})', fontsize=16)
+            ax.set_xlabel('Year', fontsize=14)
+            ax.set_ylabel('Population', fontsize=14)
+            ax.legend(loc='upper left', fontsize=12)
+            ax.grid(True)
+        fig.tight_layout()
+        filename = os.path.join(output_dir, f'{sex}_population_interpolation_all_groups.png')
+        fig.savefig(filename, dpi=300)
+        print(f"Visualization saved to {filename}")
+    finally:
+        plt.close(fig)
+    
+    # A log scale for better comparison of different age groups
+    fig, ax = plt.subplots(figsize=(15, 10))
+    try:
+        for i, age_group in enumerate(all_age_groups):
+            ax.plot(all_years, values[i], marker='o', label=age_group, color=colors[i], linewidth=2)
+            ax.scatter(census_years, values[i, census_columns], s=100, color='red', zorder=5)
+        ax.set_title(f'All Age Groups: Interpolated {label} Population ({span}) - Log Scale', fontsize=16)
+        ax.set_xlabel('Year', fontsize=14)
+        ax.set_ylabel('Population (Log Scale)', fontsize=14)
+        ax.set_yscale('log')
+        ax.legend(loc='upper left', fontsize=12)
+        ax.grid(True)
+        filename = os.path.join(output_dir, f'{sex}_population_interpolation_log_scale.png')
+        fig.savefig(filename, dpi=300)
+        print(f"Visualization saved to {filename}")
+    finally:
+        plt.close(fig)
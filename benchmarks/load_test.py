@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+import argparse
+import http.client
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import quote, urlsplit
+
+def build_queries(description, n_queries, seed=0):
+    """
+    Build random population queries over the regions, sexes, age groups and years a server offers.
+
+    Returns:
+        list: Query dicts accepted by the batch endpoint
+    """
+    rng = random.Random(seed)
+    years = description['years']
+    queries = []
+    for _ in range(n_queries):
+        start = rng.randrange(len(years))
+        end = rng.randrange(start, len(years))
+        queries.append({
+            'region': rng.choice(description['regions']),
+            'sex': rng.choice(description['sexes']),
+            'age': rng.sample(description['age_groups'], rng.randint(1, len(description['age_groups']))),
+            'start': years[start],
+            'end': years[end],
+        })
+    return queries
+
+def query_path(query):
+    """Return the GET /population path of a query."""
+    return (f"/population?region={quote(query['region'])}&sex={quote(query['sex'])}"
+            f"&age={quote(','.join(query['age']), safe=',+')}&start={query['start']}&end={query['end']}")
+
+def worker(host, port, requests, deadline, conditional, latencies, statuses, lock):
+    """Send requests round-robin over one keep-alive connection until the deadline."""
+    connection = http.client.HTTPConnection(host, port)
+    etags = {}
+    local_latencies = []
+    local_statuses = Counter()
+    i = 0
+    while time.perf_counter() < deadline:
+        method, path, body = requests[i % len(requests)]
+        i += 1
+        headers = {'Content-Type': 'application/json'} if body else {}
+        if conditional and (path, body) in etags:
+            headers['If-None-Match'] = etags[(path, body)]
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            local_statuses['connection error'] += 1
+            connection.close()
+            connection = http.client.HTTPConnection(host, port)
+            continue
+        local_latencies.append(time.perf_counter() - start)
+        local_statuses[response.status] += 1
+        if response.getheader('ETag'):
+            etags[(path, body)] = response.getheader('ETag')
+    connection.close()
+    with lock:
+        latencies.extend(local_latencies)
+        statuses.update(local_statuses)
+
+def run_load_test(url, duration, concurrency, n_queries, batch_size, conditional, seed=0):
+    """
+    Load a population server with concurrent keep-alive clients for duration seconds.
+
+    Returns:
+        dict: requests, requests per second, slices per second, latency
+            percentiles in milliseconds and response counts per status
+    """
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    connection = http.client.HTTPConnection(host, port)
+    connection.request('GET', '/regions')
+    description = json.loads(connection.getresponse().read())
+    connection.close()
+
+    queries = build_queries(description, n_queries, seed)
+    if batch_size > 1:
+        requests = [('POST', '/population/batch', json.dumps({'queries': queries[i:i + batch_size]}).encode())
+                    for i in range(0, len(queries), batch_size)]
+    else:
+        requests = [('GET', query_path(query), None) for query in queries]
+
+    latencies, statuses, lock = [], Counter(), threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = [threading.Thread(target=worker, args=(host, port, requests[i:] + requests[:i], deadline,
+                                                     conditional, latencies, statuses, lock))
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(int(p / 100 * len(latencies)), len(latencies) - 1)] * 1000 if latencies else None
+    return {
+        'requests': len(latencies),
+        'requests_per_second': len(latencies) / elapsed,
+        'slices_per_second': len(latencies) * max(batch_size, 1) / elapsed,
+        'latency_ms': {'median': statistics.median(latencies) * 1000 if latencies else None,
+                       'p90': percentile(90), 'p99': percentile(99)},
+        'statuses': {str(status): count for status, count in statuses.items()},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the requests per second of population_server.py.')
+    parser.add_argument('--url', type=str, default='http://127.0.0.1:8000', help='Server URL (default: http://127.0.0.1:8000)')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to run (default: 10)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent keep-alive clients (default: 4)')
+    parser.add_argument('--queries', type=int, default=200,
+                       help='Distinct random queries, cycled through by every client (default: 200)')
+    parser.add_argument('--batch-size', type=int, default=1,
+                       help='Queries per POST /population/batch request; 1 sends single GET requests (default: 1)')
+    parser.add_argument('--conditional', action='store_true',
+                       help='Send If-None-Match with the last ETag of each request, as a caching client would')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random queries (default: 0)')
+    parser.add_argument('--output', type=str, default=None, help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = run_load_test(args.url, args.duration, args.concurrency, args.queries, args.batch_size,
+                            args.conditional, args.seed)
+    latency = results['latency_ms']
+    print(f"{results['requests']} requests in {args.duration:g}s with {args.concurrency} clients: "
+          f"{results['requests_per_second']:.0f} requests/s, {results['slices_per_second']:.0f} slices/s")
+    if latency['median'] is not None:
+        print(f"latency ms: median {latency['median']:.2f}  p90 {latency['p90']:.2f}  p99 {latency['p99']:.2f}")
+    print(f"statuses: {results['statuses']}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.output}")
+    if set(results['statuses']) - {'200', '304'}:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'population-data-generation'))
+sys.path.insert(0, os.path.join(ROOT, 'reading-data'))
+
+from utils import (read_census_file, process_census_data, process_census_cube,
+                   interpolate_population, forecast_population, save_data)
+from population_model import PopulationModel
+from read_diabetes_data import process_file
+from synthetic_census import write_census_files, write_disease_file, region_names
+
+DEFAULT_REGIONS = [1, 36, 640, 10000]
+
+def time_call(func, repeat):
+    """
+    Time func() repeat times.
+
+    Returns:
+        dict: min, median and max wall time in seconds, and the number of runs
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {'min': min(timings), 'median': statistics.median(timings), 'max': max(timings), 'repeat': repeat}
+
+def pipeline_benchmarks(work_dir, n_regions, single_year_ages):
+    """
+    Build the benchmarks of the utils.py pipeline stages on synthetic census files.
+
+    Each benchmark gets the outputs of the previous stage, computed once up
+    front, so stages are timed independently.
+
+    Returns:
+        list: (name, function) pairs
+    """
+    input_dir = os.path.join(work_dir, 'census')
+    csv_files = write_census_files(input_dir, n_regions, single_year_ages)
+    census_tables = {csv_file: read_census_file(csv_file) for csv_file in csv_files}
+    states = region_names(n_regions)
+    genders = ['Male', 'Female']
+
+    processed = process_census_cube(csv_files, states, genders, census_tables)
+    interpolated = interpolate_population(processed)
+    forecast = forecast_population(interpolated)
+
+    output_dir = os.path.join(work_dir, 'output')
+    os.makedirs(output_dir, exist_ok=True)
+
+    def save_all():
+        for state in states:
+            for gender in genders:
+                stem = f'{output_dir}/population-{gender.lower()}-{state.lower()}'
+                save_data(interpolated, f'{stem}.txt', state, gender)
+                save_data(forecast, f'{stem}-pred.txt', state, gender)
+
+    def save_all_binary():
+        # One memory-mappable file per cube holds every region and sex
+        save_data(interpolated, f'{output_dir}/population.npc')
+        save_data(forecast, f'{output_dir}/population-pred.npc')
+
+    # A warm model answers from its cached series of the last region
+    model = PopulationModel(input_dir)
+    model.query(states[-1], 'male')
+
+    return [
+        ('read_census_file', lambda: [read_census_file(csv_file) for csv_file in csv_files]),
+        ('process_census_data', lambda: process_census_data(csv_files, states[-1], 'Male', census_tables)),
+        ('process_census_cube', lambda: process_census_cube(csv_files, states, genders, census_tables)),
+        ('interpolate_population', lambda: interpolate_population(processed)),
+        ('forecast_population', lambda: forecast_population(interpolated)),
+        ('save_data', save_all),
+        ('save_data_binary', save_all_binary),
+        ('population_query', lambda: model.query(states[-1], 'male', '40-44', [2015, 2027])),
+    ]
+
+def disease_benchmarks(work_dir, n_rows):
+    """
+    Build the read_diabetes_data.process_file benchmark on a synthetic disease file.
+
+    The disease files hold one row per year; to scale with the number of
+    regions the synthetic file holds one row per region.
+
+    Returns:
+        list: (name, function) pairs
+    """
+    input_csv = write_disease_file(os.path.join(work_dir, 'disease.csv'), n_rows)
+    output_base = os.path.join(work_dir, 'disease')
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            process_file(input_csv, output_base)
+
+    def run_confidence_intervals():
+        # Also checks that the bounds enclose the estimates, as in the GBD files
+        with contextlib.redirect_stdout(io.StringIO()):
+            process_file(input_csv, output_base, confidence_intervals=True)
+
+    return [('read_diabetes_data.process_file', run),
+            ('read_diabetes_data.process_file --confidence-intervals', run_confidence_intervals)]
+
+def run_benchmarks(region_counts, repeat, single_year_ages, only=None):
+    """
+    Run every benchmark at every region count.
+
+    Args:
+        region_counts (list): Numbers of regions to benchmark
+        repeat (int): Timed runs per benchmark
+        single_year_ages (int): Number of single-year ages in the synthetic census
+        only (list): Optional benchmark names to run
+
+    Returns:
+        dict: Timings keyed by '{benchmark}[{regions}]'
+    """
+    results = {}
+    for n_regions in region_counts:
+        with tempfile.TemporaryDirectory(prefix=f'bench-{n_regions}-') as work_dir:
+            benchmarks = (pipeline_benchmarks(work_dir, n_regions, single_year_ages)
+                          + disease_benchmarks(work_dir, n_regions))
+            for name, func in benchmarks:
+                if only and name not in only:
+                    continue
+                key = f'{name}[{n_regions}]'
+                results[key] = dict(time_call(func, repeat), benchmark=name, regions=n_regions)
+                print(f"{key:<45} min {results[key]['min']:.4f}s  median {results[key]['median']:.4f}s")
+    return results
+
+def environment():
+    """Describe the machine and library versions the benchmarks ran with."""
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+def compare_results(results, baseline, threshold):
+    """
+    Compare benchmark timings with a baseline.
+
+    The minimum time of each run is compared, as the least noisy estimate.
+
+    Args:
+        results (dict): Timings from run_benchmarks
+        baseline (dict): Timings from a previous results file
+        threshold (float): Allowed relative slowdown, e.g. 0.2 for 20%
+
+    Returns:
+        list: (key, baseline seconds, current seconds, ratio, regressed) for every
+            benchmark present in both
+    """
+    comparisons = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        ratio = result['min'] / baseline[key]['min'] if baseline[key]['min'] > 0 else float('inf')
+        comparisons.append((key, baseline[key]['min'], result['min'], ratio, ratio > 1 + threshold))
+    return comparisons
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the population pipeline and disease file conversion.')
+    parser.add_argument('--regions', type=str, default=','.join(str(n) for n in DEFAULT_REGIONS),
+                       help='Comma-separated numbers of regions to benchmark (default: 1,36,640,10000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per benchmark (default: 3)')
+    parser.add_argument('--single-year-ages', type=int, default=13,
+                       help="Number of single-year ages after '0-6' in the synthetic census (default: 13)")
+    parser.add_argument('--only', type=str, default=None, help='Comma-separated benchmark names to run (default: all)')
+    parser.add_argument('--output', type=str, default='benchmark-results.json',
+                       help='JSON file to write results to (default: benchmark-results.json)')
+    parser.add_argument('--baseline', type=str, default=None, help='Results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                       help='Relative slowdown against the baseline reported as a regression (default: 0.2)')
+    args = parser.parse_args()
+
+    region_counts = [int(n.strip()) for n in args.regions.split(',')]
+    only = [name.strip() for name in args.only.split(',')] if args.only else None
+
+    results = run_benchmarks(region_counts, args.repeat, args.single_year_ages, only)
+    with open(args.output, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        comparisons = compare_results(results, baseline, args.threshold)
+        print(f"\nComparison with {args.baseline} (regression threshold {args.threshold:.0%}):")
+        for key, before, after, ratio, regressed in comparisons:
+            flag = 'REGRESSION' if regressed else ''
+            print(f"{key:<45} {before:.4f}s -> {after:.4f}s  x{ratio:.2f}  {flag}")
+        regressions = [key for key, _, _, _, regressed in comparisons if regressed]
+        if regressions:
+            print(f"{len(regressions)} benchmarks regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import numpy as np
+
+CENSUS_YEARS = [1991, 2001, 2011]
+
+# Age groups and header labels of the GBD-style disease input files read by
+# reading-data/read_diabetes_data.py ('75-84 Years' covers two nordpred groups)
+DISEASE_AGE_LABELS = [
+    '<5 years', '5-9 Years', '5-14 Years', '15-19 years', '20-24 Years', '25-29 Years',
+    '30-34 Years', '35-39 Years', '40-44 years', '45-49 years', '50-54 Years', '55-59 Years',
+    '60-64 Years', '65-69 Years', '70-74 Years', '75-84 Years', '85+ years'
+]
+
+def region_names(n_regions):
+    """Return n_regions distinct region names."""
+    width = len(str(n_regions))
+    return [f'Region {i:0{width}d}' for i in range(1, n_regions + 1)]
+
+def census_age_labels(single_year_ages=13):
+    """
+    Return the age labels of a synthetic census table.
+
+    Like the real tables, ages start with '0-6', continue with single years,
+    then five-year bands up to '75-79', followed by '80+' and 'Age not stated'.
+
+    Args:
+        single_year_ages (int): Number of single-year ages after '0-6'
+            (13 gives 7-19 as in 2001.csv; at most 73, i.e. up to 79)
+
+    Returns:
+        list: Age labels, without the leading 'All ages' total
+    """
+    last_single = min(6 + single_year_ages, 79)
+    labels = ['0-6'] + [str(age) for age in range(7, last_single + 1)]
+    band_start = last_single + 1
+    # Fill up to the next five-year boundary with single years
+    while band_start % 5 != 0 and band_start < 80:
+        labels.append(str(band_start))
+        band_start += 1
+    labels += [f'{lo}-{lo + 4}' for lo in range(band_start, 80, 5)]
+    return labels + ['80+', 'Age not stated']
+
+def make_census_table(regions, year, single_year_ages=13, seed=0):
+    """
+    Build the rows of a synthetic census table in the 1991/2001/2011.csv schema.
+
+    Counts are drawn per (region, age) from a declining age profile scaled by a
+    random region size, with population growing between census years.
+
+    Returns:
+        list: Rows of (State, Age, Persons, Males, Females)
+    """
+    labels = census_age_labels(single_year_ages)
+    age_labels = labels[:-1]
+
+    # Width of each age label in years, for a per-year age profile
+    widths = []
+    for label in age_labels:
+        if label.endswith('+'):
+            widths.append(10)
+        elif '-' in label:
+            lo, hi = map(int, label.split('-'))
+            widths.append(hi - lo + 1)
+        else:
+            widths.append(1)
+    widths = np.array(widths, dtype=float)
+    starts = np.concatenate([[0], np.cumsum(widths)[:-1]])
+    profile = widths * np.exp(-starts / 35.0)
+
+    # Region sizes depend on the seed only, so a region is consistent across census years
+    sizes = np.random.default_rng(seed).lognormal(mean=14.0, sigma=1.2, size=len(regions))
+    sizes *= 1.0 + 0.018 * (year - CENSUS_YEARS[0])
+    rng = np.random.default_rng([seed, year])
+    expected = sizes[:, None] * profile / profile.sum()
+    males = rng.poisson(expected * 0.515)
+    females = rng.poisson(expected * 0.485)
+    not_stated = rng.poisson(sizes * 0.001)
+    males = np.column_stack([males, rng.binomial(not_stated, 0.5)])
+    females = np.column_stack([females, not_stated - males[:, -1]])
+
+    rows = []
+    for region, male_counts, female_counts in zip(regions, males.tolist(), females.tolist()):
+        rows.append((region, 'All ages', sum(male_counts) + sum(female_counts),
+                     sum(male_counts), sum(female_counts)))
+        for label, m, f in zip(labels, male_counts, female_counts):
+            rows.append((region, label, m + f, m, f))
+    return rows
+
+def write_census_files(output_dir, n_regions, single_year_ages=13, seed=0):
+    """
+    Write synthetic 1991.csv, 2001.csv and 2011.csv files.
+
+    Args:
+        output_dir (str): Directory to write the files to
+        n_regions (int): Number of regions (states)
+        single_year_ages (int): Number of single-year ages after '0-6'
+        seed (int): Random seed; the same arguments always give the same files
+
+    Returns:
+        list: Paths of the files written, in census year order
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    regions = region_names(n_regions)
+    paths = []
+    for year in CENSUS_YEARS:
+        path = os.path.join(output_dir, f'{year}.csv')
+        rows = make_census_table(regions, year, single_year_ages, seed)
+        with open(path, 'w') as f:
+            f.write('State,Age,Persons,Males,Females\n')
+            f.write(''.join(f'{s},{a},{p},{m},{fe}\n' for s, a, p, m, fe in rows))
+        paths.append(path)
+    return paths
+
+def write_disease_file(path, n_rows, confidence_intervals=True, seed=0):
+    """
+    Write a synthetic disease prevalence file in the two-row header format of
+    18-groups-1991-2021-input-data.
+
+    Each data row holds male and female rates for every age group, optionally
+    followed by the upper and lower bound as in the GBD files
+    ('18.07 22.88 14.01'). Rows are labelled with consecutive years starting
+    at 1990.
+
+    Args:
+        path (str): File to write
+        n_rows (int): Number of data rows
+        confidence_intervals (bool): Append CI bounds to each value
+        seed (int): Random seed
+
+    Returns:
+        str: The path written
+    """
+    rng = np.random.default_rng([seed, n_rows])
+    rates = rng.uniform(5, 300, size=(n_rows, 2 * len(DISEASE_AGE_LABELS)))
+
+    top = ['Type 1']
+    bottom = ['Prevalence Rate']
+    for label in DISEASE_AGE_LABELS:
+        top += [label, '']
+        bottom += ['Male ', 'Female']
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(','.join(top) + '\n')
+        f.write(','.join(bottom) + '\n')
+        for i, row in enumerate(rates):
+            if confidence_intervals:
+                # Estimate, upper bound, lower bound
+                cells = [f'{v:.2f} {v * 1.3:.2f} {v * 0.75:.2f}' for v in row]
+            else:
+                cells = [f'{v:.2f}' for v in row]
+            f.write(','.join([str(1990 + i)] + cells) + '\n')
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description='Write synthetic census (and disease) input files for benchmarking.')
+    parser.add_argument('--output-dir', type=str, required=True, help='Directory to write the files to')
+    parser.add_argument('--regions', type=int, default=36, help='Number of regions (default: 36)')
+    parser.add_argument('--single-year-ages', type=int, default=13,
+                       help="Number of single-year ages after '0-6' (default: 13, i.e. 7-19)")
+    parser.add_argument('--disease-rows', type=int, default=0,
+                       help='Also write disease.csv with this many rows (default: 0, none)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    args = parser.parse_args()
+
+    for path in write_census_files(args.output_dir, args.regions, args.single_year_ages, args.seed):
+        print(f"Wrote {path}")
+    if args.disease_rows:
+        path = write_disease_file(os.path.join(args.output_dir, 'disease.csv'), args.disease_rows, seed=args.seed)
+        print(f"Wrote {path}")
+
+if __name__ == '__main__':
+    main()
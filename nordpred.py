@@ -0,0 +1,807 @@
+#!/usr/bin/env python3
+"""
+Nordpred age-period-cohort predictions on NumPy.
+
+A Python implementation of nordpred.estimate, nordpred.prediction, nordpred and
+nordpred.getpred from nordpred.s (Bjørn Møller and Harald Fekjaer, Cancer
+Registry of Norway), so predictions can run in-process instead of through an
+Rscript call per state and gender. The GLMs are fitted with the same iteratively
+reweighted least squares scheme as R's glm.fit (starting values, convergence
+criterion and aliased columns), so coefficients and predictions agree with the
+R implementation to floating-point tolerance.
+"""
+
+import argparse
+import os
+import re
+import sys
+import numpy as np
+import pandas as pd
+from scipy.stats import chi2
+
+AGE_GROUPS = [
+    '0-4', '5-9', '10-14', '15-19', '20-24', '25-29', '30-34', '35-39', '40-44',
+    '45-49', '50-54', '55-59', '60-64', '65-69', '70-74', '75-79', '80-84', '85+'
+]
+NO_AGE_GROUPS = len(AGE_GROUPS)
+
+DEFAULT_CUTTREND = (0, .25, .5, .75, .75)
+
+# Standard population weights used by run-nordpred-analysis.R
+WSTAND = [0.12, 0.1, 0.09, 0.09, 0.08, 0.08, 0.06, 0.06, 0.06, 0.06, 0.05, 0.04, 0.04,
+          0.03, 0.02, 0.01, 0.005, 0.005]
+
+# glm.control() defaults
+GLM_EPSILON = 1e-8
+GLM_MAXIT = 25
+
+_DOUBLE_EPS = np.finfo(float).eps
+
+class GLMFit:
+    """
+    Result of an IRLS fit.
+
+    coefficients follows the layout of R's coef(glm): one entry per model matrix
+    column, NaN for columns aliased by the parametrisation. failed is set when no
+    valid set of coefficients has been found; the coefficients are then NaN.
+    """
+
+    def __init__(self, coefficients, names, deviance, df_residual, fitted, iterations, converged, failed=False):
+        self.coefficients = coefficients
+        self.names = names
+        self.deviance = deviance
+        self.df_residual = df_residual
+        self.fitted = fitted
+        self.iterations = iterations
+        self.converged = converged
+        self.failed = failed
+
+    def __repr__(self):
+        return (f"GLMFit(deviance={self.deviance:.6g}, df_residual={self.df_residual}, "
+                f"iterations={self.iterations}, converged={self.converged})")
+
+class NordpredEstimate:
+    """Fitted Nordpred model, as returned by estimate() (R: class 'nordpred.estimate')."""
+
+    def __init__(self, glm, cases, pyr, periods, noperiod, gofpvalue, startestage,
+                 suggestionrecent, pvaluerecent, linkfunc):
+        self.glm = glm
+        self.cases = cases
+        self.pyr = pyr
+        self.periods = periods
+        self.noperiod = noperiod
+        self.gofpvalue = gofpvalue
+        self.startestage = startestage
+        self.suggestionrecent = suggestionrecent
+        self.pvaluerecent = pvaluerecent
+        self.linkfunc = linkfunc
+
+    def __repr__(self):
+        return (f"NordpredEstimate(noperiod={self.noperiod}, startestage={self.startestage}, "
+                f"linkfunc={self.linkfunc!r}, gofpvalue={self.gofpvalue:.4g})")
+
+class NordpredPrediction:
+    """
+    Observed and predicted cases, as returned by prediction() (R: class 'nordpred').
+
+    predictions is an (18 x periods) array of observed cases followed by the
+    predicted cases of the last nopred periods.
+    """
+
+    def __init__(self, predictions, pyr, periods, nopred, noperiod, gofpvalue, recent, pvaluerecent,
+                 cuttrend, startuseage, startestage, glm):
+        self.predictions = predictions
+        self.pyr = pyr
+        self.periods = periods
+        self.nopred = nopred
+        self.noperiod = noperiod
+        self.gofpvalue = gofpvalue
+        self.recent = recent
+        self.pvaluerecent = pvaluerecent
+        self.cuttrend = cuttrend
+        self.startuseage = startuseage
+        self.startestage = startestage
+        self.glm = glm
+
+    def __repr__(self):
+        return (f"NordpredPrediction(nopred={self.nopred}, noperiod={self.noperiod}, recent={self.recent}, "
+                f"cuttrend={[float(c) for c in self.cuttrend]})")
+
+    def to_frame(self):
+        """Return the predictions as a DataFrame with age groups as rows and periods as columns."""
+        return pd.DataFrame(self.predictions, index=AGE_GROUPS, columns=self.periods)
+
+def _as_matrix(data):
+    """Return (values, period labels) of a DataFrame or array with age groups as rows."""
+    if isinstance(data, pd.DataFrame):
+        return data.to_numpy(dtype=float), [str(col) for col in data.columns]
+    values = np.asarray(data, dtype=float)
+    return values, [f'Periode {i}' for i in range(1, values.shape[1] + 1)]
+
+def apc_design(dnoperiods, noperiod, startestage, period_factor=True, period_squared=False):
+    """
+    Build the age-period-cohort model matrix used by nordpred.estimate.
+
+    Rows are the (age, period) cells with age >= startestage among the last
+    noperiod periods, in R's column-major order (age varies fastest). Columns
+    follow R's model.matrix for Cases ~ as.factor(Age) + Period [+ I(Period^2)]
+    [+ as.factor(Period)] + as.factor(Cohort) - 1 with treatment contrasts.
+    The last period level and the last cohort level are linearly dependent on
+    the earlier columns; R's pivoted QR reports them as aliased (NA), and they
+    are left out of the returned matrix.
+
+    Args:
+        dnoperiods (int): Number of observed periods
+        noperiod (int): Number of (most recent) periods to estimate from
+        startestage (int): First age group (1-based) to estimate from
+        period_factor (bool): Include the period factor (the Nordpred model)
+        period_squared (bool): Include I(Period^2) (the test model for 'recent')
+
+    Returns:
+        tuple: (X, cells, names, aliased) where cells are the flat indices of
+            the selected cells in an (18 x dnoperiods) column-major array,
+            names are the coefficient names of the full R layout and aliased
+            marks the entries of that layout left out of X
+    """
+    ages = np.arange(startestage, NO_AGE_GROUPS + 1)
+    periods = np.arange(dnoperiods - noperiod + 1, dnoperiods + 1)
+    age = np.tile(ages, len(periods))
+    period = np.repeat(periods, len(ages))
+    cohort = NO_AGE_GROUPS - age + period
+    cells = (period - 1) * NO_AGE_GROUPS + (age - 1)
+
+    columns = [(age == a).astype(float) for a in ages]
+    names = [f'as.factor(Age){a}' for a in ages]
+    aliased = [False] * len(ages)
+
+    columns.append(period.astype(float))
+    names.append('Period')
+    aliased.append(False)
+
+    if period_squared:
+        columns.append(period.astype(float) ** 2)
+        names.append('I(Period^2)')
+        aliased.append(False)
+
+    if period_factor:
+        for p in periods[1:]:
+            columns.append((period == p).astype(float))
+            names.append(f'as.factor(Period){p}')
+            aliased.append(p == periods[-1])
+
+    cohorts = np.unique(cohort)
+    for c in cohorts[1:]:
+        columns.append((cohort == c).astype(float))
+        names.append(f'as.factor(Cohort){c}')
+        aliased.append(c == cohorts[-1])
+
+    aliased = np.array(aliased)
+    X = np.column_stack([col for col, drop in zip(columns, aliased) if not drop])
+    return X, cells, names, aliased
+
+def _poisson_deviance(y, mu):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        term = np.where(y > 0, y * np.log(y / mu), 0.0)
+    return 2 * np.sum(term - (y - mu), axis=-1)
+
+def _link_functions(link, pyr):
+    """Return (offset, linkinv, mu_eta, starting eta function) of a link, with person-years pyr."""
+    if link == 'power5':
+        def linkinv(eta):
+            return np.maximum(_DOUBLE_EPS, pyr * eta ** 5)
+
+        def mu_eta(eta):
+            return np.maximum(_DOUBLE_EPS, 5 * pyr * eta ** 4)
+
+        return np.zeros_like(pyr), linkinv, mu_eta, lambda y: ((y + 0.1) / pyr) ** 0.2
+    if link == 'poisson':
+        def linkinv(eta):
+            return np.maximum(np.exp(eta), _DOUBLE_EPS)
+
+        return np.log(pyr), linkinv, linkinv, lambda y: np.log(y + 0.1)
+    raise ValueError(f"Unknown linkfunc: {link}")
+
+def irls_batch(X, y, link, pyr, epsilon=GLM_EPSILON, maxit=GLM_MAXIT):
+    """
+    Fit many Poisson GLMs with a shared model matrix by iteratively reweighted least squares.
+
+    Each region follows R's glm.fit: the same starting values, convergence
+    criterion and step halving. The weighted least-squares systems of all
+    regions still iterating are solved together with one stacked QR
+    decomposition per iteration; regions are masked out once converged. A
+    region for which no valid set of coefficients is found (where R's glm.fit
+    stops with an error) is masked out as failed, with NaN coefficients,
+    deviance and fitted values, and the other regions go on.
+
+    Args:
+        X (np.ndarray): Full-rank model matrix (observations x parameters), shared by all regions
+        y (np.ndarray): Observed cases, shape (regions, observations)
+        link (str): 'power5' for mu = pyr * eta^5, or 'poisson' for a log link with offset log(pyr)
+        pyr (np.ndarray): Person-years, shape (regions, observations)
+        epsilon (float): Convergence tolerance on the relative change in deviance
+        maxit (int): Maximum number of iterations
+
+    Returns:
+        tuple: (coefficients, deviances, fitted values, iterations, converged, failed),
+            each with the regions along the first axis
+    """
+    y = np.asarray(y, dtype=float)
+    pyr = np.asarray(pyr, dtype=float)
+    n_regions = y.shape[0]
+    offset, linkinv, mu_eta, start_eta = _link_functions(link, pyr)
+
+    eta = start_eta(y)
+    mu = linkinv(eta)
+    devold = _poisson_deviance(y, mu)
+    coef = np.full((n_regions, X.shape[1]), np.nan)
+    coefold = np.full_like(coef, np.nan)
+    dev = devold.copy()
+    iterations = np.zeros(n_regions, dtype=int)
+    converged = np.zeros(n_regions, dtype=bool)
+    failed = np.zeros(n_regions, dtype=bool)
+    active = np.arange(n_regions)
+
+    for iteration in range(1, maxit + 1):
+        if len(active) == 0:
+            break
+        _, linkinv_a, mu_eta_a, _ = _link_functions(link, pyr[active])
+        d = mu_eta_a(eta[active])
+        # Observations with a zero derivative get zero weight, as dropping them does in glm.fit
+        good = d != 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = np.where(good, eta[active] - offset[active] + (y[active] - mu[active]) / d, 0.0)
+            w = np.where(good, np.sqrt(d ** 2 / mu[active]), 0.0)
+        q, r = np.linalg.qr(X[None] * w[..., None])
+        start = np.linalg.solve(r, np.einsum('bnk,bn->bk', q, z * w)[..., None])[..., 0]
+
+        eta_new = start @ X.T + offset[active]
+        mu_new = linkinv_a(eta_new)
+        dev_new = _poisson_deviance(y[active], mu_new)
+
+        def invalid_fits():
+            return ~(np.isfinite(dev_new) & np.isfinite(mu_new).all(axis=1) & (mu_new > 0).all(axis=1))
+
+        # Step halving for regions where the deviance is not finite or mu is invalid
+        for _ in range(maxit):
+            # Regions without previous coefficients cannot step back and fail below
+            invalid = invalid_fits() & ~np.isnan(coefold[active]).any(axis=1)
+            if not invalid.any():
+                break
+            start[invalid] = (start[invalid] + coefold[active[invalid]]) / 2
+            eta_new[invalid] = start[invalid] @ X.T + offset[active[invalid]]
+            mu_new[invalid] = linkinv_a(eta_new)[invalid]
+            dev_new[invalid] = _poisson_deviance(y[active[invalid]], mu_new[invalid])
+
+        # No valid set of coefficients has been found for regions still invalid: mask them out
+        bad = invalid_fits()
+        failed[active[bad]] = True
+        coef[active[bad]] = np.nan
+        dev[active[bad]] = np.nan
+        mu[active[bad]] = np.nan
+        iterations[active[bad]] = iteration
+        ok = ~bad
+        active = active[ok]
+
+        eta[active] = eta_new[ok]
+        mu[active] = mu_new[ok]
+        dev[active] = dev_new[ok]
+        coef[active] = start[ok]
+        iterations[active] = iteration
+
+        done = np.abs(dev_new[ok] - devold[active]) / (np.abs(dev_new[ok]) + 0.1) < epsilon
+        converged[active[done]] = True
+        devold[active] = dev_new[ok]
+        coefold[active] = start[ok]
+        active = active[~done]
+
+    return coef, dev, mu, iterations, converged, failed
+
+def irls(X, y, link, pyr, epsilon=GLM_EPSILON, maxit=GLM_MAXIT):
+    """
+    Fit a single Poisson GLM by iteratively reweighted least squares, as R's glm.fit does.
+
+    See irls_batch; y and pyr are one-dimensional here.
+
+    Returns:
+        tuple: (coefficients, deviance, fitted values, iterations, converged)
+
+    Raises:
+        FloatingPointError: If no valid set of coefficients has been found
+    """
+    coef, dev, mu, iterations, converged, failed = irls_batch(X, np.asarray(y)[None], link,
+                                                              np.asarray(pyr)[None], epsilon, maxit)
+    if failed[0]:
+        raise FloatingPointError("no valid set of coefficients has been found")
+    return coef[0], dev[0], mu[0], iterations[0], bool(converged[0])
+
+def _fit_batch(cases, pyr, noperiod, startestage, link, period_factor=True, period_squared=False):
+    """
+    Fit one APC model per region and return GLMFits with R's coefficient layout.
+
+    cases and pyr are (regions x 18 x periods) arrays with the same periods for every region.
+    """
+    n_regions, _, dnoperiods = cases.shape
+    X, cells, names, aliased = apc_design(dnoperiods, noperiod, startestage, period_factor, period_squared)
+    y = cases.transpose(0, 2, 1).reshape(n_regions, -1)[:, cells]
+    person_years = pyr[:, :, :dnoperiods].transpose(0, 2, 1).reshape(n_regions, -1)[:, cells]
+    coef, deviance, fitted, iterations, converged, failed = irls_batch(X, y, link, person_years)
+    coefficients = np.full((n_regions, len(names)), np.nan)
+    coefficients[:, ~aliased] = coef
+    df_residual = len(cells) - X.shape[1]
+    return [GLMFit(coefficients[i], names, deviance[i], df_residual, fitted[i], iterations[i], bool(converged[i]),
+                   bool(failed[i]))
+            for i in range(n_regions)]
+
+def _check_inputs(cases, pyr, noperiod, linkfunc):
+    if cases.shape[0] != NO_AGE_GROUPS or pyr.shape[0] != NO_AGE_GROUPS:
+        raise ValueError('"cases" and "pyr" must have data for 18 age groups')
+    if cases.shape[1] > pyr.shape[1]:
+        raise ValueError('"pyr" must include information about all periods in "cases"')
+    if pyr.shape[1] == cases.shape[1]:
+        raise ValueError('"pyr" must include information on future rates (E.g. must be greater than "cases")')
+    if pyr.shape[1] - cases.shape[1] > 5:
+        raise ValueError('Package can not predict more than 5 periods (given by sizes of "pyr" and "cases")')
+    if cases.shape[1] - noperiod < 0:
+        raise ValueError('More periods specified in "noperiod" than columns in "cases"')
+    if noperiod < 3:
+        raise ValueError('"noperiod" must be 3 or larger to get enough for estimating')
+    if linkfunc not in ('power5', 'poisson'):
+        raise ValueError('Unknown "linkfunc"')
+
+def estimate(cases, pyr, noperiod, startestage, linkfunc='power5'):
+    """
+    Fit the Nordpred age-period-cohort model (R: nordpred.estimate).
+
+    Args:
+        cases (pd.DataFrame or np.ndarray): Observed cases, 18 age groups x observed periods
+        pyr (pd.DataFrame or np.ndarray): Person-years, 18 age groups x observed and future periods
+        noperiod (int): Number of most recent periods to estimate from (at least 3)
+        startestage (int): First age group (1-based) included in the estimation
+        linkfunc (str): 'power5' (the Nordpred model) or 'poisson'
+
+    Returns:
+        NordpredEstimate: The fitted model
+
+    Raises:
+        FloatingPointError: If no valid set of coefficients has been found
+    """
+    result = estimate_many([cases], [pyr], noperiod, startestage, linkfunc)[0]
+    if isinstance(result, FloatingPointError):
+        raise FloatingPointError("no valid set of coefficients has been found")
+    return result
+
+def estimate_many(cases, pyr, noperiod, startestage, linkfunc='power5'):
+    """
+    Fit the Nordpred model for many regions in batched IRLS iterations.
+
+    Regions with the same numbers of observed and future periods share one
+    model matrix, so each IRLS iteration solves their weighted least-squares
+    systems together (see irls_batch). Results are identical to calling
+    estimate() for every region. A region for which no valid set of
+    coefficients has been found does not stop the others: its
+    FloatingPointError is returned in place of its estimate.
+
+    Args:
+        cases (list or np.ndarray): Observed cases per region, each 18 age groups x
+            observed periods, or a (regions x 18 x periods) array
+        pyr (list or np.ndarray): Person-years per region, each 18 age groups x
+            observed and future periods
+        noperiod (int): Number of most recent periods to estimate from (at least 3)
+        startestage (int): First age group (1-based) included in the estimation
+        linkfunc (str): 'power5' (the Nordpred model) or 'poisson'
+
+    Returns:
+        list: NordpredEstimate, or FloatingPointError for a failed fit, per region,
+            in input order
+    """
+    cases = [_as_matrix(c)[0] for c in cases]
+    pyr_periods = [_as_matrix(p) for p in pyr]
+    if len(cases) != len(pyr_periods):
+        raise ValueError('"cases" and "pyr" must hold the same number of regions')
+    for c, (p, _) in zip(cases, pyr_periods):
+        _check_inputs(c, p, noperiod, linkfunc)
+
+    # Group regions by shape so each group shares a model matrix
+    groups = {}
+    for i, (c, (p, _)) in enumerate(zip(cases, pyr_periods)):
+        groups.setdefault((c.shape, p.shape), []).append(i)
+
+    results = [None] * len(cases)
+    for members in groups.values():
+        group_cases = np.stack([cases[i] for i in members])
+        group_pyr = np.stack([pyr_periods[i][0] for i in members])
+        glms = _fit_batch(group_cases, group_pyr, noperiod, startestage, linkfunc)
+
+        # Basis for suggesting 'recent': is a quadratic period term significant?
+        mod1 = _fit_batch(group_cases, group_pyr, noperiod, startestage, 'poisson', period_factor=False)
+        mod2 = _fit_batch(group_cases, group_pyr, noperiod, startestage, 'poisson', period_factor=False,
+                          period_squared=True)
+
+        gofpvalues = chi2.sf([glm.deviance for glm in glms], glms[0].df_residual)
+        pvaluesrecent = chi2.sf([m1.deviance - m2.deviance for m1, m2 in zip(mod1, mod2)],
+                                mod1[0].df_residual - mod2[0].df_residual)
+
+        for k, i in enumerate(members):
+            if glms[k].failed:
+                results[i] = FloatingPointError(f"no valid set of coefficients has been found (region {i})")
+                continue
+            results[i] = NordpredEstimate(glms[k], cases[i], pyr_periods[i][0], pyr_periods[i][1], noperiod,
+                                          float(gofpvalues[k]), startestage, bool(pvaluesrecent[k] < 0.05),
+                                          float(pvaluesrecent[k]), linkfunc)
+    return results
+
+def prediction(est, startuseage, recent, cuttrend=DEFAULT_CUTTREND):
+    """
+    Predict cases for the future periods of a fitted model (R: nordpred.prediction).
+
+    Args:
+        est (NordpredEstimate): Fitted model from estimate()
+        startuseage (int): First age group (1-based) predicted from the model; younger
+            groups use the mean rate of the last two observed periods
+        recent (bool): Use the trend of the last two periods instead of the average drift
+        cuttrend (sequence): Fraction of the drift removed in each future period
+
+    Returns:
+        NordpredPrediction: Observed and predicted cases
+    """
+    nonewpred = est.pyr.shape[1] - est.cases.shape[1]
+    cases, _ = prediction_many([est], startuseage, [(recent, cuttrend)])
+    return NordpredPrediction(cases[0, 0], est.pyr, est.periods, nonewpred, est.noperiod, est.gofpvalue, recent,
+                              est.pvaluerecent, np.asarray(cuttrend, dtype=float)[:nonewpred], startuseage,
+                              est.startestage, est.glm)
+
+def prediction_many(estimates, startuseage, scenarios):
+    """
+    Predict cases and rates for many fitted models and trend scenarios in one pass.
+
+    The cohort, age and drift parameters of every model are gathered with
+    array indexing into an (age group x future period) surface per model, and
+    every (recent, cuttrend) scenario is evaluated on it at once. The results
+    equal those of prediction() for every model and scenario.
+
+    Args:
+        estimates (list): NordpredEstimate per region, sharing the numbers of periods,
+            noperiod, startestage and link function (e.g. from estimate_many)
+        startuseage (int): First age group (1-based) predicted from the model
+        scenarios (list): (recent, cuttrend) pairs, e.g.
+            [(True, (0, .25, .5, .75, .75)), (False, (0, 0, 0, 0, 0))]
+
+    Returns:
+        tuple: (cases, rates) arrays of shape (scenarios, regions, 18, periods) holding
+            observed and predicted cases, and rates per 100 000 person-years
+    """
+    first = estimates[0]
+    for est in estimates:
+        if (est.cases.shape, est.pyr.shape, est.noperiod, est.startestage, est.linkfunc) != \
+                (first.cases.shape, first.pyr.shape, first.noperiod, first.startestage, first.linkfunc):
+            raise ValueError("All estimates must share their periods, noperiod, startestage and linkfunc")
+    if first.startestage > startuseage:
+        raise ValueError('"startuseage" is set to high compared to "startestage" in "nordpred.estimate.object"')
+
+    cases = np.stack([est.cases for est in estimates])
+    pyr = np.stack([est.pyr for est in estimates])
+    coefficients = np.stack([est.glm.coefficients for est in estimates])
+    noperiod, startestage = first.noperiod, first.startestage
+    nototper = pyr.shape[2]
+    noobsper = cases.shape[2]
+    nonewpred = nototper - noobsper
+
+    cuttrends = []
+    for _, cuttrend in scenarios:
+        if len(cuttrend) < nonewpred:
+            raise ValueError('"cuttrend" must always be at least the same length as '
+                             'the number of periods with population forecasts')
+        cuttrends.append(np.asarray(cuttrend, dtype=float)[:nonewpred])
+    recent = np.array([bool(r) for r, _ in scenarios])
+    # Cumulative drift multiplier per scenario and future period
+    driftmp = np.cumsum(1 - np.array(cuttrends), axis=1)
+
+    future_pyr = pyr[:, :, noobsper:]
+    predicted = np.empty((len(scenarios), len(estimates), NO_AGE_GROUPS, nonewpred))
+
+    # For age groups with little data, use the mean incidence of the last two periods
+    young = slice(0, startuseage - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        obsinc = cases[:, young, -2:] / pyr[:, young, noobsper - 2:noobsper]
+    obsinc[np.isnan(obsinc)] = 0
+    predicted[:, :, young] = (obsinc.mean(axis=2)[:, :, None] * future_pyr[:, young])[None]
+
+    # Parameter positions follow R's coefficient layout: ages, drift, period levels, cohort levels
+    noages = NO_AGE_GROUPS - startestage + 1
+    driftfind = noages
+    ages = np.arange(startuseage, NO_AGE_GROUPS + 1)
+    coh = (NO_AGE_GROUPS - ages)[:, None] + noperiod + np.arange(1, nonewpred + 1)[None, :]
+    cohfind = noages + noperiod + coh - 1
+    maxcoh = NO_AGE_GROUPS - startuseage + noperiod
+
+    agepar = coefficients[:, ages - startestage]
+    driftpar = coefficients[:, driftfind]
+    lppar = coefficients[:, driftfind + noperiod - 2]
+    # Cohorts too young to be estimated use the youngest estimated cohort
+    youngest = np.nan_to_num(coefficients[:, -1 - (startuseage - startestage)])
+    cohpar = np.where(coh < maxcoh, coefficients[:, np.minimum(cohfind, coefficients.shape[1]) - 1],
+                      youngest[:, None, None])
+
+    # recent: agepar + drift*noobsper + (drift - lppar)*driftmp + cohpar
+    # otherwise: agepar + drift*(noobsper + driftmp) + cohpar
+    base = agepar[:, :, None] + driftpar[:, None, None] * noobsper + cohpar
+    slope = np.where(recent[:, None], driftpar[None, :] - lppar[None, :], driftpar[None, :])
+    predictor = base[None] + slope[:, :, None, None] * driftmp[:, None, None, :]
+    rate = predictor ** 5 if first.linkfunc == 'power5' else np.exp(predictor)
+    predicted[:, :, startuseage - 1:] = rate * future_pyr[None, :, startuseage - 1:]
+
+    all_cases = np.concatenate([np.broadcast_to(cases, (len(scenarios),) + cases.shape), predicted], axis=3)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = all_cases / pyr[None] * 100000
+    return all_cases, rates
+
+def nordpred(cases, pyr, startestage, startuseage, noperiods=None, recent=None,
+             cuttrend=DEFAULT_CUTTREND, linkfunc='power5'):
+    """
+    Choose the number of periods, estimate and predict in one call (R: nordpred).
+
+    Among the candidate numbers of periods, the most ancient periods are cut
+    one at a time while the goodness of fit test of the widest base is
+    rejected at the 1% level. When recent is None, the model's suggestion is used.
+
+    Returns:
+        NordpredPrediction: Observed and predicted cases
+    """
+    cases_values, _ = _as_matrix(cases)
+    percases = cases_values.shape[1]
+    if percases < 3:
+        raise ValueError('Too few periods in "cases"')
+    if noperiods is None:
+        noperiods = list(range(min(percases, 4), min(percases, 6) + 1))
+
+    noperiods = sorted(noperiods)
+    while len(noperiods) > 1:
+        maxnoperiod = max(noperiods)
+        glm = estimate(cases, pyr, maxnoperiod, startestage).glm
+        if chi2.sf(glm.deviance, glm.df_residual) < 0.01:
+            noperiods = noperiods[:-1]
+        else:
+            noperiods = [maxnoperiod]
+    noperiod = noperiods[0]
+
+    if recent is None:
+        recent = estimate(cases, pyr, noperiod, startestage).suggestionrecent
+
+    est = estimate(cases, pyr, noperiod, startestage, linkfunc)
+    return prediction(est, startuseage, recent, cuttrend)
+
+def getpred(result, incidence=True, standpop=None, excludeobs=False, byage=None, agegroups='all'):
+    """
+    Extract cases or incidence rates per 100 000 from a prediction (R: nordpred.getpred).
+
+    Args:
+        result (NordpredPrediction): Output of prediction() or nordpred()
+        incidence (bool): Return rates per 100 000 instead of cases
+        standpop (sequence): Standard population weights (summing to 1) for an
+            age-standardised rate
+        excludeobs (bool): Only return the predicted periods
+        byage (bool): Keep age groups as rows (default: True without standpop)
+        agegroups (list): 0-based age group rows to use, or 'all'
+
+    Returns:
+        np.ndarray: (age groups x periods) when byage, otherwise one value per period
+    """
+    if byage is None:
+        byage = standpop is None
+    if standpop is not None:
+        if not incidence:
+            raise ValueError('"standpop" should only be used with incidence predictions (incidence=T)')
+        if round(sum(standpop), 5) != 1:
+            raise ValueError('"standpop" must be of sum 1')
+        if agegroups != 'all' and len(standpop) != len(agegroups):
+            raise ValueError('"standpop" must be the same length as "agegroups"')
+        if byage:
+            raise ValueError('"standpop" is only valid for "byage=T"')
+
+    datatable = result.predictions
+    pyr = result.pyr
+    if agegroups != 'all':
+        datatable = datatable[agegroups]
+        pyr = pyr[agegroups]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if standpop is not None:
+            datainc = datatable / pyr * 100000
+            datainc[np.isnan(datainc)] = 0
+            res = (datainc * np.asarray(standpop, dtype=float)[:, None]).sum(axis=0)
+        else:
+            if not byage:
+                datatable = datatable.sum(axis=0)
+                pyr = pyr.sum(axis=0)
+            if incidence:
+                res = datatable / pyr * 100000
+                res[np.isnan(res)] = 0
+            else:
+                res = datatable
+
+    if excludeobs:
+        res = res[..., -result.nopred:]
+    return res
+
+def r_name(label):
+    """Return the syntactic R name of a column label, as read.table gives it (e.g. '58-62' -> 'X58.62')."""
+    name = re.sub(r'[^0-9A-Za-z._]', '.', str(label))
+    if not re.match(r'[A-Za-z]|\.(?![0-9])', name):
+        name = 'X' + name
+    return name
+
+def write_getpred_csv(values, labels, filename):
+    """Write a vector the way R's write.csv(x, row.names=TRUE) does."""
+    with open(filename, 'w') as f:
+        f.write('"","x"\n')
+        for label, value in zip(labels, values):
+            f.write(f'"{r_name(label)}",{value:.15g}\n')
+
+def read_table(filename):
+    """
+    Read a nordpred input table (age groups as rows, periods as columns).
+
+    Comma-, tab- and space-separated files are accepted, with or without a
+    'row.names' header for the first column, as with R's read.table(row.names=1).
+    """
+    with open(filename) as f:
+        header = f.readline()
+    sep = ',' if ',' in header else r'\s+'
+    df = pd.read_csv(filename, sep=sep, index_col=0, engine='python' if sep != ',' else 'c')
+    df.columns = [re.sub(r'^X', '', str(col)) for col in df.columns]
+    return df
+
+def read_inputs(input_dir, state, gender, disease='t1'):
+    """
+    Read the cases and population tables of a state and gender, as run-nordpred-analysis.R does.
+
+    Reads '{state}-{disease}_{gender}.txt', 'population-{gender}-{state}.txt' and
+    'population-{gender}-{state}-pred.txt' from input_dir.
+
+    Returns:
+        tuple: (cases, pyr) DataFrames, pyr holding the observed and forecast periods
+    """
+    cases = read_table(os.path.join(input_dir, f'{state}-{disease}_{gender}.txt'))
+    inpop1 = read_table(os.path.join(input_dir, f'population-{gender}-{state}.txt'))
+    inpop2 = read_table(os.path.join(input_dir, f'population-{gender}-{state}-pred.txt'))
+    # Remove a leading non-period column of the cases, as run-nordpred-analysis.R does
+    if not all(col in inpop1.columns for col in cases.columns):
+        cases = cases.iloc[:, 1:]
+    return cases, pd.concat([inpop1, inpop2], axis=1)
+
+def aggregate_periods(values, years, length=5, end=None, partial='drop'):
+    """
+    Sum yearly values into periods of `length` years, as Nordpred expects.
+
+    values holds the years on its last axis, so a (regions x 18 x years) array
+    of cases or person-years is aggregated for every region at once. Periods
+    are aligned to end at `end` (default: the last year), e.g. 1992-1996, ...,
+    2017-2021 for 1990-2021 with end=2021.
+
+    Args:
+        values (array-like): Yearly values, years on the last axis
+        years (sequence): Year of each column, increasing
+        length (int): Years per period
+        end (int): Last year of one of the periods
+        partial (str): 'drop' to drop periods missing any year, or 'scale' to keep
+            every period holding at least one year and scale its sum by
+            length / years present (e.g. person-years of a period from one
+            forecast year)
+
+    Returns:
+        tuple: (aggregated array with one column per period, period labels 'start-end')
+    """
+    values = np.asarray(values, dtype=float)
+    years = np.asarray([int(year) for year in years])
+    if values.shape[-1] != len(years):
+        raise ValueError(f"{values.shape[-1]} columns for {len(years)} years")
+    if len(years) > 1 and np.any(np.diff(years) <= 0):
+        raise ValueError('"years" must be increasing')
+    first_start = (years[-1] if end is None else end) - length + 1
+    blocks = (years - first_start) // length
+
+    if partial == 'drop':
+        # Years are increasing, so a period holding `length` of them holds all its
+        # years, and the kept columns reshape into whole periods
+        counts = np.bincount(blocks - blocks.min(), minlength=1)
+        complete = np.flatnonzero(counts == length) + blocks.min()
+        keep = np.isin(blocks, complete)
+        kept = values[..., keep]
+        aggregated = kept.reshape(values.shape[:-1] + (len(complete), length)).sum(axis=-1)
+    elif partial == 'scale':
+        complete, starts, counts = np.unique(blocks, return_index=True, return_counts=True)
+        aggregated = np.add.reduceat(values, starts, axis=-1) * (length / counts)
+    else:
+        raise ValueError(f"Unknown partial: {partial} (choose from drop, scale)")
+
+    labels = [f'{first_start + block * length}-{first_start + block * length + length - 1}' for block in complete]
+    return aggregated, labels
+
+def aggregate_inputs(cases, pyr, length=5):
+    """
+    Aggregate yearly cases and population tables into periods ending with the last year of cases.
+
+    Observed periods keep complete years only; future periods are the
+    person-years of the forecast years they hold (see aggregate_periods with
+    partial='scale'), so point forecasts such as 2025, 2030, ... give one period each.
+
+    Returns:
+        tuple: (cases, pyr) DataFrames with one column per period
+    """
+    end = int(cases.columns[-1])
+    observed = [col for col in pyr.columns if int(col) <= end]
+    future = [col for col in pyr.columns if int(col) > end]
+    case_values, labels = aggregate_periods(cases.to_numpy(), cases.columns, length, end)
+    pyr_observed, observed_labels = aggregate_periods(pyr[observed].to_numpy(), observed, length, end)
+    if observed_labels != labels:
+        raise ValueError('"cases" and "pyr" must cover the same observed periods')
+    pyr_future, future_labels = aggregate_periods(pyr[future].to_numpy(), future, length, end, partial='scale')
+    return (pd.DataFrame(case_values, index=cases.index, columns=labels),
+            pd.DataFrame(np.hstack([pyr_observed, pyr_future]), index=pyr.index, columns=labels + future_labels))
+
+def store_prediction(results_db, run_id, res, region, sex, standpop=WSTAND):
+    """
+    Store the cases per age group and the age-standardised rate of a prediction in a results database.
+
+    Rows are of kind 'nordpred_cases' and 'nordpred_asr' (age 'standardized'),
+    with the first year of each period label as the year.
+
+    Returns:
+        str: The run id
+    """
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'population-data-generation'))
+    from results_store import ResultsStore
+
+    years = [int(re.match(r'\d+', str(label)).group()) for label in res.periods]
+    asr = getpred(res, incidence=True, standpop=standpop)
+    rows = [(region, sex, age, year, 'nordpred_cases', value)
+            for age, values in zip(AGE_GROUPS, res.predictions.tolist())
+            for year, value in zip(years, values)]
+    rows += [(region, sex, 'standardized', year, 'nordpred_asr', value) for year, value in zip(years, asr.tolist())]
+    with ResultsStore(results_db) as store:
+        run_id = store.start_run(run_id, script='nordpred.py', region=region, sex=sex)
+        store.write_rows((run_id,) + row for row in rows)
+    return run_id
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a Nordpred analysis for one state and gender without R.')
+    parser.add_argument('--input-dir', type=str, required=True, help='Input directory containing data files')
+    parser.add_argument('--state', type=str, required=True, help='State name (e.g., goa)')
+    parser.add_argument('--gender', type=str, required=True, help='Gender (male/female)')
+    parser.add_argument('--startestage', type=int, default=5, help='First age group used in estimation (default: 5)')
+    parser.add_argument('--startuseage', type=int, default=6, help='First age group predicted from the model (default: 6)')
+    parser.add_argument('--linkfunc', type=str, default='power5', choices=['power5', 'poisson'],
+                       help='Link function (default: power5)')
+    parser.add_argument('--no-recent', action='store_true', help='Use the average drift instead of the recent trend')
+    parser.add_argument('--disease', type=str, default='t1',
+                       help='Disease of the cases file {state}-{disease}_{gender}.txt (default: t1)')
+    parser.add_argument('--output', type=str, default=None,
+                       help='Output CSV file (default: nordpred_predictions_{state}_{gender}.csv in the input directory)')
+    parser.add_argument('--period-length', type=int, default=None,
+                       help='Sum the yearly cases and population into periods of this many years, '
+                            'ending with the last year of cases (default: use the yearly columns as periods)')
+    parser.add_argument('--results-db', type=str, default=None,
+                       help='Also store the predictions in this SQLite results database')
+    parser.add_argument('--run-id', type=str, default=None,
+                       help='Run id of the predictions in --results-db (default: a new id from the current time)')
+    args = parser.parse_args()
+
+    state = args.state.lower()
+    gender = args.gender.lower()
+    cases, inpop = read_inputs(args.input_dir, state, gender, args.disease)
+    n_periods = min(5, inpop.shape[1] // 5)
+    if args.period_length:
+        cases, inpop = aggregate_inputs(cases, inpop, args.period_length)
+        n_periods = min(5, cases.shape[1])
+    est = estimate(cases, inpop, n_periods, args.startestage, args.linkfunc)
+    res = prediction(est, args.startuseage, recent=not args.no_recent)
+
+    output_file = args.output or os.path.join(args.input_dir, f'nordpred_predictions_{state}_{gender}.csv')
+    write_getpred_csv(getpred(res, incidence=True, standpop=WSTAND), res.periods, output_file)
+    print(f"Predictions saved to {output_file}")
+    if args.results_db:
+        run_id = store_prediction(args.results_db, args.run_id, res, state, gender)
+        print(f"Predictions stored in {args.results_db} as run {run_id}")
+
+if __name__ == '__main__':
+    main()
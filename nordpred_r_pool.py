@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+A pool of long-running R workers for Nordpred jobs.
+
+Each worker is an Rscript process running nordpred-worker.R, which sources
+nordpred.s once and then answers estimate + prediction jobs sent over its
+stdin, so many (state, gender, scenario) jobs pay the Rscript startup and
+source() cost once per worker instead of once per job. Jobs that time out or
+whose worker dies are retried on a restarted worker.
+
+R remains the reference implementation; nordpred.py computes the same
+predictions in-process.
+"""
+
+import argparse
+import os
+import queue
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from nordpred import (DEFAULT_CUTTREND, NO_AGE_GROUPS, WSTAND, NordpredPrediction, getpred,
+                      aggregate_inputs, read_inputs, write_getpred_csv, _as_matrix)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WORKER_SCRIPT = os.path.join(HERE, 'nordpred-worker.R')
+NORDPRED_SOURCE = os.path.join(HERE, 'nordpred.s')
+
+# Scenarios of the trends plot in run-nordpred-analysis.R
+TREND_SCENARIOS = {
+    'no_trend': (False, (0, 0, 0, 0, 0)),
+    'full_trend': (False, (1, 1, 1, 1, 1)),
+    'recent_trend': (False, DEFAULT_CUTTREND),
+}
+
+class RWorkerError(RuntimeError):
+    """An R worker timed out, died or answered out of protocol."""
+
+class RJobError(RuntimeError):
+    """R raised an error while running a job (e.g. invalid inputs); the worker is still usable."""
+
+class NordpredJob:
+    """
+    One nordpred.estimate + nordpred.prediction call.
+
+    Args:
+        name: Any label identifying the job, e.g. (state, gender, scenario)
+        cases (DataFrame or array): Observed cases, 18 age groups as rows
+        pyr (DataFrame or array): Observed and forecast person-years
+        noperiod (int): Number of periods used in estimation
+        startestage (int): First age group used in estimation (default: 5)
+        startuseage (int): First age group predicted from the model (default: 6)
+        recent (bool): Use the recent trend (default: True)
+        cuttrend (sequence): Drift reduction per future period
+        linkfunc (str): 'power5' or 'poisson'
+    """
+
+    def __init__(self, name, cases, pyr, noperiod, startestage=5, startuseage=6, recent=True,
+                 cuttrend=DEFAULT_CUTTREND, linkfunc='power5'):
+        self.name = name
+        self.cases, _ = _as_matrix(cases)
+        self.pyr, self.periods = _as_matrix(pyr)
+        self.noperiod = noperiod
+        self.startestage = startestage
+        self.startuseage = startuseage
+        self.recent = recent
+        self.cuttrend = tuple(cuttrend)
+        self.linkfunc = linkfunc
+
+    def request(self, job_id):
+        """Return the job in the worker's line protocol (see nordpred-worker.R)."""
+        lines = [f'JOB {job_id} {self.linkfunc} {self.noperiod} {self.startestage} {self.startuseage} '
+                 f'{int(bool(self.recent))} {self.cases.shape[1]} {self.pyr.shape[1]}',
+                 _format_values(self.cuttrend),
+                 ' '.join(str(period).replace(' ', '_') for period in self.periods)]
+        lines += [_format_values(row) for row in self.cases]
+        lines += [_format_values(row) for row in self.pyr]
+        return '\n'.join(lines) + '\n'
+
+    def __repr__(self):
+        return f"NordpredJob({self.name!r}, recent={self.recent}, cuttrend={list(self.cuttrend)})"
+
+def _format_values(values):
+    return ' '.join('NA' if np.isnan(v) else repr(float(v)) for v in values)
+
+def _parse_values(line):
+    return [float('nan') if v == 'NA' else float(v) for v in line.split()]
+
+class RWorker:
+    """
+    One Rscript process running nordpred-worker.R.
+
+    A reader thread forwards the worker's stdout lines to a queue, so that
+    responses can be awaited with a timeout.
+
+    Args:
+        rscript (str): Rscript executable
+        worker_script (str): Path of nordpred-worker.R
+        nordpred_source (str): Path of nordpred.s
+        startup_timeout (float): Seconds to wait for the worker to source nordpred.s
+    """
+
+    def __init__(self, rscript='Rscript', worker_script=WORKER_SCRIPT, nordpred_source=NORDPRED_SOURCE,
+                 startup_timeout=60):
+        self.command = [rscript, '--vanilla', worker_script, nordpred_source]
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.jobs_run = 0
+        self._lines = None
+        self.start()
+
+    def start(self):
+        """Start the R process and wait until it has sourced nordpred.s."""
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        text=True, bufsize=1)
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read_lines, args=(self.process.stdout, self._lines), daemon=True).start()
+        line = self._readline(time.monotonic() + self.startup_timeout)
+        if line != 'READY':
+            self.kill()
+            raise RWorkerError(f"R worker did not start (got {line!r})")
+
+    @staticmethod
+    def _read_lines(stream, lines):
+        for line in stream:
+            lines.put(line.rstrip('\n'))
+        lines.put(None)
+
+    def _readline(self, deadline):
+        try:
+            line = self._lines.get(timeout=max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            self.kill()
+            raise RWorkerError("R worker timed out") from None
+        if line is None:
+            self.kill()
+            raise RWorkerError(f"R worker exited with status {self.process.poll()}")
+        return line
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def run(self, job, timeout=120):
+        """
+        Run a job on the worker.
+
+        Returns:
+            NordpredPrediction: The R prediction (glm is None)
+
+        Raises:
+            RJobError: If R raised an error for the job
+            RWorkerError: If the worker timed out or died; it is then killed
+        """
+        if not self.alive:
+            raise RWorkerError("R worker is not running")
+        job_id = self.jobs_run + 1
+        deadline = time.monotonic() + timeout
+        try:
+            self.process.stdin.write(job.request(job_id))
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            self.kill()
+            raise RWorkerError(f"Could not send job to R worker: {e}") from e
+
+        status = self._readline(deadline).split(' ', 2)
+        self.jobs_run = job_id
+        if status[0] == 'ERROR':
+            raise RJobError(status[2] if len(status) > 2 else 'R error')
+        if status[0] != 'OK' or status[1] != str(job_id):
+            self.kill()
+            raise RWorkerError(f"Unexpected response from R worker: {' '.join(status)!r}")
+
+        gofpvalue, pvaluerecent, recent = status[2].split()
+        predictions = np.array([_parse_values(self._readline(deadline)) for _ in range(NO_AGE_GROUPS)])
+        nopred = job.pyr.shape[1] - job.cases.shape[1]
+        return NordpredPrediction(predictions, job.pyr, job.periods, nopred, job.noperiod, float(gofpvalue),
+                                  recent == '1', float(pvaluerecent), np.asarray(job.cuttrend[:nopred], dtype=float),
+                                  job.startuseage, job.startestage, None)
+
+    def restart(self):
+        """Kill the R process if it is running and start a new one."""
+        self.kill()
+        self.start()
+
+    def kill(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+    def close(self, timeout=5):
+        """Ask the worker to quit, killing it if it does not exit in time."""
+        if not self.alive:
+            return
+        try:
+            self.process.stdin.write('QUIT\n')
+            self.process.stdin.close()
+            self.process.wait(timeout=timeout)
+        except (BrokenPipeError, OSError, subprocess.TimeoutExpired):
+            self.kill()
+
+class RWorkerPool:
+    """
+    A pool of R workers running Nordpred jobs in parallel.
+
+    Each worker runs one job at a time. A job whose worker times out or dies is
+    retried on a restarted worker, up to retries times; errors raised by R for
+    the job itself are not retried.
+
+    Args:
+        workers (int): Number of R processes
+        timeout (float): Seconds allowed per job
+        retries (int): Retries of a job after its worker failed (default: 1)
+        rscript (str): Rscript executable
+        startup_timeout (float): Seconds allowed for a worker to start
+    """
+
+    def __init__(self, workers=2, timeout=120, retries=1, rscript='Rscript', worker_script=WORKER_SCRIPT,
+                 nordpred_source=NORDPRED_SOURCE, startup_timeout=60):
+        self.timeout = timeout
+        self.retries = retries
+        self.restarts = 0
+        self._idle = queue.Queue()
+        self._workers = []
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                started = [executor.submit(RWorker, rscript, worker_script, nordpred_source, startup_timeout)
+                           for _ in range(workers)]
+                for future in started:
+                    self._workers.append(future.result())
+        except BaseException:
+            self.close()
+            raise
+        for worker in self._workers:
+            self._idle.put(worker)
+
+    def run(self, job):
+        """Run one job on the next idle worker (see RWorker.run)."""
+        worker = self._idle.get()
+        try:
+            for attempt in range(self.retries + 1):
+                if not worker.alive:
+                    self.restarts += 1
+                    worker.restart()
+                try:
+                    return worker.run(job, self.timeout)
+                except RWorkerError:
+                    if attempt == self.retries:
+                        raise
+        finally:
+            self._idle.put(worker)
+
+    def map(self, jobs, return_exceptions=False):
+        """
+        Run jobs in parallel over the workers.
+
+        Args:
+            jobs (iterable): NordpredJob objects
+            return_exceptions (bool): Return a failed job's exception in place of its
+                result instead of raising it
+
+        Returns:
+            list: NordpredPrediction per job, in job order
+        """
+        jobs = list(jobs)
+        with ThreadPoolExecutor(max_workers=len(self._workers)) as executor:
+            futures = [executor.submit(self.run, job) for job in jobs]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except (RWorkerError, RJobError) as e:
+                    if not return_exceptions:
+                        raise
+                    results.append(e)
+        return results
+
+    def close(self):
+        for worker in self._workers:
+            worker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run Nordpred analyses for many states and genders on a pool of persistent R workers.')
+    parser.add_argument('--input-dir', type=str, required=True, help='Input directory containing data files')
+    parser.add_argument('--states', type=str, required=True, help='Comma-separated state names (e.g., goa,kerala)')
+    parser.add_argument('--genders', type=str, default='male,female',
+                       help='Comma-separated genders (default: male,female)')
+    parser.add_argument('--trends', action='store_true',
+                       help='Also run the trend scenarios of the trends plot and save their rates')
+    parser.add_argument('--period-length', type=int, default=None,
+                       help='Sum the yearly cases and population into periods of this many years '
+                            '(default: use the yearly columns as periods)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                       help='Number of R worker processes (default: number of CPUs)')
+    parser.add_argument('--timeout', type=float, default=120, help='Seconds allowed per job (default: 120)')
+    parser.add_argument('--rscript', type=str, default='Rscript', help='Rscript executable (default: Rscript)')
+    args = parser.parse_args()
+
+    states = [state.strip().lower() for state in args.states.split(',')]
+    genders = [gender.strip().lower() for gender in args.genders.split(',')]
+    scenarios = {'main': (True, DEFAULT_CUTTREND)}
+    if args.trends:
+        scenarios.update(TREND_SCENARIOS)
+
+    jobs = []
+    for state in states:
+        for gender in genders:
+            cases, inpop = read_inputs(args.input_dir, state, gender)
+            n_periods = min(5, inpop.shape[1] // 5)
+            if args.period_length:
+                cases, inpop = aggregate_inputs(cases, inpop, args.period_length)
+                n_periods = min(5, cases.shape[1])
+            for scenario, (recent, cuttrend) in scenarios.items():
+                jobs.append(NordpredJob((state, gender, scenario), cases, inpop, n_periods,
+                                        recent=recent, cuttrend=cuttrend))
+
+    start = time.perf_counter()
+    with RWorkerPool(min(args.workers, len(jobs)), timeout=args.timeout, rscript=args.rscript) as pool:
+        results = pool.map(jobs, return_exceptions=True)
+        restarts = pool.restarts
+    print(f"Ran {len(jobs)} jobs in {time.perf_counter() - start:.1f}s ({restarts} worker restarts)")
+
+    by_name = {}
+    for job, result in zip(jobs, results):
+        if isinstance(result, Exception):
+            print(f"Error in {job.name}: {result}")
+            continue
+        by_name[job.name] = result
+
+    for state in states:
+        for gender in genders:
+            res = by_name.get((state, gender, 'main'))
+            if res is not None:
+                output_file = os.path.join(args.input_dir, f'nordpred_predictions_{state}_{gender}.csv')
+                write_getpred_csv(getpred(res, incidence=True, standpop=WSTAND), res.periods, output_file)
+                print(f"Predictions saved to {output_file}")
+            if not args.trends or not all((state, gender, s) in by_name for s in TREND_SCENARIOS):
+                continue
+            output_file = os.path.join(args.input_dir, f'nordpred_trends_{state}_{gender}.csv')
+            with open(output_file, 'w') as f:
+                f.write(','.join(['period'] + list(TREND_SCENARIOS)) + '\n')
+                rates = [getpred(by_name[(state, gender, s)], incidence=True, standpop=WSTAND)
+                         for s in TREND_SCENARIOS]
+                for i, period in enumerate(by_name[(state, gender, 'no_trend')].periods):
+                    f.write(','.join([str(period)] + [f'{r[i]:.15g}' for r in rates]) + '\n')
+            print(f"Trend scenarios saved to {output_file}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import csv
+import io
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+# Reasons recorded in a ParseReport
+TOO_FEW_FIELDS = 'too few fields'
+EXTRA_FIELDS = 'extra fields'
+NON_NUMERIC = 'non-numeric value'
+BLANK = 'blank value'
+
+# Non-blank cells of a text-typed column checked first, so text columns are
+# told apart without converting them in full
+SAMPLE_SIZE = 100
+
+
+class ParseReport:
+    """
+    Rows of a CSV file that were rejected or repaired while parsing.
+
+    Rows with too few fields are rejected, as are rows with extra non-blank
+    fields unless they are truncated. Non-numeric or blank cells of numeric
+    columns become NaN, keeping their row.
+
+    Args:
+        filename (str): Parsed file, for messages
+        rejected_reasons (set): Reasons for which the row was dropped
+    """
+
+    def __init__(self, filename, rejected_reasons):
+        self.filename = filename
+        self.rejected_reasons = set(rejected_reasons)
+        self.rows = []
+
+    def add(self, line, reason, text):
+        """Record a problem of the row on a 1-based line of the file."""
+        self.rows.append((line, reason, text))
+
+    def __bool__(self):
+        return bool(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def counts(self):
+        """Return the number of rows per reason."""
+        return dict(Counter(reason for _, reason, _ in self.rows))
+
+    def rejected(self):
+        """Return the (line, reason, text) of the rows that were dropped."""
+        return [row for row in self.rows if row[1] in self.rejected_reasons]
+
+    def summary(self, limit=5):
+        """Return a short text report: counts per reason and the first rows of each."""
+        if not self.rows:
+            return f"{self.filename}: all rows parsed"
+        lines = [f"{self.filename}: " + ', '.join(f'{count} {reason}' for reason, count in self.counts().items())
+                 + f" ({len(self.rejected())} rows rejected)"]
+        shown = Counter()
+        for line, reason, text in self.rows:
+            if shown[reason] < limit:
+                shown[reason] += 1
+                lines.append(f"  line {line}: {reason}: {text}")
+        return '\n'.join(lines)
+
+def _field_counts(raw):
+    """Return the number of fields on each line of the raw CSV bytes."""
+    if b'"' in raw:
+        # Quoted fields may hold commas or newlines, so let the csv module split them
+        return np.array([len(row) for row in csv.reader(io.StringIO(raw.decode('utf-8')))])
+    data = np.frombuffer(raw, dtype=np.uint8)
+    ends = np.flatnonzero(data == ord('\n'))
+    if len(data) and data[-1] != ord('\n'):
+        ends = np.append(ends, len(data))
+    commas = np.concatenate([[0], np.cumsum(data == ord(','))])
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    counts = commas[ends] - commas[starts] + 1
+    # Blank lines (possibly just '\r') hold no field at all
+    lengths = ends - starts
+    lengths -= (lengths > 0) & (data[np.maximum(ends - 1, 0)] == ord('\r'))
+    counts[lengths == 0] = 0
+    return counts
+
+def read_census_csv(csv_file, numeric=None, truncate_extra=False):
+    """
+    Parse a census CSV file in one pass into typed columns, tolerating common defects.
+
+    A UTF-8 byte order mark, trailing commas (an empty last header field and
+    empty last cells), blank lines, spaces after commas and ragged rows are
+    handled while the file is read once by the C parser, which also types
+    clean numeric columns; the number of fields of each line is counted from
+    the raw bytes so short rows are told apart from blank cells.
+
+    Args:
+        csv_file (str): Census CSV file with a header row
+        numeric (list): Columns to convert to numbers (default: columns whose
+            non-blank cells are all numbers)
+        truncate_extra (bool): Keep rows with extra non-blank fields, dropping
+            those fields, instead of rejecting them (shifted rows are rejected
+            by default, since their cells are in the wrong columns)
+
+    Returns:
+        tuple: (DataFrame of the kept rows, with int64 columns for whole numbers
+            without gaps, float64 for other numbers and str otherwise, ParseReport)
+    """
+    with open(csv_file, 'rb') as f:
+        raw = f.read()
+    if raw.startswith(b'\xef\xbb\xbf'):
+        raw = raw[3:]
+    report = ParseReport(csv_file, {TOO_FEW_FIELDS} if truncate_extra else {TOO_FEW_FIELDS, EXTRA_FIELDS})
+
+    field_counts = _field_counts(raw)
+    if not len(field_counts) or field_counts[0] == 0:
+        raise ValueError(f"No header row in {csv_file}")
+    header_line = raw[:raw.find(b'\n')] if b'\n' in raw else raw
+    header = [name.strip() for name in next(csv.reader([header_line.decode('utf-8').rstrip('\r')]))]
+    while header and header[-1] == '':
+        header.pop()
+    header = [name or f'Unnamed: {i}' for i, name in enumerate(header)]
+    n_columns = len(header)
+    field_counts = field_counts[1:]
+    lines = np.arange(2, len(field_counts) + 2)
+
+    # The C parser types clean numeric columns itself; only blank cells are NaN
+    width = max(int(field_counts.max()) if len(field_counts) else 0, n_columns)
+    table = pd.read_csv(io.BytesIO(raw), header=None, skiprows=1, names=range(width), keep_default_na=False,
+                        na_values=[''], skip_blank_lines=False, skipinitialspace=True, encoding='utf-8')
+    if len(table) != len(field_counts):
+        raise ValueError(f"Could not split {csv_file} into lines")
+
+    problems = []
+    # Blank lines are skipped silently; rows missing fields are rejected
+    keep = field_counts > 0
+    problems += [(i, TOO_FEW_FIELDS) for i in np.flatnonzero(keep & (field_counts < n_columns))]
+    keep &= field_counts >= n_columns
+    if width > n_columns:
+        extra = table.iloc[:, n_columns:].apply(
+            lambda col: col.notna() & (col.astype(str).str.strip() != '')).any(axis=1).to_numpy()
+        problems += [(i, EXTRA_FIELDS) for i in np.flatnonzero(keep & extra)]
+        if not truncate_extra:
+            keep &= ~extra
+    table, kept = table.iloc[keep, :n_columns], np.flatnonzero(keep)
+
+    columns = {}
+    for j, name in enumerate(header):
+        values = table[j]
+        if values.dtype.kind in 'iuf':
+            if numeric is not None and name not in numeric:
+                columns[name] = values.astype(str).where(values.notna(), '').to_numpy(dtype=object)
+                continue
+            numbers = values.to_numpy(dtype=float)
+            blank = np.isnan(numbers)
+            parsed = ~blank
+        else:
+            text = values.astype(object).where(values.notna(), '')
+            if numeric is None:
+                # A column is numeric only if every non-blank cell is a number, so
+                # labels such as '0-6' or '80+' among numbers keep the column text
+                cells = text[text != ''].astype(str).str.strip()
+                is_numeric = (len(cells) > 0
+                              and pd.to_numeric(cells.head(SAMPLE_SIZE), errors='coerce').notna().all()
+                              and pd.to_numeric(cells, errors='coerce').notna().all())
+            else:
+                is_numeric = name in numeric
+            if not is_numeric:
+                columns[name] = text.to_numpy(dtype=object)
+                continue
+            text = text.astype(str).str.strip()
+            numbers = pd.to_numeric(text, errors='coerce').to_numpy(dtype=float)
+            blank = (text == '').to_numpy()
+            parsed = ~np.isnan(numbers)
+            problems += [(kept[i], NON_NUMERIC) for i in np.flatnonzero(~parsed & ~blank)]
+        problems += [(kept[i], BLANK) for i in np.flatnonzero(blank)]
+        if parsed.all() and np.all(numbers == np.round(numbers)):
+            columns[name] = numbers.astype(np.int64)
+        else:
+            columns[name] = numbers
+
+    if problems:
+        texts = raw.decode('utf-8').split('\n')[1:]
+        for i, reason in sorted(problems, key=lambda problem: problem[0]):
+            report.add(int(lines[i]), reason, texts[i].rstrip('\r'))
+    return pd.DataFrame(columns), report
@@ -0,0 +1,258 @@
+import fnmatch
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from stage_cache import file_digest
+
+# Node states reported by Pipeline.run
+RAN = 'ran'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+BLOCKED = 'blocked'
+
+class Node:
+    """
+    One step of a pipeline: a command or Python function with declared input and output files.
+
+    A node depends on the nodes producing its input files. It is up to date,
+    and skipped, when its action, parameters and the contents of its inputs
+    are those of its last successful run and its outputs are unchanged since.
+    Since inputs are compared by content, a node whose upstream reran but
+    produced identical files is skipped too. Scripts a command runs should be
+    listed as inputs, so editing them reruns the node. Existing outputs are
+    removed before the action runs.
+
+    Args:
+        stage (str): Stage name, e.g. 'population'
+        key (tuple): Labels of the node within the stage, e.g. (region, sex, disease);
+            None entries are left out of the node name
+        action (list or callable): Command argv run as a subprocess, or a function
+            called without arguments
+        inputs (list): Files read by the action
+        outputs (list): Files written by the action
+        cwd (str): Working directory of a command (default: the current directory)
+        params (dict): Extra JSON-serialisable values that invalidate the node when changed
+        after (list): Names of nodes to run first although no file links them
+    """
+
+    def __init__(self, stage, key, action, inputs=(), outputs=(), cwd=None, params=None, after=()):
+        self.stage = stage
+        self.key = tuple(key)
+        self.action = action
+        self.inputs = [os.path.abspath(path) for path in inputs]
+        self.outputs = [os.path.abspath(path) for path in outputs]
+        self.cwd = cwd
+        self.params = params or {}
+        self.after = list(after)
+        labels = '/'.join(str(label) for label in self.key if label is not None)
+        self.name = f'{stage}[{labels}]' if labels else stage
+
+    def __repr__(self):
+        return f"Node({self.name!r})"
+
+    def describe(self):
+        """Return the JSON-serialisable description of the action and its parameters."""
+        if callable(self.action):
+            # Name the function, not the object: its repr holds a memory address
+            func = getattr(self.action, 'func', self.action)
+            action = f'{func.__module__}.{func.__qualname__}'
+        else:
+            action = [str(arg) for arg in self.action]
+        return {'action': action, 'cwd': self.cwd and os.path.abspath(self.cwd), 'params': self.params,
+                'outputs': self.outputs}
+
+    def signature(self):
+        """Return a digest of the action, parameters and input file contents."""
+        inputs = {path: file_digest(path) for path in self.inputs}
+        payload = json.dumps({'node': self.describe(), 'inputs': inputs}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def run(self, log_file):
+        """Run the action, writing a command's output to log_file."""
+        # Outputs are rebuilt from the inputs only, even by scripts that update existing files
+        for path in self.outputs:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path):
+                os.remove(path)
+        if callable(self.action):
+            self.action()
+            return
+        with open(log_file, 'w') as log:
+            subprocess.run(self.action, cwd=self.cwd, stdout=log, stderr=subprocess.STDOUT, check=True)
+
+class Pipeline:
+    """
+    A dependency graph of Nodes, run in parallel with up-to-date checks.
+
+    The signature of each successful run is stored in state_dir, next to the
+    logs of the commands.
+
+    Args:
+        state_dir (str): Directory for run stamps and command logs
+    """
+
+    def __init__(self, state_dir):
+        self.state_dir = state_dir
+        self.nodes = {}
+
+    def add(self, node):
+        """Add a node; its name must be unique."""
+        if node.name in self.nodes:
+            raise ValueError(f"Duplicate pipeline node: {node.name}")
+        self.nodes[node.name] = node
+        return node
+
+    def dependencies(self):
+        """Return the names of the nodes each node depends on, from shared files and 'after'."""
+        producers = {}
+        for node in self.nodes.values():
+            for path in node.outputs:
+                if path in producers:
+                    raise ValueError(f"{path} is an output of both {producers[path]} and {node.name}")
+                producers[path] = node.name
+        deps = {}
+        for node in self.nodes.values():
+            names = {producers[path] for path in node.inputs if path in producers}
+            names.update(node.after)
+            names.discard(node.name)
+            missing = [name for name in names if name not in self.nodes]
+            if missing:
+                raise ValueError(f"{node.name} runs after unknown nodes: {', '.join(missing)}")
+            deps[node.name] = names
+        return deps
+
+    def select(self, patterns):
+        """Return the names of the nodes matching any glob pattern, with everything they depend on."""
+        deps = self.dependencies()
+        selected = set()
+        pending = [name for name in self.nodes if any(fnmatch.fnmatch(name, p) for p in patterns)]
+        while pending:
+            name = pending.pop()
+            if name not in selected:
+                selected.add(name)
+                pending.extend(deps[name])
+        return selected
+
+    def _stamp_path(self, node):
+        return os.path.join(self.state_dir, 'stamps', hashlib.sha256(node.name.encode()).hexdigest() + '.json')
+
+    def _log_path(self, node):
+        safe = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in node.name)
+        return os.path.join(self.state_dir, 'logs', f'{safe}.log')
+
+    def up_to_date(self, node, signature):
+        """Tell whether a node's last successful run had this signature and its outputs are unchanged."""
+        try:
+            with open(self._stamp_path(node)) as f:
+                stamp = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+        if stamp.get('signature') != signature:
+            return False
+        for path, digest in stamp.get('outputs', {}).items():
+            if not os.path.exists(path) or file_digest(path) != digest:
+                return False
+        return set(stamp.get('outputs', {})) == set(node.outputs)
+
+    def _execute(self, node, force):
+        """Run one node unless it is up to date; returns (state, seconds, error)."""
+        start = time.perf_counter()
+        missing = [path for path in node.inputs if not os.path.exists(path)]
+        if missing:
+            return FAILED, 0.0, f"missing inputs: {', '.join(missing)}"
+        signature = node.signature()
+        if not force and self.up_to_date(node, signature):
+            return SKIPPED, time.perf_counter() - start, None
+
+        # Drop the stamp first, so an interrupted run is never taken as up to date
+        stamp_path = self._stamp_path(node)
+        if os.path.exists(stamp_path):
+            os.remove(stamp_path)
+        log_file = self._log_path(node)
+        try:
+            node.run(log_file)
+        except subprocess.CalledProcessError as e:
+            return FAILED, time.perf_counter() - start, f"exit status {e.returncode}, see {log_file}"
+        except Exception as e:
+            return FAILED, time.perf_counter() - start, str(e)
+        missing = [path for path in node.outputs if not os.path.exists(path)]
+        if missing:
+            return FAILED, time.perf_counter() - start, f"outputs not written: {', '.join(missing)}"
+
+        stamp = {'node': node.name, 'signature': signature,
+                 'outputs': {path: file_digest(path) for path in node.outputs}}
+        with open(stamp_path, 'w') as f:
+            json.dump(stamp, f, indent=2)
+        return RAN, time.perf_counter() - start, None
+
+    def run(self, workers=1, force=False, targets=None, progress=None):
+        """
+        Run the pipeline, starting every node as soon as the nodes it depends on have finished.
+
+        Nodes depending on a failed node are not run (reported as blocked).
+
+        Args:
+            workers (int): Number of nodes run at the same time
+            force (bool): Run every node even if it is up to date
+            targets (list): Glob patterns of the node names to run, with their
+                dependencies (default: every node)
+            progress (callable): Called as progress(node, state, seconds, error, done, total)
+                after each node; prints a line per node by default
+
+        Returns:
+            dict: (state, seconds, error) per node name
+        """
+        os.makedirs(os.path.join(self.state_dir, 'stamps'), exist_ok=True)
+        os.makedirs(os.path.join(self.state_dir, 'logs'), exist_ok=True)
+        progress = progress or print_progress
+        deps = self.dependencies()
+        selected = self.select(targets) if targets else set(self.nodes)
+        remaining = {name: deps[name] & selected for name in selected}
+        results = {}
+
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            running = {}
+            while remaining or running:
+                # Blocking a node can make its dependents ready, so scan until nothing changes
+                ready = True
+                while ready:
+                    ready = [name for name, waiting in remaining.items() if waiting <= results.keys()]
+                    for name in ready:
+                        del remaining[name]
+                        if any(results[dep][0] in (FAILED, BLOCKED) for dep in deps[name] & selected):
+                            results[name] = (BLOCKED, 0.0, 'an upstream node failed')
+                            progress(self.nodes[name], *results[name], len(results), len(selected))
+                            continue
+                        running[executor.submit(self._execute, self.nodes[name], force)] = name
+                if not running:
+                    if remaining:
+                        raise ValueError(f"Dependency cycle between: {', '.join(sorted(remaining))}")
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    results[name] = future.result()
+                    progress(self.nodes[name], *results[name], len(results), len(selected))
+        return results
+
+def print_progress(node, state, seconds, error, done, total):
+    """Print one line per finished node."""
+    width = len(str(total))
+    line = f"[{done:>{width}}/{total}] {state:<8} {node.name}"
+    if state == RAN:
+        line += f" ({seconds:.1f}s)"
+    if error:
+        line += f": {error}"
+    print(line, file=sys.stdout, flush=True)
+
+def summarize(results):
+    """Return the number of nodes in each state."""
+    counts = {RAN: 0, SKIPPED: 0, FAILED: 0, BLOCKED: 0}
+    for state, _, _ in results.values():
+        counts[state] += 1
+    return counts
@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import numpy as np
+from population_cube import PopulationCube
+
+# Age groups shown on the log-scale plot
+SELECTED_AGE_GROUPS = ['0-4', '15-19', '40-44', '70-74', '85+']
+
+def _pyplot():
+    """Import pyplot on first use, with the non-interactive Agg backend."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+def _as_arrays(data):
+    """Return (age groups, years, values) from a DataFrame with a 'row.names' column or a single-series cube."""
+    if isinstance(data, PopulationCube):
+        return data.age_groups, data.years, data.values.reshape(len(data.age_groups), len(data.years))
+    year_columns = [col for col in data.columns if col != 'row.names']
+    return (data['row.names'].tolist(), [int(col) for col in year_columns],
+            data[year_columns].astype(np.int64).to_numpy())
+
+def make_plot_job(interpolated_data, forecast_data, output_dir, name=None):
+    """
+    Collect everything needed to render the forecast plots of one series.
+
+    The job only holds plain arrays and paths, so it can be queued and sent to a
+    worker process without the pipeline's data structures.
+
+    Args:
+        interpolated_data (pd.DataFrame or PopulationCube): Interpolated population data
+        forecast_data (pd.DataFrame or PopulationCube): Forecast population data
+        output_dir (str): Directory to save visualizations
+        name (str): File name stem, e.g. 'population-male-goa' (default: 'population')
+
+    Returns:
+        dict: Plot job for render_plot_job
+    """
+    age_groups, historical_years, historical_values = _as_arrays(interpolated_data)
+    _, forecast_years, forecast_values = _as_arrays(forecast_data)
+    stem = os.path.join(output_dir, name or 'population')
+    return {
+        'age_groups': age_groups,
+        'historical_years': historical_years,
+        'historical_values': historical_values,
+        'forecast_years': forecast_years,
+        'forecast_values': forecast_values,
+        'forecast_file': f'{stem}-forecast.png',
+        'log_scale_file': f'{stem}-forecast-log.png',
+    }
+
+def render_plot_job(job):
+    """
+    Render the all-age-groups plot and the log-scale plot of selected age groups.
+
+    Figures are closed as soon as they are saved, also when saving fails.
+
+    Returns:
+        list: Paths of the files written
+    """
+    plt = _pyplot()
+    age_groups = job['age_groups']
+    historical_years = job['historical_years']
+    forecast_years = job['forecast_years']
+    first_year = min(historical_years + forecast_years)
+    last_year = max(historical_years + forecast_years)
+
+    # Plot historical and forecast data for all age groups
+    fig, ax = plt.subplots(figsize=(15, 10))
+    try:
+        colors = plt.cm.tab20(np.linspace(0, 1, len(age_groups)))
+        for i, age_group in enumerate(age_groups):
+            ax.plot(historical_years, job['historical_values'][i], marker='o', label=age_group,
+                    color=colors[i], linewidth=2)
+            ax.plot(forecast_years, job['forecast_values'][i], marker='s', linestyle='--',
+                    color=colors[i], linewidth=2)
+            ax.scatter(forecast_years, job['forecast_values'][i], s=100, color='green', zorder=5)
+
+        ax.set_title(f'Population Forecast ({first_year}-{last_year})', fontsize=16)
+        ax.set_xlabel('Year', fontsize=14)
+        ax.set_ylabel('Population', fontsize=14)
+        ax.legend(loc='upper left', fontsize=12)
+        ax.grid(True)
+        fig.tight_layout()
+        fig.savefig(job['forecast_file'], dpi=300, bbox_inches='tight')
+    finally:
+        plt.close(fig)
+
+    # Create log scale plot of selected age groups
+    fig, ax = plt.subplots(figsize=(15, 10))
+    try:
+        for age_group in SELECTED_AGE_GROUPS:
+            if age_group not in age_groups:
+                continue
+            i = age_groups.index(age_group)
+            line, = ax.plot(historical_years, job['historical_values'][i], marker='o', label=age_group, linewidth=2)
+            ax.plot(forecast_years, job['forecast_values'][i], marker='s', linestyle='--',
+                    color=line.get_color(), linewidth=2)
+            ax.scatter(forecast_years, job['forecast_values'][i], s=100, color='green', zorder=5)
+
+        ax.set_title(f'Population Forecast by Age Group ({first_year}-{last_year}) - Log Scale', fontsize=16)
+        ax.set_xlabel('Year', fontsize=14)
+        ax.set_ylabel('Population (Log Scale)', fontsize=14)
+        ax.set_yscale('log')
+        ax.legend(loc='upper left', fontsize=12)
+        ax.grid(True)
+        fig.tight_layout()
+        fig.savefig(job['log_scale_file'], dpi=300, bbox_inches='tight')
+    finally:
+        plt.close(fig)
+
+    return [job['forecast_file'], job['log_scale_file']]
+
+def _render_plot_job_safely(job):
+    try:
+        return render_plot_job(job), None
+    except Exception as e:
+        return [], str(e)
+
+def render_plot_jobs(jobs, workers=1):
+    """
+    Render a queue of plot jobs, in a pool of worker processes when workers > 1.
+
+    Args:
+        jobs (list): Plot jobs from make_plot_job
+        workers (int): Number of worker processes
+
+    Returns:
+        list: (files written, error) for every job, in job order; error is None on success
+    """
+    if workers <= 1 or len(jobs) <= 1:
+        return [_render_plot_job_safely(job) for job in jobs]
+
+    method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    with multiprocessing.get_context(method).Pool(min(workers, len(jobs))) as pool:
+        return pool.map(_render_plot_job_safely, jobs)
@@ -0,0 +1,215 @@
+import json
+import struct
+import numpy as np
+import pandas as pd
+
+# Binary cube files: magic, header length, JSON header with the labels, then
+# the values as one C-ordered block starting at a multiple of BINARY_ALIGNMENT
+BINARY_MAGIC = b'POPCUBE\x01'
+BINARY_ALIGNMENT = 64
+BINARY_EXTENSION = '.npc'
+
+class PopulationCube:
+    """
+    Population counts stored as one contiguous array indexed by (region, sex, age group, year).
+
+    Labels along each axis are kept in small index maps, so looking up a region,
+    sex, age group or year is a dictionary access, and single values and
+    (region, sex) series are read straight from the array without copying.
+
+    Args:
+        values (np.ndarray): Array of shape (regions, sexes, age groups, years)
+        regions (list): Region labels
+        sexes (list): Sex labels (e.g. 'Male', 'Female')
+        age_groups (list): Age group labels (e.g. '0-4', ..., '85+')
+        years (list): Years as integers
+    """
+
+    AXES = ('region', 'sex', 'age_group', 'year')
+
+    def __init__(self, values, regions, sexes, age_groups, years):
+        self.values = np.ascontiguousarray(values)
+        self.regions = list(regions)
+        self.sexes = list(sexes)
+        self.age_groups = list(age_groups)
+        self.years = [int(year) for year in years]
+
+        expected = (len(self.regions), len(self.sexes), len(self.age_groups), len(self.years))
+        if self.values.shape != expected:
+            raise ValueError(f"Values of shape {self.values.shape} do not match labels of shape {expected}")
+
+        self._index = {
+            'region': {label: i for i, label in enumerate(self.regions)},
+            'sex': {label: i for i, label in enumerate(self.sexes)},
+            'age_group': {label: i for i, label in enumerate(self.age_groups)},
+            'year': {year: i for i, year in enumerate(self.years)},
+        }
+
+    def __repr__(self):
+        return (f"PopulationCube(regions={len(self.regions)}, sexes={len(self.sexes)}, "
+                f"age_groups={len(self.age_groups)}, years={self.years[0] if self.years else ''}"
+                f"-{self.years[-1] if self.years else ''}, dtype={self.values.dtype})")
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def index(self, axis, label):
+        """Return the position of a label along an axis."""
+        if axis == 'year':
+            label = int(label)
+        try:
+            return self._index[axis][label]
+        except KeyError:
+            raise KeyError(f"Unknown {axis}: {label}") from None
+
+    def get(self, region, sex, age_group, year):
+        """Return a single value."""
+        return self.values[self.index('region', region), self.index('sex', sex),
+                           self.index('age_group', age_group), self.index('year', year)]
+
+    def series(self, region, sex):
+        """Return the (age group x year) view for one region and sex."""
+        return self.values[self.index('region', region), self.index('sex', sex)]
+
+    def sel(self, region=None, sex=None, age_group=None, year=None):
+        """
+        Select a sub-cube by label.
+
+        Each argument may be a single label, a list of labels, or None for the whole
+        axis. The result keeps all four axes.
+
+        Returns:
+            PopulationCube: The selected sub-cube
+        """
+        positions = []
+        labels = []
+        for axis, selection, axis_labels in zip(self.AXES, (region, sex, age_group, year),
+                                                (self.regions, self.sexes, self.age_groups, self.years)):
+            if selection is None:
+                index = np.arange(len(axis_labels))
+            else:
+                if isinstance(selection, (str, int, np.integer)):
+                    selection = [selection]
+                index = np.array([self.index(axis, label) for label in selection], dtype=int)
+            positions.append(index)
+            labels.append([axis_labels[i] for i in index])
+        values = self.values[np.ix_(*positions)]
+        return PopulationCube(values, *labels)
+
+    def astype(self, dtype):
+        """Return a copy of the cube with values cast to dtype."""
+        return PopulationCube(self.values.astype(dtype), self.regions, self.sexes, self.age_groups, self.years)
+
+    def with_values(self, values, years=None):
+        """Return a cube with the same region, sex and age labels and new values (and years)."""
+        return PopulationCube(values, self.regions, self.sexes, self.age_groups,
+                              self.years if years is None else years)
+
+    @classmethod
+    def stack(cls, cubes):
+        """Concatenate cubes with the same sexes, age groups and years along the region axis."""
+        cubes = list(cubes)
+        first = cubes[0]
+        for cube in cubes[1:]:
+            if (cube.sexes, cube.age_groups, cube.years) != (first.sexes, first.age_groups, first.years):
+                raise ValueError("Cubes must share sexes, age groups and years to be stacked")
+        values = np.concatenate([cube.values for cube in cubes], axis=0)
+        regions = [region for cube in cubes for region in cube.regions]
+        return cls(values, regions, first.sexes, first.age_groups, first.years)
+
+    @classmethod
+    def from_frame(cls, df, region, sex):
+        """Build a single-series cube from a DataFrame with a 'row.names' column and year columns."""
+        year_columns = [col for col in df.columns if col != 'row.names']
+        values = df[year_columns].to_numpy()
+        return cls(values[None, None], [region], [sex], df['row.names'].tolist(),
+                   [int(col) for col in year_columns])
+
+    def to_frame(self, region=None, sex=None):
+        """
+        Convert one (region, sex) series to a DataFrame with a 'row.names' column.
+
+        region and sex may be omitted when the cube holds a single region or sex.
+        """
+        region = self._single_label('region', self.regions, region)
+        sex = self._single_label('sex', self.sexes, sex)
+        df = pd.DataFrame(self.series(region, sex), columns=[str(year) for year in self.years])
+        df.insert(0, 'row.names', self.age_groups)
+        return df
+
+    @classmethod
+    def read_nordpred(cls, filename, region, sex, sep=' '):
+        """Read a nordpred text file (age groups as rows, years as columns) into a cube."""
+        with open(filename) as f:
+            header = f.readline().split(sep)
+            rows = [line.rstrip('\n').split(sep) for line in f if line.strip()]
+        years = [int(col) for col in header[1:]]
+        age_groups = [row[0] for row in rows]
+        values = np.array([row[1:] for row in rows], dtype=np.int64)
+        return cls(values[None, None], [region], [sex], age_groups, years)
+
+    def write_nordpred(self, filename, region=None, sex=None, sep=' '):
+        """Write one (region, sex) series as an integer nordpred text file."""
+        region = self._single_label('region', self.regions, region)
+        sex = self._single_label('sex', self.sexes, sex)
+        values = self.series(region, sex).astype(np.int64)
+        lines = [sep.join(['row.names'] + [str(year) for year in self.years])]
+        lines += [sep.join([age_group] + [str(v) for v in row])
+                  for age_group, row in zip(self.age_groups, values.tolist())]
+        with open(filename, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def write_binary(self, filename):
+        """
+        Write the cube to a binary file that open_binary() can memory-map.
+
+        The file holds a small JSON header with the labels, dtype and shape,
+        followed by the values as one contiguous C-ordered block: int64 for
+        integer cubes and float64 otherwise, little-endian.
+        """
+        dtype = np.dtype('<i8') if self.values.dtype.kind in 'iub' else np.dtype('<f8')
+        header = json.dumps({
+            'dtype': dtype.str,
+            'shape': list(self.values.shape),
+            'regions': self.regions,
+            'sexes': self.sexes,
+            'age_groups': self.age_groups,
+            'years': self.years,
+        }).encode()
+        prefix = len(BINARY_MAGIC) + 8 + len(header)
+        padding = -prefix % BINARY_ALIGNMENT
+        with open(filename, 'wb') as f:
+            f.write(BINARY_MAGIC)
+            f.write(struct.pack('<Q', len(header) + padding))
+            f.write(header + b' ' * padding)
+            np.ascontiguousarray(self.values, dtype=dtype).tofile(f)
+
+    @classmethod
+    def open_binary(cls, filename, mmap=True):
+        """
+        Open a cube written by write_binary().
+
+        With mmap the values are a read-only np.memmap, so selecting a region,
+        age group or year only reads those values from disk.
+        """
+        with open(filename, 'rb') as f:
+            if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+                raise ValueError(f"{filename} is not a population cube file")
+            (length,) = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(length))
+            offset = f.tell()
+            dtype = np.dtype(header['dtype'])
+            shape = tuple(header['shape'])
+            if mmap:
+                values = np.memmap(filename, dtype=dtype, mode='r', offset=offset, shape=shape)
+            else:
+                values = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+        return cls(values, header['regions'], header['sexes'], header['age_groups'], header['years'])
+
+    def _single_label(self, axis, labels, label):
+        if label is not None:
+            return label
+        if len(labels) != 1:
+            raise ValueError(f"Cube has {len(labels)} values along {axis}; specify one")
+        return labels[0]
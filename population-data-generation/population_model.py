@@ -0,0 +1,157 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils import (TARGET_AGE_GROUPS, read_census_file, process_census_data, interpolate_population,
+                   interpolate_series)
+
+CENSUS_YEARS = [1991, 2001, 2011]
+SEXES = ['male', 'female']
+
+class RegionSeries:
+    """
+    Population of every age group of one (region, sex), for any year.
+
+    Years from start_year to end_year hold the interpolated population, as
+    written by process-population.py. Other years are extrapolated from those
+    values with the spline of utils.forecast_population, so a year
+    such as 2030 gives the value process-population.py would forecast for it.
+    Extrapolated years are kept once computed.
+
+    Args:
+        values (np.ndarray): Interpolated population, shape (age groups, years)
+        years (list): Consecutive years of the columns of values
+    """
+
+    def __init__(self, values, years):
+        self.values = np.asarray(values, dtype=np.int64)
+        self.years = tuple(int(year) for year in years)
+        self._extrapolated = {}
+        self._lock = threading.Lock()
+
+    def column(self, year):
+        """Return the population of every age group in a year."""
+        offset = year - self.years[0]
+        if 0 <= offset < len(self.years):
+            return self.values[:, offset]
+        column = self._extrapolated.get(year)
+        if column is None:
+            column = interpolate_series(self.values, self.years, [year], rounding='trunc')[:, 0]
+            column = np.trunc(column).astype(np.int64)
+            column.setflags(write=False)
+            with self._lock:
+                self._extrapolated[year] = column
+        return column
+
+    def at(self, age_rows, years):
+        """Return the population of some age group rows in some years, shape (age groups, years)."""
+        offsets = np.asarray(years) - self.years[0]
+        if len(offsets) and offsets.min() >= 0 and offsets.max() < len(self.years):
+            return self.values[np.ix_(age_rows, offsets)]
+        return np.stack([self.column(int(year)) for year in years], axis=1)[age_rows]
+
+class PopulationModel:
+    """
+    In-process population queries, e.g. Tamil Nadu, female, 40-44, 2027.
+
+    The census files are read once when the model is created. The interpolated
+    series of a (region, sex) is built on its first query and kept in a
+    least-recently-used cache of cache_size series, so later queries over any
+    ages and years are array lookups. The model is safe to share between threads.
+
+    Args:
+        input_dir (str): Directory containing 1991.csv, 2001.csv and 2011.csv
+        start_year (int): First interpolated year
+        end_year (int): Last interpolated year; later years are forecasts
+        cache_size (int): Number of (region, sex) series kept in memory
+        census_years (list): Census years to read
+    """
+
+    def __init__(self, input_dir, start_year=1990, end_year=2021, cache_size=128, census_years=CENSUS_YEARS):
+        self.csv_files = [os.path.join(input_dir, f'{year}.csv') for year in census_years]
+        self.census_tables = {csv_file: read_census_file(csv_file) for csv_file in self.csv_files}
+        self.start_year = start_year
+        self.end_year = end_year
+        self.cache_size = cache_size
+        self.age_groups = list(TARGET_AGE_GROUPS)
+        self._age_rows = {age_group: i for i, age_group in enumerate(self.age_groups)}
+        tables = list(self.census_tables.values())
+        regions = list(dict.fromkeys(tables[0]['State']))
+        self.regions = [region for region in regions if all(region in set(df['State']) for df in tables[1:])]
+        self._region_set = set(self.regions)
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, region, sex):
+        region = region.strip().lower()
+        sex = sex.strip().lower()
+        if region not in self._region_set:
+            raise KeyError(f"Unknown region: {region}")
+        if sex not in SEXES:
+            raise KeyError(f"Unknown sex: {sex} (choose from {', '.join(SEXES)})")
+        return region, sex
+
+    def series(self, region, sex):
+        """Return the RegionSeries of a (region, sex), building it on first use."""
+        key = self._key(region, sex)
+        with self._lock:
+            series = self._series.get(key)
+            if series is not None:
+                self._series.move_to_end(key)
+                self.hits += 1
+                return series
+            self.misses += 1
+        # Built outside the lock, so other series can be queried meanwhile
+        processed = process_census_data(self.csv_files, key[0], key[1].capitalize(), self.census_tables)
+        interpolated = interpolate_population(processed, self.start_year, self.end_year)
+        series = RegionSeries(interpolated[[str(year) for year in range(self.start_year, self.end_year + 1)]],
+                              range(self.start_year, self.end_year + 1))
+        with self._lock:
+            series = self._series.setdefault(key, series)
+            self._series.move_to_end(key)
+            while len(self._series) > self.cache_size:
+                self._series.popitem(last=False)
+        return series
+
+    def age_rows(self, age_band):
+        """Return the row indices of an age group, a list of them, or None for all."""
+        if age_band is None:
+            return list(range(len(self.age_groups)))
+        bands = [age_band] if isinstance(age_band, str) else list(age_band)
+        try:
+            return [self._age_rows[band.strip()] for band in bands]
+        except KeyError as e:
+            raise KeyError(f"Unknown age group: {e.args[0]} (choose from {', '.join(self.age_groups)})") from None
+
+    def query(self, region, sex, age_band=None, years=None):
+        """
+        Return the population of a region and sex for some age groups and years.
+
+        Args:
+            region (str): Region name, in any case
+            sex (str): 'male' or 'female', in any case
+            age_band (str or list): Age group(s), e.g. '40-44' (default: all)
+            years (int or list): Year(s), interpolated or forecast (default:
+                start_year to end_year)
+
+        Returns:
+            int or np.ndarray: A single value when age_band and years are single
+                values, otherwise an array of shape (age groups, years)
+        """
+        series = self.series(region, sex)
+        rows = self.age_rows(age_band)
+        year_list = (list(range(self.start_year, self.end_year + 1)) if years is None
+                     else [years] if np.isscalar(years) else list(years))
+        values = series.at(rows, year_list)
+        if isinstance(age_band, str) and years is not None and np.isscalar(years):
+            return int(values[0, 0])
+        return values
+
+    def cache_info(self):
+        """Return the number of cache hits, misses and cached series."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._series), 'max_size': self.cache_size}
@@ -0,0 +1,389 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, unquote_plus, urlsplit
+
+import numpy as np
+
+from population_cube import BINARY_EXTENSION, PopulationCube
+
+# Output files of process-population.py: population-{sex}-{region}[-pred].{txt,npc}
+OUTPUT_FILE = re.compile(r'^population-(male|female)-(.+?)(-pred)?\.(txt|npc)$')
+
+# Largest request body accepted by the batch endpoint
+MAX_BODY_BYTES = 1 << 20
+
+class QueryError(ValueError):
+    """A query that cannot be answered; status is the HTTP status to reply with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+class PopulationOutputs:
+    """
+    Interpolated and forecast populations written by process-population.py, loaded once.
+
+    Every (region, sex) pair with an output file in output_dir is read into
+    one (age groups x years) array holding the interpolated years followed by
+    the forecast years. Binary cube files (.npc) are read in preference to
+    text files when both exist.
+
+    Args:
+        output_dir (str): Output directory of process-population.py
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        files = {}
+        for filename in sorted(os.listdir(output_dir)):
+            match = OUTPUT_FILE.match(filename)
+            if match is None:
+                continue
+            sex, region, pred, extension = match.groups()
+            key = (region, sex, 'forecast' if pred else 'interpolated')
+            if key not in files or extension == BINARY_EXTENSION[1:]:
+                files[key] = os.path.join(output_dir, filename)
+
+        self.series = {}
+        self.forecast_years = {}
+        for (region, sex, kind), filename in files.items():
+            if kind != 'interpolated':
+                continue
+            interpolated = self._read(filename)
+            years, values = list(interpolated.years), interpolated.values[0, 0]
+            forecast_file = files.get((region, sex, 'forecast'))
+            forecast_years = []
+            if forecast_file is not None:
+                forecast = self._read(forecast_file)
+                if forecast.age_groups != interpolated.age_groups:
+                    raise ValueError(f"Age groups of {forecast_file} differ from {filename}")
+                forecast_years = [year for year in forecast.years if year > years[-1]]
+                columns = [forecast.years.index(year) for year in forecast_years]
+                years += forecast_years
+                values = np.concatenate([values, forecast.values[0, 0][:, columns]], axis=1)
+            values = np.ascontiguousarray(values, dtype=np.int64)
+            values.setflags(write=False)
+            self.series[(region, sex)] = PopulationCube(values[None, None], [region], [sex],
+                                                        interpolated.age_groups, years)
+            self.forecast_years[(region, sex)] = set(forecast_years)
+        if not self.series:
+            raise ValueError(f"No population outputs (population-{{sex}}-{{region}}.txt or .npc) in {output_dir}")
+
+        self.regions = sorted({region for region, _ in self.series})
+        self.sexes = [sex for sex in ['male', 'female'] if any(key[1] == sex for key in self.series)]
+        self.age_groups = list(next(iter(self.series.values())).age_groups)
+        self.years = sorted({year for cube in self.series.values() for year in cube.years})
+        # Changes whenever an output file is rewritten, so cached responses expire
+        digest = hashlib.sha1()
+        for filename in sorted(files.values()):
+            stat = os.stat(filename)
+            digest.update(f'{filename}:{stat.st_size}:{stat.st_mtime_ns}\n'.encode())
+        self.version = digest.hexdigest()[:12]
+
+    @staticmethod
+    def _read(filename):
+        if filename.endswith(BINARY_EXTENSION):
+            return PopulationCube.open_binary(filename, mmap=False)
+        return PopulationCube.read_nordpred(filename, '', '')
+
+    def describe(self):
+        """Return the regions, sexes, age groups and years that can be queried."""
+        return {'regions': self.regions, 'sexes': self.sexes, 'age_groups': self.age_groups,
+                'years': self.years, 'version': self.version}
+
+    def slice(self, region, sex, age=None, years=None, start=None, end=None):
+        """
+        Return the population of a region and sex for some age groups and years.
+
+        Args:
+            region (str): Region name, in any case
+            sex (str): 'male' or 'female', in any case
+            age (list): Age groups (default: all)
+            years (list): Years (default: every year from start to end)
+            start (int): First year of the range (default: the first year)
+            end (int): Last year of the range (default: the last year)
+
+        Returns:
+            dict: region, sex, age_groups, years, forecast (whether each year
+                is forecast) and values as a list of rows per age group
+        """
+        key = (str(region).strip().lower(), str(sex).strip().lower())
+        cube = self.series.get(key)
+        if cube is None:
+            raise QueryError(f"No population for region {key[0]!r} and sex {key[1]!r}", status=404)
+        try:
+            rows = ([cube.index('age_group', label.strip()) for label in age] if age
+                    else list(range(len(cube.age_groups))))
+            if years:
+                columns = [cube.index('year', year) for year in years]
+            else:
+                start = cube.years[0] if start is None else int(start)
+                end = cube.years[-1] if end is None else int(end)
+                columns = [i for i, year in enumerate(cube.years) if start <= year <= end]
+        except KeyError as e:
+            raise QueryError(e.args[0], status=404) from None
+        except ValueError as e:
+            raise QueryError(str(e)) from None
+        selected_years = [cube.years[i] for i in columns]
+        forecast_years = self.forecast_years[key]
+        return {
+            'region': key[0],
+            'sex': key[1],
+            'age_groups': [cube.age_groups[i] for i in rows],
+            'years': selected_years,
+            'forecast': [year in forecast_years for year in selected_years],
+            'values': cube.values[0, 0][np.ix_(rows, columns)].tolist(),
+        }
+
+class ResponseCache:
+    """
+    Least-recently-used cache of encoded JSON responses, keyed by request.
+
+    Args:
+        max_entries (int): Number of responses kept
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def info(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries),
+                    'max_size': self.max_entries}
+
+def _split_list(values):
+    """Split repeated or comma-separated query parameters into one list."""
+    return [item for value in values for item in value.split(',') if item.strip()]
+
+def parse_query(query):
+    """
+    Parse the query string of a population request into slice() arguments.
+
+    Region and sex accept '+' for spaces; age groups keep '+' literally, so
+    '85+' needs no escaping.
+    """
+    params = {}
+    for part in query.split('&'):
+        if not part:
+            continue
+        name, _, value = part.partition('=')
+        name = unquote_plus(name)
+        params.setdefault(name, []).append(unquote(value) if name == 'age' else unquote_plus(value))
+    unknown = sorted(set(params) - {'region', 'sex', 'age', 'years', 'start', 'end'})
+    if unknown:
+        raise QueryError(f"Unknown query parameters: {', '.join(unknown)}")
+    for name in ['region', 'sex']:
+        if name not in params:
+            raise QueryError(f"Missing query parameter: {name}")
+    try:
+        return {
+            'region': params['region'][-1],
+            'sex': params['sex'][-1],
+            'age': _split_list(params.get('age', [])),
+            'years': [int(year) for year in _split_list(params.get('years', []))],
+            'start': int(params['start'][-1]) if 'start' in params else None,
+            'end': int(params['end'][-1]) if 'end' in params else None,
+        }
+    except ValueError:
+        raise QueryError("years, start and end must be integers") from None
+
+def batch_query(query):
+    """Convert one query of a batch request body into slice() arguments."""
+    if not isinstance(query, dict):
+        raise QueryError("Each batch query must be an object")
+    unknown = sorted(set(query) - {'region', 'sex', 'age', 'years', 'start', 'end'})
+    if unknown:
+        raise QueryError(f"Unknown query fields: {', '.join(unknown)}")
+    if 'region' not in query or 'sex' not in query:
+        raise QueryError("Each batch query needs a region and a sex")
+    age = query.get('age') or []
+    years = query.get('years') or []
+    try:
+        return {
+            'region': query['region'],
+            'sex': query['sex'],
+            'age': [age] if isinstance(age, str) else [str(label) for label in age],
+            'years': [int(years)] if isinstance(years, (int, str)) else [int(year) for year in years],
+            'start': None if query.get('start') is None else int(query['start']),
+            'end': None if query.get('end') is None else int(query['end']),
+        }
+    except (TypeError, ValueError):
+        raise QueryError("years, start and end must be integers") from None
+
+def encode(payload):
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+class PopulationRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API over a PopulationOutputs.
+
+    GET /regions                  regions, sexes, age groups and years available
+    GET /population?region=goa&sex=male&age=40-44,45-49&start=2000&end=2030
+                                  one slice; years=2000,2030 selects single years
+    POST /population/batch        {"queries": [{"region": ..., "sex": ..., ...}, ...]}
+                                  one result (or {"error": ...}) per query
+    GET /stats                    response cache statistics
+
+    Responses carry an ETag derived from the data version and the request, and
+    a request with a matching If-None-Match is answered with 304 Not Modified.
+    Encoded responses are kept in the server's ResponseCache.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'PopulationServer/1.0'
+    # Small keep-alive responses would otherwise wait for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/stats':
+            self._send(200, encode(self.server.response_cache.info()))
+            return
+        if url.path == '/regions':
+            self._respond(('regions',), lambda: self.server.outputs.describe())
+        elif url.path == '/population':
+            self._respond(('population', url.query),
+                          lambda: self.server.outputs.slice(**parse_query(url.query)))
+        else:
+            self._send_error(QueryError(f"Unknown path: {url.path}", status=404))
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != '/population/batch':
+            self._send_error(QueryError(f"Unknown path: {url.path}", status=404))
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if not 0 <= length <= MAX_BODY_BYTES:
+            self._send_error(QueryError(f"Content-Length must be between 0 and {MAX_BODY_BYTES}"))
+            self.close_connection = True
+            return
+        body = self.rfile.read(length)
+        self._respond(('batch', hashlib.sha1(body).hexdigest()), lambda: self._batch(body))
+
+    def _batch(self, body):
+        try:
+            queries = json.loads(body)['queries']
+        except (ValueError, KeyError, TypeError):
+            raise QueryError('Body must be a JSON object {"queries": [...]}') from None
+        if not isinstance(queries, list):
+            raise QueryError('"queries" must be a list')
+        results = []
+        for query in queries:
+            try:
+                results.append(self.server.outputs.slice(**batch_query(query)))
+            except QueryError as e:
+                results.append({'error': str(e), 'status': e.status})
+        return {'results': results}
+
+    def _respond(self, key, build):
+        """Reply from the response cache, building and caching the response on a miss."""
+        cache = self.server.response_cache
+        entry = cache.get(key)
+        if entry is None:
+            try:
+                body = encode(build())
+            except QueryError as e:
+                self._send_error(e)
+                return
+            etag = f'"{self.server.outputs.version}-{hashlib.sha1(body).hexdigest()[:16]}"'
+            entry = (etag, body)
+            cache.put(key, entry)
+        etag, body = entry
+        if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self._send(304, b'', etag)
+        else:
+            self._send(200, body, etag)
+
+    def _send_error(self, error):
+        self._send(error.status, encode({'error': str(error)}))
+
+    def _send(self, status, body, etag=None):
+        self.send_response(status)
+        if etag is not None:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        if status != 304:
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+class PopulationServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server answering population queries from outputs loaded once.
+
+    Args:
+        address (tuple): (host, port) to listen on
+        outputs (PopulationOutputs): Loaded population outputs
+        cache_size (int): Number of encoded responses kept in memory
+        quiet (bool): Do not log each request
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, outputs, cache_size=4096, quiet=False):
+        self.outputs = outputs
+        self.response_cache = ResponseCache(cache_size)
+        self.quiet = quiet
+        super().__init__(address, PopulationRequestHandler)
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the population outputs of process-population.py as JSON over HTTP.')
+    parser.add_argument('--output-dir', type=str, default='output',
+                       help='Output directory of process-population.py (default: output)')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on (default: 8000)')
+    parser.add_argument('--cache-size', type=int, default=4096,
+                       help='Number of encoded responses kept in memory (default: 4096)')
+    parser.add_argument('--quiet', action='store_true', help='Do not log each request')
+    args = parser.parse_args()
+
+    outputs = PopulationOutputs(args.output_dir)
+    print(f"Loaded {len(outputs.series)} (region, sex) series of {len(outputs.regions)} regions "
+          f"from {args.output_dir}")
+    server = PopulationServer((args.host, args.port), outputs, args.cache_size, args.quiet)
+    print(f"Serving on http://{server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
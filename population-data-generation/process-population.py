@@ -1,21 +1,228 @@
 #!/usr/bin/env python3
 
 import argparse
+import contextlib
+import io
+import multiprocessing
 import os
-from utils import process_census_data, interpolate_population, forecast_population, save_data, create_visualizations
+import sys
+from utils import process_census_data, interpolate_population, forecast_population, save_data, read_census_file
+from plotting import make_plot_job, render_plot_jobs
+from stage_cache import StageCache, file_digest
+from stage_profiler import StageProfiler, add_profile_arguments
+from results_store import ResultsStore
+
+GENDERS = ['Male', 'Female']
+
+# File extensions written by each --output-format
+OUTPUT_EXTENSIONS = {'text': ['.txt'], 'binary': ['.npc'], 'both': ['.txt', '.npc']}
+
+# Census tables shared with worker processes. With the 'fork' start method the
+# workers inherit the parent's already-parsed tables instead of re-reading or
+# unpickling them.
+_census_tables = None
+
+def read_manifest(manifest_file):
+    """Read one name per line from a manifest file, ignoring blank lines and '#' comments."""
+    with open(manifest_file) as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+
+def parse_selection(value, available):
+    """
+    Expand a --state/--gender value into a list of names.
+
+    Args:
+        value (str): 'all', a comma-separated list, or the path of a manifest file
+        available (list): Names selected by 'all'
+
+    Returns:
+        list: Selected names, in the order given
+    """
+    if value.strip().lower() == 'all':
+        return list(available)
+    if os.path.isfile(value):
+        return read_manifest(value)
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+def available_states(census_tables):
+    """Return the states present in every census table, in the order of the first table."""
+    tables = list(census_tables.values())
+    states = list(dict.fromkeys(tables[0]['State']))
+    return [state for state in states if all(state in set(df['State']) for df in tables[1:])]
+
+def run_job(state, gender, csv_files, census_tables, args, forecast_years, profiler=None):
+    """
+    Run the pipeline for a single (state, gender) pair.
+
+    Stage outputs are loaded from the stage cache when their inputs are unchanged.
+    Stages are timed with profiler when one is given.
+
+    Returns:
+        dict: Plot job for the plotting stage, or None when plots are disabled
+    """
+    profiler = profiler or StageProfiler(enabled=False)
+    cache = None if args.no_cache else StageCache(args.cache_dir, args.cache_size * 1024 * 1024)
+
+    def run_stage(stage, inputs, compute):
+        if cache is None:
+            return None, compute()
+        key, output, hit = cache.run_stage(stage, inputs, compute)
+        if hit:
+            print(f"  loaded {stage} output from cache")
+        return key, output
+
+    # Process census data
+    print(f"Processing census data for {state} - {gender}...")
+    census_inputs = {
+        'census_files': [file_digest(csv_file) for csv_file in csv_files],
+        'census_years': [os.path.basename(csv_file) for csv_file in csv_files],
+        'state': state.lower(),
+        'gender': gender,
+    }
+    with profiler.stage('bin_aggregation'):
+        census_key, processed_data = run_stage(
+            'process_census_data', census_inputs,
+            lambda: process_census_data(csv_files, state, gender, census_tables))
+
+    # Interpolate population data
+    print(f"Interpolating population data from {args.start_year} to {args.end_year}...")
+    interpolation_inputs = {'census': census_key, 'start_year': args.start_year, 'end_year': args.end_year}
+    with profiler.stage('interpolation'):
+        interpolation_key, interpolated_data = run_stage(
+            'interpolate_population', interpolation_inputs,
+            lambda: interpolate_population(processed_data, args.start_year, args.end_year))
+
+    # Forecast population
+    print(f"Forecasting population for years {forecast_years}...")
+    forecast_inputs = {'interpolation': interpolation_key, 'forecast_years': forecast_years}
+    with profiler.stage('forecast'):
+        _, forecast_data = run_stage(
+            'forecast_population', forecast_inputs,
+            lambda: forecast_population(interpolated_data, forecast_years))
+
+    # Save data
+    print("Saving data...")
+    with profiler.stage('save'):
+        os.makedirs(args.output_dir, exist_ok=True)
+        stem = f'{args.output_dir}/population-{gender.lower()}-{state.lower()}'
+        for extension in OUTPUT_EXTENSIONS[args.output_format]:
+            save_data(interpolated_data, f'{stem}{extension}', state, gender)
+            save_data(forecast_data, f'{stem}-pred{extension}', state, gender)
+        if args.results_db:
+            # Each job writes in its own transaction; SQLite serialises parallel workers
+            with ResultsStore(args.results_db) as store:
+                store.write_frame(args.run_id, 'interpolated', interpolated_data, state.lower(), gender.lower())
+                store.write_frame(args.run_id, 'forecast', forecast_data, state.lower(), gender.lower())
+
+    if args.no_plots:
+        return None
+    return make_plot_job(interpolated_data, forecast_data, args.output_dir,
+                         f'population-{gender.lower()}-{state.lower()}')
+
+def _init_worker(census_tables):
+    """Install the census tables in a worker that could not inherit them."""
+    global _census_tables
+    if census_tables is not None:
+        _census_tables = census_tables
+
+def _run_job_in_worker(job):
+    """
+    Run one job in a worker, capturing its output so the parent can print it in job order.
+
+    The job's stage records are returned for the parent's profiler.
+    """
+    state, gender, csv_files, args, forecast_years = job
+    profiler = StageProfiler.from_args(args)
+    log = io.StringIO()
+    error = None
+    plot_job = None
+    with contextlib.redirect_stdout(log):
+        try:
+            plot_job = run_job(state, gender, csv_files, _census_tables, args, forecast_years, profiler)
+        except Exception as e:
+            error = str(e)
+    return state, gender, log.getvalue(), error, plot_job, profiler.records()
+
+def run_jobs(jobs, census_tables, workers, profiler=None):
+    """
+    Run (state, gender) jobs, in parallel when more than one worker is requested.
+
+    Args:
+        jobs (list): Tuples of (state, gender, csv_files, args, forecast_years)
+        census_tables (dict): Census tables keyed by CSV file path
+        workers (int): Number of worker processes
+        profiler (StageProfiler): Optional profiler collecting the stages of every job
+
+    Returns:
+        list: (state, gender, error, plot job) for every job, in job order; error is None on success
+    """
+    global _census_tables
+    _census_tables = census_tables
+
+    if workers <= 1 or len(jobs) <= 1:
+        results = []
+        for state, gender, csv_files, args, forecast_years in jobs:
+            try:
+                plot_job = run_job(state, gender, csv_files, census_tables, args, forecast_years, profiler)
+                results.append((state, gender, None, plot_job))
+            except Exception as e:
+                print(f"Error processing {state} - {gender}: {e}")
+                results.append((state, gender, str(e), None))
+        return results
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+        initargs = (None,)
+    else:
+        context = multiprocessing.get_context('spawn')
+        initargs = (census_tables,)
+
+    results = []
+    with context.Pool(min(workers, len(jobs)), initializer=_init_worker, initargs=initargs) as pool:
+        # imap keeps results in job order whatever the completion order
+        for state, gender, log, error, plot_job, records in pool.imap(_run_job_in_worker, jobs):
+            print(log, end='')
+            if profiler is not None:
+                profiler.merge(records)
+            if error is not None:
+                print(f"Error processing {state} - {gender}: {error}")
+            results.append((state, gender, error, plot_job))
+    return results
 
 def main():
-    parser = argparse.ArgumentParser(description='Process population data for a specific state and gender.')
-    parser.add_argument('--state', type=str, required=True, help='Name of the state to process')
-    parser.add_argument('--gender', type=str, required=True, choices=['Male', 'Female'], help='Gender to process')
+    parser = argparse.ArgumentParser(description='Process population data for one or more states and genders.')
+    parser.add_argument('--state', type=str, required=True,
+                       help="State to process: a name, a comma-separated list, 'all', or a manifest file with one state per line")
+    parser.add_argument('--gender', type=str, required=True,
+                       help="Gender to process (Male/Female): a name, a comma-separated list, 'all', or a manifest file")
     parser.add_argument('--input-dir', type=str, required=True, help='Directory containing input population CSV files')
     parser.add_argument('--output-dir', type=str, default='output', help='Directory to save output files (default: output)')
     parser.add_argument('--start-year', type=int, default=1990, help='Start year for interpolation (default: 1990)')
     parser.add_argument('--end-year', type=int, default=2021, help='End year for interpolation (default: 2021)')
-    parser.add_argument('--forecast-years', type=str, default='2025,2030,2035,2040', 
+    parser.add_argument('--forecast-years', type=str, default='2025,2030,2035,2040',
                        help='Comma-separated list of years to forecast (default: 2025,2030,2035,2040)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Number of worker processes for (state, gender) jobs (default: 1)')
+    parser.add_argument('--no-plots', action='store_true', help='Only write the data outputs, without plots')
+    parser.add_argument('--output-format', type=str, default='text', choices=list(OUTPUT_EXTENSIONS),
+                       help='Write nordpred text files (.txt), memory-mappable binary cube files (.npc), '
+                            'or both (default: text)')
+    parser.add_argument('--results-db', type=str, default=None,
+                       help='Also store the interpolated and forecast populations in this SQLite results database')
+    parser.add_argument('--run-id', type=str, default=None,
+                       help='Run id of the results in --results-db (default: a new id from the current time)')
+    parser.add_argument('--plot-workers', type=int, default=None,
+                       help='Number of worker processes for rendering plots (default: same as --workers)')
+    parser.add_argument('--cache-dir', type=str, default='.stage-cache',
+                       help='Directory of the stage cache used to skip unchanged stages (default: .stage-cache)')
+    parser.add_argument('--cache-size', type=int, default=256,
+                       help='Size bound of the stage cache in MB; least recently used entries are evicted (default: 256)')
+    parser.add_argument('--no-cache', action='store_true', help='Recompute every stage without reading or writing the cache')
+    add_profile_arguments(parser)
     args = parser.parse_args()
 
+    profiler = StageProfiler.from_args(args)
+
     # Parse forecast years
     forecast_years = [int(year.strip()) for year in args.forecast_years.split(',')]
 
@@ -23,29 +230,55 @@ def main():
     census_years = [1991, 2001, 2011]
     csv_files = [os.path.join(args.input_dir, f'{year}.csv') for year in census_years]
 
-    # Process census data
-    print(f"Processing census data for {args.state} - {args.gender}...")
-    processed_data = process_census_data(csv_files, args.state, args.gender)
+    # Read each census file once for all requested jobs
+    with profiler.stage('census_read'):
+        census_tables = {csv_file: read_census_file(csv_file) for csv_file in csv_files}
+    # Hash the census files once, before any workers are started
+    for csv_file in csv_files:
+        file_digest(csv_file)
 
-    # Interpolate population data
-    print(f"Interpolating population data from {args.start_year} to {args.end_year}...")
-    interpolated_data = interpolate_population(processed_data, args.start_year, args.end_year)
+    states = parse_selection(args.state, available_states(census_tables))
+    if args.state.strip().lower() == 'all':
+        skipped = [state for state in dict.fromkeys(state for df in census_tables.values() for state in df['State'])
+                   if state not in states]
+        if skipped:
+            print(f"Skipping states missing from some census files: {', '.join(skipped)}")
+    genders = []
+    for gender in parse_selection(args.gender, GENDERS):
+        if gender.capitalize() not in GENDERS:
+            parser.error(f"invalid gender: {gender} (choose from {', '.join(GENDERS)})")
+        genders.append(gender.capitalize())
 
-    # Forecast population
-    print(f"Forecasting population for years {forecast_years}...")
-    forecast_data = forecast_population(interpolated_data, forecast_years)
+    if args.results_db:
+        with ResultsStore(args.results_db) as store:
+            args.run_id = store.start_run(args.run_id, script='process-population.py', states=states,
+                                          genders=genders, forecast_years=forecast_years)
+        print(f"Storing results in {args.results_db} as run {args.run_id}")
 
-    # Save data
-    print("Saving data...")
-    os.makedirs(args.output_dir, exist_ok=True)
-    save_data(interpolated_data, f'{args.output_dir}/population-{args.gender.lower()}-{args.state.lower()}.txt')
-    save_data(forecast_data, f'{args.output_dir}/population-{args.gender.lower()}-{args.state.lower()}-pred.txt')
+    jobs = [(state, gender, csv_files, args, forecast_years) for state in states for gender in genders]
+    results = run_jobs(jobs, census_tables, args.workers, profiler)
+    failed = [(state, gender) for state, gender, error, _ in results if error is not None]
+
+    # Render plots as a separate stage once all text outputs are written
+    plot_jobs = [plot_job for _, _, _, plot_job in results if plot_job is not None]
+    if plot_jobs:
+        print(f"Creating visualizations for {len(plot_jobs)} jobs...")
+        plot_workers = args.workers if args.plot_workers is None else args.plot_workers
+        with profiler.stage('plot'):
+            plot_results = render_plot_jobs(plot_jobs, plot_workers)
+        for plot_job, (_, error) in zip(plot_jobs, plot_results):
+            if error is not None:
+                print(f"Error creating visualizations for {plot_job['forecast_file']}: {error}")
+
+    profiler.finish(args.profile, script='process-population.py', arguments=vars(args),
+                    jobs=len(jobs), failed_jobs=len(failed))
 
-    # Create visualizations
-    print("Creating visualizations...")
-    create_visualizations(interpolated_data, forecast_data, args.output_dir)
+    if failed:
+        print(f"Processing failed for {len(failed)} of {len(states) * len(genders)} jobs: "
+              + ', '.join(f'{state} - {gender}' for state, gender in failed))
+        sys.exit(1)
 
     print("Processing completed successfully!")
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
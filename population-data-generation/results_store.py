@@ -0,0 +1,159 @@
+import json
+import os
+import sqlite3
+import sys
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from population_cube import PopulationCube
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created TEXT NOT NULL,
+    command TEXT,
+    metadata TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id TEXT NOT NULL,
+    region TEXT NOT NULL,
+    sex TEXT NOT NULL,
+    age TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS results_region_sex_year ON results (region, sex, year);
+CREATE INDEX IF NOT EXISTS results_kind_year_sex_age ON results (kind, year, sex, age);
+"""
+
+# One value per key and run; databases written before the index existed are
+# deduplicated, keeping the last row written, before it is created
+UNIQUE_INDEX = 'results_key'
+UNIQUE_SCHEMA = f"""
+DELETE FROM results WHERE rowid NOT IN (
+    SELECT MAX(rowid) FROM results GROUP BY run_id, region, sex, age, year, kind
+);
+CREATE UNIQUE INDEX IF NOT EXISTS {UNIQUE_INDEX} ON results (run_id, region, sex, age, year, kind);
+"""
+
+# Columns of the results table that query() can filter on
+QUERY_COLUMNS = ['run_id', 'region', 'sex', 'age', 'year', 'kind']
+
+def new_run_id():
+    """Return a run id sortable by creation time, e.g. '20240101T120000-1a2b3c4d'."""
+    return f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+class ResultsStore:
+    """
+    SQLite store of pipeline results in long format.
+
+    Every value is one row of (run_id, region, sex, age, year, kind, value),
+    e.g. ('20240101T120000-1a2b3c4d', 'goa', 'female', '40-44', 2030,
+    'forecast', 81234). Writes are bulk inserts in one transaction per call;
+    each (run_id, region, sex, age, year, kind) holds one value, the last written.
+    Rows are indexed on (region, sex, year) for one region's series and on
+    (kind, year, sex, age) for questions across regions, such as every state's
+    2030 forecast for women aged 40-44. Several processes may write to the same
+    database; SQLite serialises their transactions.
+
+    Args:
+        path (str): SQLite database file, created if missing
+        timeout (float): Seconds to wait for another writer's lock
+    """
+
+    def __init__(self, path, timeout=60):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=timeout)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+        if not self.connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+                                       (UNIQUE_INDEX,)).fetchone():
+            self.connection.executescript(f'BEGIN IMMEDIATE; {UNIQUE_SCHEMA} COMMIT;')
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start_run(self, run_id=None, **metadata):
+        """
+        Register a run; an existing run id is kept, so parallel jobs can share one.
+
+        Returns:
+            str: The run id
+        """
+        run_id = run_id or new_run_id()
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR IGNORE INTO runs (run_id, created, command, metadata) VALUES (?, ?, ?, ?)',
+                (run_id, datetime.now(timezone.utc).isoformat(timespec='seconds'), ' '.join(sys.argv),
+                 json.dumps(metadata, default=str)))
+        return run_id
+
+    def write_rows(self, rows):
+        """
+        Write (run_id, region, sex, age, year, kind, value) rows in one transaction.
+
+        A row replaces any value already stored for its (run_id, region, sex,
+        age, year, kind), so re-running a job under the same run id overwrites
+        its results instead of duplicating them.
+        """
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def write_cube(self, run_id, kind, cube):
+        """Write every value of a PopulationCube."""
+        regions, sexes, ages, years = np.meshgrid(np.arange(len(cube.regions)), np.arange(len(cube.sexes)),
+                                                  np.arange(len(cube.age_groups)), np.arange(len(cube.years)),
+                                                  indexing='ij')
+        values = np.asarray(cube.values, dtype=float).ravel()
+        self.write_rows(zip([run_id] * values.size,
+                            np.array(cube.regions, dtype=object)[regions.ravel()],
+                            np.array(cube.sexes, dtype=object)[sexes.ravel()],
+                            np.array(cube.age_groups, dtype=object)[ages.ravel()],
+                            np.array(cube.years)[years.ravel()].tolist(),
+                            [kind] * values.size,
+                            values.tolist()))
+
+    def write_frame(self, run_id, kind, df, region, sex):
+        """Write one (region, sex) series given as a DataFrame with a 'row.names' column and year columns."""
+        self.write_cube(run_id, kind, PopulationCube.from_frame(df, region, sex))
+
+    def query(self, **filters):
+        """
+        Select results as a long-format DataFrame.
+
+        Each filter (run_id, region, sex, age, year, kind) is a value or a list
+        of values, e.g. query(kind='forecast', sex='female', age='40-44', year=2030).
+
+        Returns:
+            pd.DataFrame: Matching rows, ordered by region, sex, year and age
+        """
+        clauses = []
+        params = []
+        for column, value in filters.items():
+            if column not in QUERY_COLUMNS:
+                raise ValueError(f"Unknown column: {column} (choose from {', '.join(QUERY_COLUMNS)})")
+            if value is None:
+                continue
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        sql = f"SELECT * FROM results{where} ORDER BY region, sex, year, age"
+        return pd.read_sql_query(sql, self.connection, params=params)
+
+    def runs(self):
+        """Return the registered runs as a DataFrame, newest first."""
+        return pd.read_sql_query('SELECT * FROM runs ORDER BY created DESC', self.connection)
@@ -1,25 +1,6 @@
 #!/bin/bash
 
-python process-population.py --state "India" --gender Male
-python process-population.py --state "India" --gender Female
-
-python process-population.py --state "Uttar Pradesh" --gender Male
-python process-population.py --state "Uttar Pradesh" --gender Female
-
-python process-population.py --state "Manipur" --gender Male
-python process-population.py --state "Manipur" --gender Female
-
-python process-population.py --state "Tamil Nadu" --gender Male
-python process-population.py --state "Tamil Nadu" --gender Female
-
-python process-population.py --state "Goa" --gender Male
-python process-population.py --state "Goa" --gender Female
-
-python process-population.py --state "Nagaland" --gender Male
-python process-population.py --state "Nagaland" --gender Female
-
-python process-population.py --state "Madhya Pradesh" --gender Male
-python process-population.py --state "Madhya Pradesh" --gender Female
-
-python process-population.py --state "Uttarakhand" --gender Male
-python process-population.py --state "Uttarakhand" --gender Female 
\ No newline at end of file
+# All states are processed in a single interpreter so the census files are parsed only once.
+# 'all' selects the states found in every census file; the others (Uttar Pradesh and Madhya
+# Pradesh, which have no usable 2011 rows) are listed as skipped instead of failing the run.
+python process-population.py --state all --gender all --input-dir ..
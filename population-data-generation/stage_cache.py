@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from functools import lru_cache
+
+# Bump to invalidate every cached result, e.g. when the pickled format changes
+CACHE_FORMAT_VERSION = 1
+
+# Modules whose source is part of the code version: a change to any of them
+# invalidates the cached stage outputs
+CODE_MODULES = ['utils.py', 'population_cube.py', 'census_csv.py']
+
+_MISSING = object()
+
+def _remove_if_exists(path):
+    """Remove a file, ignoring one that another process has already removed."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+@lru_cache(maxsize=None)
+def _file_digest(path, size, mtime_ns):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def file_digest(path):
+    """
+    Return the SHA-256 of a file's bytes.
+
+    Digests are memoised per (path, size, modification time), so each input file
+    is read once per process however many stage keys use it.
+    """
+    stat = os.stat(path)
+    return _file_digest(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+@lru_cache(maxsize=None)
+def code_version():
+    """Return a digest of the cache format version and the source of the pipeline modules."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256(str(CACHE_FORMAT_VERSION).encode())
+    for module in CODE_MODULES:
+        digest.update(file_digest(os.path.join(here, module)).encode())
+    return digest.hexdigest()
+
+class StageCache:
+    """
+    Content-addressed cache of pipeline stage outputs on local disk.
+
+    Each stage output is stored under a key hashed from the stage name, its
+    inputs and the code version, so a stage is only recomputed when something it
+    depends on changes. Keys of later stages include the key of the stage that
+    produced their input, so e.g. changing the forecast years only recomputes the
+    forecasts. Entries are pickled one per file; once the directory grows beyond
+    max_bytes the least recently used entries are removed.
+
+    Args:
+        cache_dir (str): Directory holding the cached entries
+        max_bytes (int): Size bound of the cache directory in bytes
+    """
+
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, stage, inputs):
+        """
+        Return the cache key of a stage for the given inputs.
+
+        Args:
+            stage (str): Stage name
+            inputs (dict): JSON-serialisable stage inputs (file digests, parameters,
+                keys of upstream stages)
+
+        Returns:
+            str: Hex digest identifying the stage output
+        """
+        payload = json.dumps({'stage': stage, 'code': code_version(), 'inputs': inputs},
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.pkl')
+
+    def get(self, key, default=None):
+        """Return the cached value for a key, or default if there is none."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return default
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # A truncated or stale entry is treated as a miss and recomputed
+            return default
+        # Mark as recently used for LRU eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return value
+
+    def put(self, key, value):
+        """Store a value under a key, then evict old entries if the cache is too large."""
+        # Write to a temporary file and rename it, so concurrent workers never
+        # read a partially written entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            _remove_if_exists(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith('.pkl'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            _remove_if_exists(path)
+            total -= size
+
+    def run_stage(self, stage, inputs, compute):
+        """
+        Return a stage's output from the cache, computing and storing it on a miss.
+
+        Args:
+            stage (str): Stage name
+            inputs (dict): Stage inputs, see key()
+            compute (callable): Function of no arguments computing the stage output
+
+        Returns:
+            tuple: (key, output, hit) where hit tells whether the output was loaded
+        """
+        key = self.key(stage, inputs)
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return key, value, True
+        value = compute()
+        self.put(key, value)
+        return key, value, False
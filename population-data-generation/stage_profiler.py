@@ -0,0 +1,211 @@
+import cProfile
+import json
+import marshal
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+def add_profile_arguments(parser, default_report='profile-report.json'):
+    """Add the --profile and --profile-cprofile options to an argparse parser."""
+    parser.add_argument('--profile', type=str, nargs='?', const=default_report, default=None,
+                        help='Record wall time, CPU time and peak memory of each stage and write a JSON '
+                             f'report (default report: {default_report})')
+    parser.add_argument('--profile-cprofile', action='store_true',
+                        help='With --profile, also write a cProfile of the slowest stage next to the report')
+
+class StageProfiler:
+    """
+    Record wall time, CPU time and peak traced memory of named pipeline stages.
+
+    Stages are timed with the context manager returned by stage(), or with
+    start() and stop() in straight-line scripts. A stage may run many times
+    (e.g. once per (state, gender) job); its calls are summed, and the peak
+    memory is the largest increase in traced memory over the stage's start of
+    any single call. When disabled, stages cost nothing beyond a method call.
+
+    With cprofile=True every stage call also runs under cProfile, and the
+    profile of the slowest single call of each stage is kept, so that the
+    slowest stage can be dumped for pstats or snakeviz. Timings then include
+    the profiler's overhead.
+
+    Args:
+        enabled (bool): Record stages (default: True)
+        cprofile (bool): Also run each stage under cProfile (default: False)
+    """
+
+    def __init__(self, enabled=True, cprofile=False):
+        self.enabled = enabled
+        self.cprofile = enabled and cprofile
+        self.stages = {}
+        self._current = None
+        self._peak = 0
+        self._started = time.perf_counter()
+        self._started_cpu = time.process_time()
+        self._started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @classmethod
+    def from_args(cls, args):
+        """Create a profiler from the options added by add_profile_arguments."""
+        return cls(enabled=args.profile is not None, cprofile=args.profile_cprofile)
+
+    def start(self, name):
+        """Start timing a stage; the previous stage, if still running, is stopped first."""
+        if not self.enabled:
+            return
+        if self._current is not None:
+            self.stop()
+        profile = None
+        if self.cprofile:
+            profile = cProfile.Profile()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        self._current = (name, time.perf_counter(), time.process_time(), memory, profile)
+        if profile is not None:
+            profile.enable()
+
+    def stop(self):
+        """Stop timing the running stage and add it to the stage records."""
+        if not self.enabled or self._current is None:
+            return
+        name, wall_start, cpu_start, memory_start, profile = self._current
+        if profile is not None:
+            profile.disable()
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        peak = max(traced_peak - memory_start, 0)
+        self._peak = max(self._peak, traced_peak)
+        self._current = None
+
+        stats = None
+        if profile is not None:
+            profile.create_stats()
+            stats = profile.stats
+        self._add(name, {'calls': 1, 'wall_time': wall, 'cpu_time': cpu, 'peak_memory': peak,
+                         'max_wall_time': wall}, stats)
+
+    @contextmanager
+    def stage(self, name):
+        """Time the body of a with block as a stage."""
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def _add(self, name, record, stats=None):
+        current = self.stages.get(name)
+        if current is None:
+            self.stages[name] = dict(record, stats=stats)
+            return
+        current['calls'] += record['calls']
+        current['wall_time'] += record['wall_time']
+        current['cpu_time'] += record['cpu_time']
+        current['peak_memory'] = max(current['peak_memory'], record['peak_memory'])
+        if record['max_wall_time'] > current['max_wall_time']:
+            current['max_wall_time'] = record['max_wall_time']
+            if stats is not None:
+                current['stats'] = stats
+
+    def records(self):
+        """Return the stage records, e.g. to send them from a worker process to merge()."""
+        return {name: dict(record) for name, record in self.stages.items()}
+
+    def merge(self, records):
+        """Add stage records from another profiler, e.g. one running in a worker process."""
+        if not self.enabled or not records:
+            return
+        for name, record in records.items():
+            record = dict(record)
+            stats = record.pop('stats', None)
+            self._add(name, record, stats)
+
+    def slowest_stage(self):
+        """Return the name of the stage with the largest total wall time, or None."""
+        if not self.stages:
+            return None
+        return max(self.stages, key=lambda name: self.stages[name]['wall_time'])
+
+    def report(self, **metadata):
+        """
+        Build the JSON-serialisable report of the run.
+
+        Wall and CPU times of a stage are summed over its calls; stages run in
+        worker processes are included when their records were merged, so a
+        stage's total can exceed the run's elapsed time.
+
+        Args:
+            **metadata: Extra fields to include, e.g. the run's arguments
+
+        Returns:
+            dict: Report with the run's totals and one entry per stage
+        """
+        stages = {}
+        for name, record in self.stages.items():
+            stages[name] = {
+                'calls': record['calls'],
+                'wall_time': record['wall_time'],
+                'cpu_time': record['cpu_time'],
+                'max_wall_time': record['max_wall_time'],
+                'peak_memory_bytes': record['peak_memory'],
+            }
+        return {
+            'started': self._started_at,
+            'command': sys.argv,
+            'pid': os.getpid(),
+            'wall_time': time.perf_counter() - self._started,
+            'cpu_time': time.process_time() - self._started_cpu,
+            'peak_memory_bytes': self._peak,
+            'stages': stages,
+            'slowest_stage': self.slowest_stage(),
+            **metadata,
+        }
+
+    def write_report(self, filename, **metadata):
+        """
+        Write the JSON report, and with cprofile=True the cProfile of the slowest stage.
+
+        The cProfile is written next to the report as '{report}-{stage}.prof'.
+
+        Returns:
+            dict: The report written
+        """
+        if not self.enabled:
+            return None
+        self.stop()
+        report = self.report(**metadata)
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        slowest = report['slowest_stage']
+        if slowest is not None and self.stages[slowest].get('stats') is not None:
+            profile_file = f'{os.path.splitext(filename)[0]}-{slowest}.prof'
+            # Same format as cProfile.Profile.dump_stats, readable with pstats
+            with open(profile_file, 'wb') as f:
+                marshal.dump(self.stages[slowest]['stats'], f)
+            report['cprofile'] = profile_file
+        with open(filename, 'w') as f:
+            json.dump(report, f, indent=2)
+        return report
+
+    def finish(self, filename, **metadata):
+        """Write the report (see write_report) and print the stage summary."""
+        if not self.enabled:
+            return None
+        report = self.write_report(filename, **metadata)
+        print(f"\nStage profile (report saved to {filename}):")
+        print(self.summary())
+        return report
+
+    def summary(self):
+        """Return a short text table of the stages, slowest first."""
+        lines = [f"{'stage':<20}{'calls':>7}{'wall (s)':>11}{'cpu (s)':>11}{'peak MB':>10}"]
+        for name, record in sorted(self.stages.items(), key=lambda item: -item[1]['wall_time']):
+            lines.append(f"{name:<20}{record['calls']:>7}{record['wall_time']:>11.3f}"
+                         f"{record['cpu_time']:>11.3f}{record['peak_memory'] / 2**20:>10.1f}")
+        return '\n'.join(lines)
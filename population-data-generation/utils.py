@@ -1,8 +1,11 @@
 import pandas as pd
 import numpy as np
 from scipy.interpolate import CubicSpline
-import matplotlib.pyplot as plt
 import os
+from functools import lru_cache
+from population_cube import PopulationCube, BINARY_EXTENSION
+from census_csv import read_census_csv
+from plotting import make_plot_job, render_plot_job
 
 def clean_column_name(col_name):
     """Clean column name by removing BOM and other special characters."""
@@ -21,7 +24,133 @@ def get_age_value(age_str):
     else:
         return int(age_str)
 
-def process_census_data(csv_files, state_name, gender):
+# Target age groups used throughout the nordpred input files
+TARGET_AGE_GROUPS = [
+    '0-4', '5-9', '10-14', '15-19', '20-24', '25-29', '30-34', '35-39',
+    '40-44', '45-49', '50-54', '55-59', '60-64', '65-69', '70-74', '75-79',
+    '80-84', '85+'
+]
+
+def parse_age_labels(age_labels):
+    """
+    Parse census age labels into a numeric (lo, hi) table.
+    
+    Args:
+        age_labels (list): Age labels as found in the census 'Age' column
+    
+    Returns:
+        pd.DataFrame: One row per label with columns 'lo', 'hi', 'kind' and 'valid'.
+            'kind' is one of 'range', 'single', 'open', 'skip' (All ages / Age not
+            stated); labels that cannot be parsed are marked invalid.
+    """
+    records = []
+    for label in age_labels:
+        label = str(label)
+        if label in ('All ages', 'Age not stated'):
+            records.append((label, -1, -1, 'skip', True))
+            continue
+        try:
+            if label.endswith('+'):
+                lo = int(label[:-1])
+                records.append((label, lo, float('inf'), 'open', True))
+            elif '-' in label:
+                lo, hi = map(int, label.split('-'))
+                records.append((label, lo, hi, 'range', True))
+            else:
+                lo = int(label)
+                records.append((label, lo, lo, 'single', True))
+        except ValueError:
+            records.append((label, -1, -1, 'invalid', False))
+    return pd.DataFrame.from_records(records, columns=['label', 'lo', 'hi', 'kind', 'valid'])
+
+def build_age_bin_index(age_table, target_age_groups=TARGET_AGE_GROUPS):
+    """
+    Build the membership matrix mapping parsed census labels to target age groups.
+    
+    A census row is counted in a target group when its whole range lies inside
+    the group, a single age falls inside it, or, for open-ended labels such as
+    '80+', when the label's start lies inside the group or the group starts at
+    80 or later. '0-6' is counted as '0-4'.
+    
+    Args:
+        age_table (pd.DataFrame): Output of parse_age_labels
+        target_age_groups (list): Target age groups
+    
+    Returns:
+        np.ndarray: Integer matrix of shape (labels, target groups)
+    """
+    lo = age_table['lo'].to_numpy(dtype=float)[:, None]
+    hi = age_table['hi'].to_numpy(dtype=float)[:, None]
+    kind = age_table['kind'].to_numpy()[:, None]
+    label = age_table['label'].to_numpy()[:, None]
+    
+    target_min = np.array([int(g[:-1]) if g.endswith('+') else int(g.split('-')[0])
+                           for g in target_age_groups], dtype=float)[None, :]
+    target_max = np.array([float('inf') if g.endswith('+') else int(g.split('-')[1])
+                           for g in target_age_groups], dtype=float)[None, :]
+    
+    in_range = (kind == 'range') & (lo >= target_min) & (hi <= target_max)
+    in_single = (kind == 'single') & (lo >= target_min) & (lo <= target_max)
+    in_open = (kind == 'open') & (((lo >= target_min) & (lo <= target_max)) | (target_min >= 80))
+    membership = in_range | in_single | in_open
+    
+    # For '0-4' output group, accept both '0-4' and '0-6' from input
+    if '0-4' in target_age_groups:
+        membership[:, target_age_groups.index('0-4')] |= np.isin(label[:, 0], ['0-4', '0-6'])
+    
+    return membership.astype(np.int64)
+
+def read_census_file(csv_file):
+    """
+    Read a census CSV file and lower-case its state names for matching.
+
+    Malformed rows, such as rows shifted by an extra column, are left out and
+    reported (see census_csv.read_census_csv).
+    """
+    df, report = read_census_csv(csv_file, numeric=['Persons', 'Males', 'Females'])
+    if report:
+        print(f"Warning: {report.summary()}")
+    df['State'] = df['State'].str.strip().str.lower()
+    return df
+
+def aggregate_census_bins(df, gender, states=None, target_age_groups=TARGET_AGE_GROUPS):
+    """
+    Sum a census table into target age groups for many states at once.
+    
+    Args:
+        df (pd.DataFrame): Census table as returned by read_census_file
+        gender (str): Gender to process ('Male' or 'Female')
+        states (list): State names to aggregate (default: every state in the table)
+        target_age_groups (list): Target age groups
+    
+    Returns:
+        pd.DataFrame: Population totals with states (lower case) as rows and
+            target age groups as columns
+    """
+    if states is not None:
+        df = df[df['State'].isin([state.lower() for state in states])]
+        found = set(df['State'])
+        missing = [state for state in states if state.lower() not in found]
+        if missing:
+            raise ValueError(f"No data found for state: {', '.join(missing)}")
+    
+    # Parse every distinct age label once
+    label_codes, labels = pd.factorize(df['Age'].astype(str))
+    age_table = parse_age_labels(labels)
+    invalid = age_table.loc[~age_table['valid'], 'label'].tolist()
+    if invalid:
+        raise ValueError(f"Unrecognised age labels: {invalid}")
+    membership = build_age_bin_index(age_table, target_age_groups)
+    
+    # One grouped sum per (state, age label), then map labels onto target groups
+    values = df[gender + 's'].astype(np.int64)
+    totals = values.groupby([df['State'].to_numpy(), label_codes]).sum().unstack(fill_value=0)
+    totals = totals.reindex(columns=range(len(labels)), fill_value=0)
+    binned = totals.to_numpy(dtype=np.int64) @ membership
+    
+    return pd.DataFrame(binned, index=totals.index, columns=target_age_groups)
+
+def process_census_data(csv_files, state_name, gender, census_tables=None):
     """
     Process census data from multiple CSV files for a specific state and gender.
     
@@ -29,139 +158,221 @@ def process_census_data(csv_files, state_name, gender):
         csv_files (list): List of CSV file paths for different census years
         state_name (str): Name of the state to process
         gender (str): Gender to process ('Male' or 'Female')
+        census_tables (dict): Optional already-read tables keyed by CSV file path
     
     Returns:
         pd.DataFrame: Processed data with age groups as rows and years as columns
     """
-    # Define the target age groups
-    target_age_groups = [
-        '0-4', '5-9', '10-14', '15-19', '20-24', '25-29', '30-34', '35-39',
-        '40-44', '45-49', '50-54', '55-59', '60-64', '65-69', '70-74', '75-79',
-        '80-84', '85+'
-    ]
-    
     # Create empty dataframe with age groups
-    processed_data = pd.DataFrame({'row.names': target_age_groups})
+    processed_data = pd.DataFrame({'row.names': TARGET_AGE_GROUPS})
     
     # Process each census year
     for csv_file in csv_files:
         # Extract year from filename
-        year = int(os.path.basename(csv_file).split('.')[0])  # Extract year from filename
-        
-        # Read the CSV file
-        df = pd.read_csv(csv_file)
+        year = int(os.path.basename(csv_file).split('.')[0])
         
-        # Convert state names to lowercase for case-insensitive matching
-        df['State'] = df['State'].str.lower()
-        state_name_lower = state_name.lower()
-        
-        # Filter for the specific state
-        df_state = df[df['State'] == state_name_lower]
+        if census_tables is not None and csv_file in census_tables:
+            df = census_tables[csv_file]
+        else:
+            df = read_census_file(csv_file)
         
-        if df_state.empty:
-            raise ValueError(f"No data found for state: {state_name} in {csv_file}")
+        try:
+            binned = aggregate_census_bins(df, gender, [state_name])
+        except ValueError as e:
+            raise ValueError(f"{e} in {csv_file}") from e
         
-        # Process each target age group
-        for target_age_group in target_age_groups:
-            # Parse target age range
-            if target_age_group.endswith('+'):
-                min_age = int(target_age_group[:-1])
-                max_age = float('inf')
-            else:
-                min_age, max_age = map(int, target_age_group.split('-'))
-            
-            matching_rows = []
-            for _, row in df_state.iterrows():
-                age_str = row['Age']
-                # For '0-4' output group, accept both '0-4' and '0-6' from input
-                if target_age_group == '0-4' and age_str in ['0-4', '0-6']:
-                    matching_rows.append(row)
-                    continue
-                age_value = get_age_value(age_str)
-                if age_str == 'All ages' or age_str == 'Age not stated':
-                    continue
-                # Handle age ranges in the data
-                if '-' in age_str:
-                    data_min, data_max = map(int, age_str.split('-'))
-                    if data_min >= min_age and data_max <= max_age:
-                        matching_rows.append(row)
-                # Handle individual ages
-                elif age_value >= min_age and age_value <= max_age:
-                    matching_rows.append(row)
-                # Handle 80+ case
-                elif age_str.endswith('+') and min_age >= 80:
-                    matching_rows.append(row)
-            
-            # Calculate total population for this age group
-            total_population = sum(int(row[gender + 's']) for row in matching_rows)
-            
-            # Store the total population
-            processed_data.loc[processed_data['row.names'] == target_age_group, str(year)] = total_population
+        # Store the total population
+        processed_data[str(year)] = binned.iloc[0].to_numpy()
     
     return processed_data
 
+def process_census_cube(csv_files, states, genders, census_tables=None):
+    """
+    Process census data for many states and genders into a PopulationCube.
+    
+    Args:
+        csv_files (list): List of CSV file paths for different census years
+        states (list): Names of the states to process
+        genders (list): Genders to process ('Male' and/or 'Female')
+        census_tables (dict): Optional already-read tables keyed by CSV file path
+    
+    Returns:
+        PopulationCube: Census totals indexed by (state, gender, age group, census year)
+    """
+    years = [int(os.path.basename(csv_file).split('.')[0]) for csv_file in csv_files]
+    values = np.zeros((len(states), len(genders), len(TARGET_AGE_GROUPS), len(years)), dtype=np.int64)
+    
+    for k, csv_file in enumerate(csv_files):
+        if census_tables is not None and csv_file in census_tables:
+            df = census_tables[csv_file]
+        else:
+            df = read_census_file(csv_file)
+        
+        for g, gender in enumerate(genders):
+            try:
+                binned = aggregate_census_bins(df, gender, states)
+            except ValueError as e:
+                raise ValueError(f"{e} in {csv_file}") from e
+            values[:, g, :, k] = binned.loc[[state.lower() for state in states]].to_numpy()
+    
+    return PopulationCube(values, states, genders, TARGET_AGE_GROUPS, years)
+
+@lru_cache(maxsize=None)
+def interpolation_operators(known_years, target_years):
+    """
+    Build the operators mapping values at known years to target years.
+    
+    Cubic spline interpolation is linear in the known values, so it is stored as a
+    (target years x known years) matrix. Linear interpolation is stored as the
+    bracketing knot index and offset of each target year, so that it can be
+    evaluated for many series with exactly the arithmetic of np.interp.
+    Operators are cached per (known years, target years) and returned read-only.
+    
+    Args:
+        known_years (tuple): Years with known values (the spline knots)
+        target_years (tuple): Years to interpolate or extrapolate to
+    
+    Returns:
+        tuple: (cubic, linear) operators; cubic is None if no spline can be built
+    """
+    knots = np.array(known_years, dtype=float)
+    targets = np.array(target_years, dtype=float)
+    
+    # Linear interpolation, clamped to the end values outside the knots like np.interp
+    left = np.clip(np.searchsorted(knots, targets, side='right') - 1, 0, max(len(knots) - 2, 0))
+    right = np.minimum(left + 1, len(knots) - 1)
+    linear = {
+        'left': left,
+        'right': right,
+        'offset': targets - knots[left],
+        'width': knots[right] - knots[left],
+        'exact': targets == knots[left],
+        'below': targets < knots[0],
+        'above': targets > knots[-1],
+    }
+    for array in linear.values():
+        array.setflags(write=False)
+    
+    try:
+        cubic = CubicSpline(knots, np.eye(len(knots)))(targets)
+        cubic.setflags(write=False)
+    except ValueError:
+        cubic = None
+    return cubic, linear
+
+def _apply_linear_operator(values, linear):
+    """Evaluate a linear interpolation operator for every series (row) of values."""
+    left_values = values[:, linear['left']]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (values[:, linear['right']] - left_values) / linear['width']
+        result = slope * linear['offset'] + left_values
+    result = np.where(linear['exact'], left_values, result)
+    result = np.where(linear['below'], values[:, :1], result)
+    return np.where(linear['above'], values[:, -1:], result)
+
+def interpolate_series(values, known_years, target_years, linear_mask=None, negative_fallback=False,
+                       rounding=None):
+    """
+    Interpolate many series at once with cached interpolation operators.
+    
+    The spline operator agrees with a per-series CubicSpline to within
+    floating-point noise. With rounding, series with a value within that noise
+    of a rounding boundary (or of 0, with negative_fallback) are evaluated with
+    CubicSpline one by one, so they round exactly as per-series code does.
+    
+    Args:
+        values (np.ndarray): Known values, shape (series, known years)
+        known_years (list): Years of the known values
+        target_years (list): Years to interpolate or extrapolate to
+        linear_mask (np.ndarray): Series that should always use linear interpolation
+        negative_fallback (bool): Use linear interpolation for series whose spline goes negative
+        rounding (str): How the caller rounds the results: 'round' (np.round) or 'trunc' (int())
+    
+    Returns:
+        np.ndarray: Interpolated values, shape (series, target years)
+    """
+    values = np.asarray(values, dtype=float)
+    cubic, linear = interpolation_operators(tuple(int(y) for y in known_years),
+                                            tuple(int(y) for y in target_years))
+    linear_values = _apply_linear_operator(values, linear)
+    if cubic is None:
+        return linear_values
+    
+    cubic_values = values @ cubic.T
+    # Series the spline cannot handle fall back to linear interpolation
+    use_linear = ~np.isfinite(values).all(axis=1)
+    if linear_mask is not None:
+        use_linear |= np.asarray(linear_mask, dtype=bool)
+    if rounding is not None:
+        boundary = {'round': 0.5, 'trunc': 0.0}[rounding]
+        with np.errstate(invalid='ignore'):
+            noise = 1e-12 * (np.abs(values) @ np.abs(cubic).T)
+            shifted = cubic_values - boundary
+            near = np.abs(shifted - np.round(shifted)) <= noise
+            if negative_fallback:
+                near |= np.abs(cubic_values) <= noise
+        knots = np.array(known_years)
+        targets = np.array(target_years)
+        rows = np.flatnonzero(near.any(axis=1) & ~use_linear)
+        if len(knots) == 3:
+            # Three knots are solved as one dense system, whose rounding depends on
+            # how many series are solved together
+            for i in rows:
+                cubic_values[i] = CubicSpline(knots, values[i])(targets)
+        elif len(rows):
+            # Otherwise each series' banded system is solved on its own
+            cubic_values[rows] = CubicSpline(knots, values[rows].T)(targets).T
+    if negative_fallback:
+        use_linear |= (cubic_values < 0).any(axis=1)
+    return np.where(use_linear[:, None], linear_values, cubic_values)
+
+def _is_older_age(age_groups):
+    """Mask of the 70+ age groups, which are interpolated linearly."""
+    return np.array([any(age in age_group for age in ['70', '75', '80', '85']) for age_group in age_groups])
+
 def interpolate_population(processed_data, start_year=1990, end_year=2021):
     """
     Interpolate population data for years between census years.
     
     Args:
-        processed_data (pd.DataFrame): Processed census data
+        processed_data (pd.DataFrame or PopulationCube): Processed census data
         start_year (int): Start year for interpolation
         end_year (int): End year for interpolation
     
     Returns:
-        pd.DataFrame: Interpolated data for all years
+        pd.DataFrame or PopulationCube: Interpolated data for all years, of the same type as the input
     """
-    # Get census years from the data
-    census_years = [int(col) for col in processed_data.columns if col != 'row.names']
-    
     # Create array of all years to interpolate
     all_years = np.array(list(range(start_year, end_year + 1)))
     
-    # Create new dataframe for interpolated data
-    interpolated_data = pd.DataFrame({'row.names': processed_data['row.names']})
+    if isinstance(processed_data, PopulationCube):
+        census_years = processed_data.years
+        age_groups = processed_data.age_groups
+        known_values = processed_data.values.astype(np.int64)
+    else:
+        # Get census years from the data
+        census_years = [int(col) for col in processed_data.columns if col != 'row.names']
+        age_groups = processed_data['row.names'].tolist()
+        known_values = processed_data[[str(year) for year in census_years]].astype(np.int64).to_numpy()
     
-    # For each age group, interpolate the population
-    for age_group in processed_data['row.names']:
-        # Get known values for census years
-        known_years = []
-        known_values = []
-        
-        for year in census_years:
-            if str(year) in processed_data.columns:
-                known_years.append(year)
-                known_values.append(int(processed_data.loc[processed_data['row.names'] == age_group, str(year)].values[0]))
-        
-        # Convert to numpy arrays
-        known_years = np.array(known_years)
-        known_values = np.array(known_values)
-        
-        # For older age groups (70+), use linear interpolation
-        is_older_age = any(age in age_group for age in ['70', '75', '80', '85'])
-        if is_older_age:
-            # Linear interpolation
-            interpolated_values = np.interp(all_years, known_years, known_values)
-        else:
-            try:
-                # Try cubic spline interpolation
-                cs = CubicSpline(known_years, known_values)
-                interpolated_values = cs(all_years)
-                
-                # Check if interpolation produced negative values
-                if np.any(interpolated_values < 0):
-                    # Fall back to linear interpolation
-                    interpolated_values = np.interp(all_years, known_years, known_values)
-            except:
-                # Fall back to linear interpolation if cubic spline fails
-                interpolated_values = np.interp(all_years, known_years, known_values)
-        
-        # Ensure values are positive integers
-        interpolated_values = np.maximum(interpolated_values, 0)
-        interpolated_values = np.round(interpolated_values).astype(int)
-        
-        # Store interpolated values
-        for i, year in enumerate(all_years):
-            interpolated_data.loc[interpolated_data['row.names'] == age_group, str(year)] = interpolated_values[i]
+    # Every (region, sex, age group) series is interpolated in one call. For older
+    # age groups (70+), use linear interpolation; cubic spline otherwise, falling
+    # back to linear interpolation if it produces negative values
+    series_shape = known_values.shape[:-1]
+    linear_mask = np.broadcast_to(_is_older_age(age_groups), series_shape).reshape(-1)
+    interpolated_values = interpolate_series(known_values.reshape(-1, len(census_years)), census_years, all_years,
+                                             linear_mask=linear_mask, negative_fallback=True, rounding='round')
+    
+    # Ensure values are positive integers
+    interpolated_values = np.maximum(interpolated_values, 0)
+    interpolated_values = np.round(interpolated_values).astype(int)
+    interpolated_values = interpolated_values.reshape(series_shape + (len(all_years),))
+    
+    if isinstance(processed_data, PopulationCube):
+        return processed_data.with_values(interpolated_values, all_years)
+    
+    interpolated_data = pd.DataFrame(interpolated_values, columns=[str(year) for year in all_years])
+    interpolated_data.insert(0, 'row.names', age_groups)
     
     return interpolated_data
 
@@ -170,39 +381,53 @@ def forecast_population(interpolated_data, forecast_years=[2025, 2030, 2035, 204
     Forecast population for future years using interpolated data.
     
     Args:
-        interpolated_data (pd.DataFrame): Interpolated population data
+        interpolated_data (pd.DataFrame or PopulationCube): Interpolated population data
         forecast_years (list): List of years to forecast
     
     Returns:
-        pd.DataFrame: Forecast data for future years
+        pd.DataFrame or PopulationCube: Forecast data for future years, of the same type as the input
     """
-    # Create dataframe for forecasts
-    forecast_data = pd.DataFrame({'row.names': interpolated_data['row.names']})
+    if isinstance(interpolated_data, PopulationCube):
+        years = interpolated_data.years
+        values = interpolated_data.values.astype(np.int64)
+    else:
+        years = [int(year) for year in interpolated_data.columns if year != 'row.names']
+        values = interpolated_data[[str(year) for year in years]].astype(np.int64).to_numpy()
     
-    age_groups = list(interpolated_data['row.names'])
+    # Use the same interpolation operators as in interpolate_population
+    series_shape = values.shape[:-1]
+    forecast_values = interpolate_series(values.reshape(-1, len(years)), years, forecast_years, rounding='trunc')
+    forecast_values = np.trunc(forecast_values).astype(int).reshape(series_shape + (len(forecast_years),))
     
-    # First pass: calculate all forecasts
-    for idx, age_group in enumerate(age_groups):
-        years = np.array([int(year) for year in interpolated_data.columns if year != 'row.names'])
-        values = np.array([int(interpolated_data.loc[interpolated_data['row.names'] == age_group, str(year)].values[0]) 
-                          for year in years])
-        
-        # Use the same interpolation function as in interpolate_population
-        try:
-            cs = CubicSpline(years, values)
-            for year in forecast_years:
-                forecast_value = int(cs(year))
-                forecast_data.loc[forecast_data['row.names'] == age_group, str(year)] = forecast_value
-        except:
-            # Fall back to linear interpolation if cubic spline fails
-            for year in forecast_years:
-                forecast_value = int(np.interp(year, years, values))
-                forecast_data.loc[forecast_data['row.names'] == age_group, str(year)] = forecast_value
+    if isinstance(interpolated_data, PopulationCube):
+        return interpolated_data.with_values(forecast_values, forecast_years)
+    
+    forecast_data = pd.DataFrame(forecast_values, columns=[str(year) for year in forecast_years])
+    forecast_data.insert(0, 'row.names', interpolated_data['row.names'].tolist())
     
     return forecast_data
 
-def save_data(data, filename):
-    """Save data to a file with space separator and integer values."""
+def save_data(data, filename, region=None, sex=None):
+    """
+    Save data to a file with space separator and integer values.
+    
+    A PopulationCube is written one (region, sex) series per file; region and sex
+    may be omitted when the cube holds a single one. Files ending in '.npc' are
+    written in the binary cube format instead (see PopulationCube.write_binary);
+    for a cube without region or sex the whole cube is written.
+    """
+    binary = filename.endswith(BINARY_EXTENSION)
+    if isinstance(data, PopulationCube):
+        if not binary:
+            data.write_nordpred(filename, region, sex)
+        elif region is None and sex is None:
+            data.astype(np.int64).write_binary(filename)
+        else:
+            data.sel(region=region, sex=sex).astype(np.int64).write_binary(filename)
+        return
+    if binary:
+        PopulationCube.from_frame(data, region or '', sex or '').astype(np.int64).write_binary(filename)
+        return
     # Make a copy to avoid modifying the original DataFrame
     data_to_save = data.copy()
     # Convert all columns except 'row.names' to int
@@ -211,79 +436,20 @@ def save_data(data, filename):
             data_to_save[col] = data_to_save[col].astype(int)
     data_to_save.to_csv(filename, index=False, sep=' ')
 
-def create_visualizations(interpolated_data, forecast_data, output_dir):
+def create_visualizations(interpolated_data, forecast_data, output_dir, name=None):
     """
     Create visualizations of the population data and forecasts.
     
+    matplotlib is only imported when this is called; see plotting.render_plot_jobs
+    for rendering many series in a worker pool.
+    
     Args:
-        interpolated_data (pd.DataFrame): Interpolated population data
-        forecast_data (pd.DataFrame): Forecast population data
+        interpolated_data (pd.DataFrame or PopulationCube): Interpolated population data
+        forecast_data (pd.DataFrame or PopulationCube): Forecast population data
         output_dir (str): Directory to save visualizations
-    """
-    # Create figure with two subplots
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(15, 20))
-    
-    # Get all age groups
-    all_age_groups = interpolated_data['row.names'].tolist()
+        name (str): File name stem, e.g. 'population-male-goa' (default: 'population')
     
-    # Define colors
-    colors = plt.cm.tab20(np.linspace(0, 1, len(all_age_groups)))
-    
-    # Plot historical and interpolated data
-    historical_years = [int(year) for year in interpolated_data.columns if year != 'row.names']
-    forecast_years = [int(year) for year in forecast_data.columns if year != 'row.names']
-    
-    for i, age_group in enumerate(all_age_groups):
-        # Get historical data
-        historical_values = [int(interpolated_data.loc[interpolated_data['row.names'] == age_group, str(year)].values[0]) 
-                           for year in historical_years]
-        
-        # Get forecast data
-        forecast_values = [int(forecast_data.loc[forecast_data['row.names'] == age_group, str(year)].values[0]) 
-                         for year in forecast_years]
-        
-        # Plot historical data
-        ax1.plot(historical_years, historical_values, marker='o', label=age_group, color=colors[i], linewidth=2)
-        
-        # Plot forecast data
-        ax1.plot(forecast_years, forecast_values, marker='s', linestyle='--', color=colors[i], linewidth=2)
-        ax1.scatter(forecast_years, forecast_values, s=100, color='green', zorder=5)
-    
-    ax1.set_title('Population Forecast (1991-2040)', fontsize=16)
-    ax1.set_xlabel('Year', fontsize=14)
-    ax1.set_ylabel('Population', fontsize=14)
-    ax1.legend(loc='upper left', fontsize=12)
-    ax1.grid(True)
-    
-    # Create log scale plot
-    plt.figure(figsize=(15, 10))
-    
-    # Plot selected age groups
-    selected_age_groups = ['0-4', '15-19', '40-44', '70-74', '85+']
-    
-    for age_group in selected_age_groups:
-        # Get historical data
-        historical_values = [int(interpolated_data.loc[interpolated_data['row.names'] == age_group, str(year)].values[0]) 
-                           for year in historical_years]
-        
-        # Get forecast data
-        forecast_values = [int(forecast_data.loc[forecast_data['row.names'] == age_group, str(year)].values[0]) 
-                         for year in forecast_years]
-        
-        # Plot data
-        plt.plot(historical_years, historical_values, marker='o', label=age_group, linewidth=2)
-        plt.plot(forecast_years, forecast_values, marker='s', linestyle='--', 
-                color=plt.gca().lines[-1].get_color(), linewidth=2)
-        plt.scatter(forecast_years, forecast_values, s=100, color='green', zorder=5)
-    
-    plt.title('Population Forecast by Age Group (1991-2040) - Log Scale', fontsize=16)
-    plt.xlabel('Year', fontsize=14)
-    plt.ylabel('Population (Log Scale)', fontsize=14)
-    plt.yscale('log')
-    plt.legend(loc='upper left', fontsize=12)
-    plt.grid(True)
-    
-    # Save the plot
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, 'population_forecast.png'), dpi=300, bbox_inches='tight')
-    plt.close() 
\ No newline at end of file
+    Returns:
+        list: Paths of the files written
+    """
+    return render_plot_job(make_plot_job(interpolated_data, forecast_data, output_dir, name))
@@ -2,122 +2,345 @@ import pandas as pd
 import numpy as np
 import os
 import argparse
+import contextlib
+import csv
+import glob
+import io
+import json
+import multiprocessing
 import sys
+import time
+from datetime import datetime, timezone
 
-def process_file(input_csv, output_base):
-    # Try reading as multi-header, fallback to single header
-    try:
-        df = pd.read_csv(input_csv, header=[0, 1])
-        multi_header = True
-    except Exception:
-        df = pd.read_csv(input_csv)
-        multi_header = False
-
-    # Detect year column
-    if multi_header:
-        # Try to find a column with 'Prevalence Rate' or use the first column
-        if ('Type 1', 'Prevalence Rate') in df.columns:
-            years = df[('Type 1', 'Prevalence Rate')].astype(str).tolist()
+# Age groups in nordpred order
+AGE_GROUPS = ['0-4', '5-9', '10-14', '15-19', '20-24', '25-29', '30-34',
+              '35-39', '40-44', '45-49', '50-54', '55-59', '60-64', '65-69',
+              '70-74', '75-79', '80-84', '85+']
+
+# Source column label of each nordpred age group; labels are matched ignoring
+# case and surrounding spaces, and '75-84 Years' fills both 75-79 and 80-84
+AGE_MAP = {
+    '0-4': '<5 years',
+    '5-9': '5-9 Years',
+    '10-14': '10-14 Years',
+    '15-19': '15-19 years',
+    '20-24': '20-24 Years',
+    '25-29': '25-29 Years',
+    '30-34': '30-34 Years',
+    '35-39': '35-39 Years',
+    '40-44': '40-44 years',
+    '45-49': '45-49 years',
+    '50-54': '50-54 Years',
+    '55-59': '55-59 Years',
+    '60-64': '60-64 Years',
+    '65-69': '65-69 Years',
+    '70-74': '70-74 Years',
+    '75-79': '75-84 Years',
+    '80-84': '75-84 Years',
+    '85+': '85+ years'
+}
+
+SEXES = ['male', 'female']
+
+def _normalize(label):
+    return label.strip().lower()
+
+def _sex_of(label):
+    """Return 'male' or 'female' for a header cell naming a sex, else None."""
+    label = _normalize(label)
+    if 'female' in label:
+        return 'female'
+    if 'male' in label:
+        return 'male'
+    return None
+
+def parse_header(input_csv):
+    """
+    Read the header of a disease file into a column index map.
+
+    Two-row headers have age labels on the first row, each spanning the Male
+    and Female cells below it (the label is only written above the first of
+    them), and 'Type 1' / 'Prevalence Rate' above the year column. Single-row
+    headers name each column with both the age label and the sex, e.g.
+    '5-9 Years Male'.
+
+    Returns:
+        tuple: (columns, year_column, header_rows) where columns maps
+            (normalized age label, 'male'/'female') to the first matching
+            column index
+    """
+    with open(input_csv, newline='') as f:
+        reader = csv.reader(f)
+        top = next(reader, [])
+        bottom = next(reader, [])
+
+    columns = {}
+    if any(_sex_of(cell) for cell in bottom):
+        year_column = 0
+        label = ''
+        for i, cell in enumerate(bottom):
+            if i < len(top) and top[i].strip():
+                label = _normalize(top[i])
+            if (i < len(top) and top[i].strip() == 'Type 1') and cell.strip() == 'Prevalence Rate':
+                year_column = i
+            sex = _sex_of(cell)
+            if sex and label:
+                columns.setdefault((label, sex), i)
+        return columns, year_column, 2
+
+    # Single header: the column name holds both the age label and the sex
+    labels = {_normalize(label) for label in AGE_MAP.values()}
+    for i, cell in enumerate(top):
+        sex = _sex_of(cell)
+        name = _normalize(cell)
+        for label in labels:
+            if sex and label in name:
+                columns.setdefault((label, sex), i)
+    return columns, 0, 1
+
+def split_cells(cells):
+    """
+    Split 'estimate [upper lower]' cells into their parts.
+
+    All cells are split on whitespace in one vectorised pass; cells without
+    whitespace (point estimates only) are not split at all. Anything after
+    the second value is kept with the third, so the first value of a cell is
+    always the estimate.
+
+    Args:
+        cells (np.ndarray): Cell strings
+
+    Returns:
+        np.ndarray: (3 x cells) strings of the first, second and third value ('' where absent)
+    """
+    text = '\n'.join(cells)
+    if ' ' not in text and '\t' not in text:
+        parts = np.full((3, len(cells)), '', dtype=object)
+        parts[0] = cells
+        return parts
+    parts = pd.Series(cells, dtype=object).str.strip().str.split(n=2, expand=True)
+    return parts.reindex(columns=range(3)).fillna('').to_numpy().T
+
+def check_bounds(split, labels):
+    """
+    Check that lower <= estimate <= upper in every cell with numeric bounds.
+
+    Args:
+        split (np.ndarray): (3 x cells) estimate, upper and lower strings from split_cells
+        labels (list): Label of every cell, used in the error message
+
+    Raises:
+        ValueError: If a cell's bounds are not on both sides of its estimate
+    """
+    value, upper, lower = (pd.to_numeric(pd.Series(part), errors='coerce').to_numpy() for part in split)
+    numeric = ~(np.isnan(value) | np.isnan(upper) | np.isnan(lower))
+    bad = np.flatnonzero(numeric & ((lower > value) | (value > upper)))
+    if len(bad):
+        i = bad[0]
+        raise ValueError(f"{len(bad)} cells are not 'estimate upper lower', e.g. {labels[i]}: "
+                         f"'{split[0, i]} {split[1, i]} {split[2, i]}'")
+
+def process_file(input_csv, output_base, confidence_intervals=False):
+    """
+    Convert a disease prevalence file into nordpred male and female case files.
+
+    Cells holding an estimate with its confidence interval are written as in
+    the GBD files: estimate, upper bound, lower bound ('18.07 22.88 14.01').
+    The estimate is used; with confidence_intervals the bounds are checked to
+    enclose it (see check_bounds) and written to '{output_base}_{sex}_lower.txt'
+    and '_upper.txt' as well. Cells are copied as written in the input.
+
+    Returns:
+        dict: Input and output files, the input's rows and columns, the numbers of
+            age groups and periods written, and source columns not found
+    """
+    columns, year_column, header_rows = parse_header(input_csv)
+    df = pd.read_csv(input_csv, header=None, skiprows=header_rows, dtype=str, keep_default_na=False)
+    years = df[year_column].tolist() if year_column in df.columns else [''] * len(df)
+
+    # Source column of every (age group, sex); 75-84 Years is used twice but split once
+    sources = {(age, sex): columns.get((_normalize(AGE_MAP[age]), sex)) for age in AGE_GROUPS for sex in SEXES}
+    indices = sorted({index for index in sources.values() if index is not None and index in df.columns})
+    split = split_cells(df[indices].to_numpy().ravel(order='F')).reshape(3, len(indices), len(df))
+    position = {index: i for i, index in enumerate(indices)}
+    if confidence_intervals:
+        check_bounds(split.reshape(3, -1), [f'column {index}, row {row + header_rows + 1}'
+                                            for index in indices for row in range(len(df))])
+
+    # Row of each output in split: cells hold the estimate, upper and lower bound
+    parts = {'value': 0, 'lower': 2, 'upper': 1} if confidence_intervals else {'value': 0}
+    missing = [''] * len(df)
+    outputs = []
+    for sex in SEXES:
+        for part, k in parts.items():
+            suffix = '' if part == 'value' else f'_{part}'
+            out_file = f"{output_base}_{sex}{suffix}.txt"
+            with open(out_file, 'w') as f:
+                f.write('\t'.join([''] + years) + '\n')
+                for age in AGE_GROUPS:
+                    index = sources[(age, sex)]
+                    values = split[k, position[index]] if index in position else missing
+                    f.write('\t'.join([age] + list(values)) + '\n')
+            outputs.append(out_file)
+            print(f"Wrote {out_file}")
+    return {'input': input_csv, 'outputs': outputs, 'input_rows': len(df), 'input_columns': len(df.columns),
+            'age_groups': len(AGE_GROUPS), 'periods': len(years),
+            'missing_columns': sorted({f'{AGE_MAP[age]} {sex}' for (age, sex), index in sources.items()
+                                       if index not in position})}
+
+def expand_inputs(patterns):
+    """
+    Expand input arguments into CSV files.
+
+    Each argument is a file, a directory (all its .csv files) or a glob pattern.
+
+    Returns:
+        list: File paths, without duplicates, in argument order and sorted within each argument
+    """
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(glob.glob(os.path.join(pattern, '*.csv')))
+        elif glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
         else:
-            # Use the first column
-            years = df[df.columns[0]].astype(str).tolist()
+            matches = [pattern]
+        files.extend(path for path in matches if path not in files)
+    return files
+
+def output_base_for(input_csv, output_dir, name='{stem}'):
+    """
+    Derive the output base of an input file.
+
+    name is formatted with {stem}, the input file name without extension
+    (e.g. 'Nagaland-18groups-1991-2021'), and {region}, the lower-case stem up
+    to the first '-' (e.g. 'nagaland').
+    """
+    stem = os.path.splitext(os.path.basename(input_csv))[0]
+    region = stem.split('-')[0].lower()
+    return os.path.join(output_dir, name.format(stem=stem, region=region))
+
+def _convert(job):
+    """Convert one file for process_files, capturing its log, timing and error."""
+    input_csv, output_base, confidence_intervals = job
+    log = io.StringIO()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(log):
+            summary = process_file(input_csv, output_base, confidence_intervals)
+        summary['error'] = None
+    except Exception as e:
+        summary = {'input': input_csv, 'outputs': [], 'error': f'{type(e).__name__}: {e}'}
+    summary['seconds'] = time.perf_counter() - start
+    return summary, log.getvalue()
+
+def process_files(input_files, output_dir, name='{stem}', confidence_intervals=False, workers=1, manifest=None):
+    """
+    Convert many disease files, in a pool of worker processes when workers > 1.
+
+    A file that fails to convert is reported in the manifest without stopping
+    the others.
+
+    Args:
+        input_files (list): Input CSV files
+        output_dir (str): Directory for the outputs
+        name (str): Output base name pattern, see output_base_for
+        confidence_intervals (bool): Also write the CI bounds
+        workers (int): Number of worker processes
+        manifest (str): JSON file to write the manifest to (default: none)
+
+    Returns:
+        dict: Manifest with one entry per input file, in input order
+    """
+    jobs = [(input_csv, output_base_for(input_csv, output_dir, name), confidence_intervals)
+            for input_csv in input_files]
+    bases = [output_base for _, output_base, _ in jobs]
+    duplicates = sorted({base for base in bases if bases.count(base) > 1})
+    if duplicates:
+        raise ValueError(f"Several inputs map to the same output name: {', '.join(duplicates)}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    entries = []
+    if workers <= 1 or len(jobs) <= 1:
+        results = map(_convert, jobs)
+        pool = None
     else:
-        # Use the first column
-        years = df[df.columns[0]].astype(str).tolist()
-
-    # Age groups in nordpred order
-    age_groups = ['0-4', '5-9', '10-14', '15-19', '20-24', '25-29', '30-34',
-                  '35-39', '40-44', '45-49', '50-54', '55-59', '60-64', '65-69',
-                  '70-74', '75-79', '80-84', '85+']
-    age_map = {
-        '0-4': '<5 years',
-        '5-9': '5-9 Years',
-        '10-14': '10-14 Years',
-        '15-19': '15-19 years',
-        '20-24': '20-24 Years',
-        '25-29': '25-29 Years',
-        '30-34': '30-34 Years',
-        '35-39': '35-39 Years',
-        '40-44': '40-44 years',
-        '45-49': '45-49 years',
-        '50-54': '50-54 Years',
-        '55-59': '55-59 Years',
-        '60-64': '60-64 Years',
-        '65-69': '65-69 Years',
-        '70-74': '70-74 Years',
-        '75-79': '75-84 Years',
-        '80-84': '75-84 Years',
-        '85+': '85+ years'
+        method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        pool = multiprocessing.get_context(method).Pool(min(workers, len(jobs)))
+        # imap keeps results in input order whatever the completion order
+        results = pool.imap(_convert, jobs)
+    try:
+        for summary, log in results:
+            print(log, end='')
+            if summary['error'] is not None:
+                print(f"Error converting {summary['input']}: {summary['error']}")
+            entries.append(summary)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    result = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'output_dir': output_dir,
+        'workers': workers,
+        'seconds': time.perf_counter() - start,
+        'files': entries,
     }
-    
-    # Prepare output data
-    data = {'male': [], 'female': []}
-    columns = list(df.columns)
-    for age in age_groups:
-        age_col = age_map[age]
-        # Find male column
-        male_col = None
-        female_col = None
-        if multi_header:
-            for c in columns:
-                if c[0].lower() == age_col.lower() and c[1].strip().lower().startswith('male'):
-                    male_col = c
-                    break
-            found_male = False
-            for c in columns:
-                if c == male_col:
-                    found_male = True
-                elif found_male and c[1].strip().lower().startswith('female'):
-                    female_col = c
-                    break
-            if not male_col:
-                for c in columns:
-                    if c[0].lower() == age_col.lower() and 'male' in c[1].lower():
-                        male_col = c
-                        break
-            if not female_col:
-                for c in columns:
-                    if c[0].lower() == age_col.lower() and 'female' in c[1].lower():
-                        female_col = c
-                        break
-        else:
-            # Single header: find columns by name
-            for c in columns:
-                if age_col.lower() in c.lower() and 'male' in c.lower():
-                    male_col = c
-                if age_col.lower() in c.lower() and 'female' in c.lower():
-                    female_col = c
-        # Extract values, handling confidence intervals if present
-        def extract_value(cell):
-            if pd.isnull(cell):
-                return ''
-            return str(cell).split()[0]
-        male_values = [extract_value(v) for v in df[male_col]] if male_col else [''] * len(df)
-        female_values = [extract_value(v) for v in df[female_col]] if female_col else [''] * len(df)
-        data['male'].append([age] + male_values)
-        data['female'].append([age] + female_values)
-    # Write output files
-    header = [''] + years
-    for gender in ['male', 'female']:
-        out_file = f"{output_base}_{gender}.txt"
-        with open(out_file, 'w') as f:
-            f.write('\t'.join(header) + '\n')
-            for row in data[gender]:
-                f.write('\t'.join(map(str, row)) + '\n')
-        print(f"Wrote {out_file}")
+    if manifest:
+        with open(manifest, 'w') as f:
+            json.dump(result, f, indent=2)
+    return result
 
 def main():
     parser = argparse.ArgumentParser(description='Process diabetes data and generate nordpred-style files')
-    parser.add_argument('input_csv', help='Input CSV file')
+    parser.add_argument('inputs', nargs='+', metavar='input_csv',
+                        help='Input CSV file; several files, directories or glob patterns convert in batch')
     parser.add_argument('--output-base', help='Base name for output files (without _male.txt/_female.txt)', required=False)
+    parser.add_argument('--confidence-intervals', action='store_true',
+                        help='Also write the lower and upper CI bounds to <output_base>_<sex>_lower.txt and _upper.txt')
+    parser.add_argument('--output-dir', type=str, default=None,
+                        help='Batch mode: directory for the outputs, named after the inputs (default: current directory)')
+    parser.add_argument('--output-name', type=str, default='{stem}',
+                        help="Batch mode: output base name pattern with {stem} (input name without extension) "
+                             "and {region} (lower-case stem up to the first '-') (default: {stem})")
+    parser.add_argument('--workers', type=int, default=1, help='Batch mode: number of worker processes (default: 1)')
+    parser.add_argument('--manifest', type=str, default=None,
+                        help='Batch mode: manifest JSON file (default: manifest.json in the output directory)')
     args = parser.parse_args()
+
+    batch = (len(args.inputs) > 1 or args.output_dir is not None
+             or any(os.path.isdir(path) or glob.has_magic(path) for path in args.inputs))
+    if batch:
+        if args.output_base:
+            parser.error('--output-base converts a single file; use --output-dir and --output-name in batch mode')
+        input_files = expand_inputs(args.inputs)
+        if not input_files:
+            parser.error(f"no input files match: {' '.join(args.inputs)}")
+        output_dir = args.output_dir or '.'
+        manifest = args.manifest or os.path.join(output_dir, 'manifest.json')
+        result = process_files(input_files, output_dir, args.output_name, args.confidence_intervals,
+                               args.workers, manifest)
+        failed = [entry for entry in result['files'] if entry['error'] is not None]
+        print(f"Converted {len(input_files) - len(failed)} of {len(input_files)} files in {result['seconds']:.2f}s; "
+              f"manifest saved to {manifest}")
+        if failed:
+            sys.exit(1)
+        return
+
+    input_csv = args.inputs[0]
     output_base = args.output_base
     if not output_base:
-        output_base = input('Enter base name for output files (e.g., processed_diabetes): ').strip()
+        if not sys.stdin.isatty():
+            # Not run interactively: name the outputs after the input instead of prompting
+            output_base = output_base_for(input_csv, '.')
+        else:
+            output_base = input('Enter base name for output files (e.g., processed_diabetes): ').strip()
         if not output_base:
             print('No output base name provided. Exiting.')
             sys.exit(1)
-    process_file(args.input_csv, output_base)
+    process_file(input_csv, output_base, args.confidence_intervals)
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
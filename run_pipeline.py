@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Run the whole analysis, from census and disease files to Nordpred predictions, as one dependency graph.
+
+The graph has a node per step and (region, sex, disease):
+
+    population[region/sex]        process-population.py  -> population-{sex}-{region}.txt, -pred.txt
+    cases[region/disease]         read_diabetes_data.py  -> {region}-{disease}_male.txt, _female.txt
+    nordpred[region/sex/disease]  nordpred.py (or run-nordpred-analysis.R) -> predictions CSV
+
+and, with --india, the India-Population-Data chain run in its own directory:
+
+    india-inputs -> india-process -> india-interpolate-forecast
+
+Independent nodes run in parallel, and nodes whose inputs (including the
+scripts they run) are unchanged since their last successful run are skipped,
+so a rerun only recomputes what changed.
+"""
+
+import argparse
+import functools
+import glob
+import os
+import shutil
+import sys
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+POPULATION_DIR = os.path.join(ROOT, 'population-data-generation')
+INDIA_SCRIPTS_DIR = os.path.join(ROOT, 'India-Population-Data', 'population-interpolation-forecast-scripts')
+sys.path.insert(0, POPULATION_DIR)
+
+from pipeline_dag import FAILED, BLOCKED, Node, Pipeline, summarize
+from census_csv import read_census_csv
+
+SEXES = ['male', 'female']
+CENSUS_YEARS = [1991, 2001, 2011]
+
+# Modules run by process-population.py; editing any of them reruns the population nodes
+POPULATION_MODULES = ['process-population.py', 'utils.py', 'population_cube.py', 'plotting.py',
+                      'stage_cache.py', 'stage_profiler.py', 'census_csv.py', 'results_store.py']
+
+def copy_file(source, destination):
+    shutil.copyfile(source, destination)
+
+def census_regions(census_files):
+    """Return the lower-case state names present in every census file, without malformed rows."""
+    regions = None
+    for csv_file in census_files:
+        df, _ = read_census_csv(csv_file, numeric=[])
+        names = set(df['State'].str.strip().str.lower())
+        regions = names if regions is None else regions & names
+    return regions
+
+def disease_files(pattern):
+    """
+    Find the disease files matching a pattern with a '{region}' placeholder.
+
+    Returns:
+        dict: File path per lower-case region name
+    """
+    prefix, suffix = pattern.split('{region}')
+    files = {}
+    for path in sorted(glob.glob(prefix + '*' + suffix)):
+        region = path[len(prefix):len(path) - len(suffix)]
+        files[region.lower()] = path
+    return files
+
+def analysis_nodes(args, regions, cases_files):
+    """Build the population, cases and nordpred nodes of the main analysis."""
+    work_dir = args.work_dir
+    census_files = [os.path.join(args.census_dir, f'{year}.csv') for year in CENSUS_YEARS]
+    population_code = [os.path.join(POPULATION_DIR, module) for module in POPULATION_MODULES]
+    nodes = []
+
+    for region in regions:
+        for sex in args.sexes:
+            command = [sys.executable, os.path.join(POPULATION_DIR, 'process-population.py'),
+                       '--state', region, '--gender', sex.capitalize(), '--input-dir', args.census_dir,
+                       '--output-dir', work_dir, '--forecast-years', args.forecast_years, '--no-plots', '--no-cache']
+            nodes.append(Node('population', (region, sex), command, inputs=census_files + population_code,
+                              outputs=[os.path.join(work_dir, f'population-{sex}-{region}.txt'),
+                                       os.path.join(work_dir, f'population-{sex}-{region}-pred.txt')]))
+
+        for disease in args.diseases:
+            script = os.path.join(ROOT, 'reading-data', 'read_diabetes_data.py')
+            output_base = os.path.join(work_dir, f'{region}-{disease}')
+            nodes.append(Node('cases', (region, None, disease),
+                              [sys.executable, script, cases_files[region], '--output-base', output_base],
+                              inputs=[cases_files[region], script],
+                              outputs=[f'{output_base}_{sex}.txt' for sex in SEXES]))
+
+            for sex in args.sexes:
+                inputs = [os.path.join(work_dir, f'{region}-{disease}_{sex}.txt'),
+                          os.path.join(work_dir, f'population-{sex}-{region}.txt'),
+                          os.path.join(work_dir, f'population-{sex}-{region}-pred.txt')]
+                if args.nordpred == 'r':
+                    # run-nordpred-analysis.R sources nordpred.s from its working directory
+                    script = os.path.join(ROOT, 'run-nordpred-analysis.R')
+                    command = ['Rscript', script, '--input-dir', os.path.abspath(work_dir), '--state', region,
+                               '--gender', sex, '--plot-type', 'both']
+                    outputs = [os.path.join(work_dir, f'nordpred_{kind}_{region}_{sex}.{ext}')
+                               for kind, ext in [('predictions', 'csv'), ('plot', 'png'), ('trends', 'png')]]
+                    nodes.append(Node('nordpred', (region, sex, disease), command, cwd=ROOT,
+                                      inputs=inputs + [script, os.path.join(ROOT, 'nordpred.s')], outputs=outputs))
+                else:
+                    script = os.path.join(ROOT, 'nordpred.py')
+                    output = os.path.join(work_dir, f'nordpred_predictions_{region}_{sex}_{disease}.csv')
+                    command = [sys.executable, script, '--input-dir', work_dir, '--state', region, '--gender', sex,
+                               '--disease', disease, '--output', output]
+                    if args.period_length:
+                        command += ['--period-length', str(args.period_length)]
+                    nodes.append(Node('nordpred', (region, sex, disease), command,
+                                      inputs=inputs + [script], outputs=[output]))
+    return nodes
+
+def india_nodes(args):
+    """
+    Build the nodes of the India-Population-Data chain.
+
+    The India scripts read and write fixed file names in their working
+    directory, so they all run in one directory under the work directory, into
+    which the census files are copied first.
+    """
+    india_dir = os.path.join(args.work_dir, 'india')
+    script = functools.partial(os.path.join, INDIA_SCRIPTS_DIR)
+    nodes = []
+
+    census_files = []
+    for year in CENSUS_YEARS:
+        source = os.path.join(args.india_input_dir, f'{year}-M-F.csv')
+        destination = os.path.join(india_dir, f'{year}-M-F.csv')
+        nodes.append(Node('india-inputs', ('india', year), functools.partial(copy_file, source, destination),
+                          inputs=[source], outputs=[destination]))
+        census_files.append(destination)
+
+    populations = {sex: os.path.join(india_dir, f'nordpred_{sex}_population.txt') for sex in SEXES}
+    nodes.append(Node('india-process', ('india',), [sys.executable, script('process_population_data.py')],
+                      cwd=india_dir, inputs=census_files + [script('process_population_data.py'),
+                                                            script('age_schemes.py'), script('age_schemes.json'),
+                                                            script('interpolation_utils.py'),
+                                                            os.path.join(POPULATION_DIR, 'census_csv.py')],
+                      outputs=list(populations.values())))
+
+    # Both sexes are interpolated and forecast in one batch, which also writes
+    # the processed-files/*_interpolated.txt copies the forecast reads
+    outputs = []
+    for sex in SEXES:
+        outputs += [os.path.join(india_dir, f'nordpred_{sex}_population_interpolated.csv'),
+                    os.path.join(india_dir, f'{sex}_population_interpolation_all_groups.png'),
+                    os.path.join(india_dir, f'{sex}_population_interpolation_log_scale.png'),
+                    os.path.join(india_dir, 'processed-files', f'nordpred_{sex}_population_interpolated.txt'),
+                    os.path.join(india_dir, 'processed-files', f'nordpred_{sex}_population_forecast.txt')]
+    outputs += [os.path.join(india_dir, 'plots', 'population_forecast.png'),
+                os.path.join(india_dir, 'plots', 'population_forecast_log_scale.png')]
+    nodes.append(Node('india-interpolate-forecast', ('india',), [sys.executable, script('interpolate_and_forecast.py')],
+                      cwd=india_dir, inputs=list(populations.values())
+                      + [script(name) for name in ['interpolate_and_forecast.py', 'interpolation_utils.py',
+                                                   'forecast_population.py']]
+                      # interpolation_utils.py uses the spline operators of utils.py
+                      + [os.path.join(POPULATION_DIR, module) for module in POPULATION_MODULES],
+                      outputs=outputs))
+    return nodes
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the census to Nordpred analysis as a dependency graph, '
+                                                 'skipping steps whose inputs are unchanged.')
+    parser.add_argument('--census-dir', type=str, default=ROOT,
+                       help='Directory containing 1991.csv, 2001.csv and 2011.csv (default: repository root)')
+    parser.add_argument('--cases-pattern', type=str,
+                       default=os.path.join(ROOT, '18-groups-1991-2021-input-data', '{region}-18groups-1991-2021.csv'),
+                       help="Disease input files, with '{region}' in place of the region name")
+    parser.add_argument('--states', type=str, default='all',
+                       help="Comma-separated regions, or 'all' for every census state with a disease file (default: all)")
+    parser.add_argument('--sexes', type=str, default='male,female', help='Comma-separated sexes (default: male,female)')
+    parser.add_argument('--diseases', type=str, default='t1',
+                       help='Comma-separated disease names used in the case file names (default: t1)')
+    parser.add_argument('--forecast-years', type=str, default='2025,2030,2035,2040',
+                       help='Forecast years passed to process-population.py (default: 2025,2030,2035,2040)')
+    parser.add_argument('--nordpred', type=str, default='python', choices=['python', 'r'],
+                       help='Run Nordpred with nordpred.py or run-nordpred-analysis.R (default: python)')
+    parser.add_argument('--period-length', type=int, default=None,
+                       help='With --nordpred python, fit Nordpred on periods of this many years instead of single years')
+    parser.add_argument('--india', action='store_true', help='Also run the India-Population-Data chain')
+    parser.add_argument('--india-input-dir', type=str, default=os.path.join(ROOT, 'India-Population-Data', 'input-data'),
+                       help='Directory containing the India {year}-M-F.csv files')
+    parser.add_argument('--work-dir', type=str, default='pipeline-output',
+                       help='Directory for all outputs and the run state (default: pipeline-output)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                       help='Number of steps run at the same time (default: number of CPUs)')
+    parser.add_argument('--only', type=str, default=None,
+                       help="Comma-separated glob patterns of the steps to run with their dependencies, "
+                            "e.g. 'nordpred[nagaland/*'")
+    parser.add_argument('--force', action='store_true', help='Run every step even if it is up to date')
+    parser.add_argument('--list', action='store_true', help='List the steps and their dependencies without running them')
+    args = parser.parse_args()
+
+    args.sexes = [sex.strip().lower() for sex in args.sexes.split(',')]
+    args.diseases = [disease.strip() for disease in args.diseases.split(',')]
+    if args.nordpred == 'r' and args.diseases != ['t1']:
+        parser.error("run-nordpred-analysis.R only reads '{state}-t1_{gender}.txt' case files; use --nordpred python")
+    if args.nordpred == 'r' and args.period_length:
+        parser.error("run-nordpred-analysis.R fits the yearly columns; use --nordpred python with --period-length")
+
+    cases_files = disease_files(args.cases_pattern)
+    available = census_regions([os.path.join(args.census_dir, f'{year}.csv') for year in CENSUS_YEARS])
+    if args.states.strip().lower() == 'all':
+        regions = sorted(region for region in cases_files if region in available)
+    else:
+        regions = [region.strip().lower() for region in args.states.split(',')]
+        missing = [region for region in regions if region not in cases_files]
+        if missing:
+            parser.error(f"no disease file for: {', '.join(missing)}")
+
+    pipeline = Pipeline(os.path.join(args.work_dir, '.pipeline-state'))
+    for node in analysis_nodes(args, regions, cases_files) + (india_nodes(args) if args.india else []):
+        pipeline.add(node)
+
+    if args.list:
+        for name, deps in pipeline.dependencies().items():
+            print(f"{name}" + (f" <- {', '.join(sorted(deps))}" if deps else ''))
+        return
+
+    targets = [pattern.strip() for pattern in args.only.split(',')] if args.only else None
+    results = pipeline.run(workers=args.workers, force=args.force, targets=targets)
+    counts = summarize(results)
+    print(', '.join(f'{count} {state}' for state, count in counts.items()))
+    if counts[FAILED] or counts[BLOCKED]:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()